@@ -1,44 +1,79 @@
 # app.py
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import functools
+import hashlib
 import time
-import random
-import numpy as np
 import math
+import uuid
+
+from lab import checkpoint, game, metrics, narrative, settings
+from lab.state import REGISTRY
+
+metrics.install()
+metrics.begin()
+REGISTRY.restore = checkpoint.STORE.restore
 
 # ---------------- Page config & css ----------------
 st.set_page_config(page_title="λ: The Last Queue", page_icon="🧪", layout="centered")
-st.markdown("""
-<link href="https://fonts.googleapis.com/css2?family=Press+Start+2P&display=swap" rel="stylesheet">
-<style>
-body { background-color: #07130f; color: #9be39b; font-family: 'Press Start 2P', monospace; }
-.title { font-size:20px; text-align:center; margin-top:12px; color:#9be39b; }
-.game-text{ font-size:13px; width:78%; margin: 12px auto; text-align:left; white-space:pre-wrap; }
-.toxbar { font-family: 'Courier New', monospace; font-size:13px; color:#9be39b; text-align:left; width:78%; margin:6px auto; }
-.button { font-family: 'Press Start 2P', monospace; }
-.small { font-size:11px; color:#b9f0b9; }
-.hr { border-top: 1px dashed #154b3f; margin: 10px 0; width:78%; margin-left:auto; margin-right:auto; }
-.center { text-align:center; }
-.cursor { display:inline-block; animation: blink 1s steps(1) infinite; }
-@keyframes blink { 50% { opacity: 0; } }
-</style>
-""", unsafe_allow_html=True)
+# re-sent on every full run (a run that skips it loses it); fragment reruns do not send it
+st.markdown(narrative.head_html(settings.ASSETS, st.get_option("server.enableStaticServing")), unsafe_allow_html=True)
+
+# ---------------- Helper: sleeps that benchmarks can switch off ----------------
+def pause(seconds):
+    if not settings.NO_SLEEP:
+        metrics.slept(seconds)
+        time.sleep(seconds)
 
 # ---------------- Helper: typewriter that plays once per key ----------------
 def typewriter_once(key, text, speed=0.02):
-    """Show text with typewriter effect once per key (stored in session_state)."""
-    display_key = f"_displayed_{key}"
-    if display_key not in st.session_state:
-        st.session_state[display_key] = ""
-    if st.session_state.get(display_key, "") != text:
-        placeholder = st.empty()
-        typed = ""
-        for ch in text:
-            typed += ch
-            placeholder.markdown(f"<div class='game-text'>{typed}<span class='cursor'>█</span></div>", unsafe_allow_html=True)
-            time.sleep(speed)
-        st.session_state[display_key] = text
+    """Show text with typewriter effect once per key (marked in the game state)."""
+    if not g.displayed.shown(key, text):
+        if st.session_state.get("instant_text"):
+            st.markdown(f"<div class='game-text'>{text}</div>", unsafe_allow_html=True)
+        elif settings.TEXT_MODE == "client":
+            st.markdown(narrative.typed_html(text, speed), unsafe_allow_html=True)
+        else:
+            placeholder = st.empty()
+            typed = ""
+            for ch in text:
+                typed += ch
+                placeholder.markdown(f"<div class='game-text'>{typed}<span class='cursor'>█</span></div>", unsafe_allow_html=True)
+                pause(speed)
+        g.displayed.mark(key, text)
     else:
-        st.markdown(f"<div class='game-text'>{st.session_state[display_key]}</div>", unsafe_allow_html=True)
+        st.markdown(f"<div class='game-text'>{text}</div>", unsafe_allow_html=True)
+
+
+# ---------------- Helper: messages shown right before a rerun ----------------
+def announce(key, text):
+    """typewriter_once for text followed by st.rerun().
+
+    Server mode types it out before the rerun as before. In client mode the
+    browser would never get to play it, so it is queued and shown at the top
+    of the next screen instead.
+    """
+    if settings.TEXT_MODE == "client":
+        g.announcements.append((key, text))
+    else:
+        typewriter_once(key, text)
+
+
+def announce_bang():
+    """ascii_bang followed by st.rerun(); queued like announce() in client mode."""
+    if settings.TEXT_MODE == "client":
+        g.announcements.append((None, None))
+    else:
+        ascii_bang()
+
+
+def flush_announcements():
+    pending, g.announcements = g.announcements, []
+    for key, text in pending:
+        if key is None:
+            ascii_bang()
+        else:
+            typewriter_once(key, text)
 
 # ---------------- Toxicity bar ----------------
 def toxicity_bar(tox):
@@ -57,186 +92,208 @@ def toxicity_bar(tox):
     return f"Toxicity: [{bar}] {tox:.0f}%    STATUS: {status}"
 
 # ---------------- ASCII BANG animation ----------------
+BANG_FRAMES = [
+    "     🔫\n     |===>\n     |\n",
+    "     🔫\n     |=====>\n     |\n",
+    "     🔫\n     |=======>\n     |\n",
+    "     🔫\n     |===>   B A N G !\n     |\n"
+]
+BANG_HTML = "<div class='game-text bang'>" + "".join(
+    f"<div class='bang-frame' style='animation-delay:{i * 0.12:.2f}s'>{f}</div>" for i, f in enumerate(BANG_FRAMES)
+) + "</div>"
+
+
 def ascii_bang():
-    frames = [
-        "     🔫\n     |===>\n     |\n",
-        "     🔫\n     |=====>\n     |\n",
-        "     🔫\n     |=======>\n     |\n",
-        "     🔫\n     |===>   B A N G !\n     |\n"
-    ]
+    if st.session_state.get("instant_text"):
+        return
+    if settings.TEXT_MODE == "client":
+        st.markdown(BANG_HTML, unsafe_allow_html=True)
+        return
     placeholder = st.empty()
-    for f in frames:
+    for f in BANG_FRAMES:
         placeholder.markdown(f"<div class='game-text'>{f}</div>", unsafe_allow_html=True)
-        time.sleep(0.12)
-    time.sleep(0.08)
+        pause(0.12)
+    pause(0.08)
     placeholder.empty()
 
 # ---------------- Session state initialization ----------------
+OWNER_COOKIE = "lq_owner"
+
+
+def owner_token():
+    """Per-browser secret that the ``run`` link does not carry, set as a cookie on first visit."""
+    if "_lq_owner" not in st.session_state:
+        token = st.context.cookies.get(OWNER_COOKIE, "")
+        if len(token) != 32 or not token.isalnum():
+            token = uuid.uuid4().hex
+            st.html(f"<script>document.cookie='{OWNER_COOKIE}={token}; path=/; "
+                    f"max-age={int(settings.CHECKPOINT_MAX_AGE)}; SameSite=Strict'</script>",
+                    unsafe_allow_javascript=True)
+        st.session_state._lq_owner = token
+    return st.session_state._lq_owner
+
+
+def _live(holder):
+    """True while the Streamlit session ``holder`` still has a browser connected."""
+    from streamlit import runtime
+    return runtime.exists() and runtime.get_instance().is_active_session(holder)
+
+
+def session_id():
+    """Registry and checkpoint key for this run, kept in session_state across reruns.
+
+    The ``run`` query parameter names the game, so a reload, a reconnect or a
+    different replica behind the load balancer finds it again; the key mixes
+    in the owner cookie, so someone else opening the link gets a game of their
+    own. A second live tab on the same link is moved to a new run.
+    """
+    if "_lq_sid" not in st.session_state:
+        run = st.query_params.get("run", "")
+        if len(run) != 32 or not run.isalnum():
+            run = uuid.uuid4().hex
+        ctx = get_script_run_ctx()
+        holder = ctx.session_id if ctx is not None else None
+        while True:
+            sid = hashlib.sha256(f"{run}:{owner_token()}".encode()).hexdigest()[:32]
+            if holder is None or REGISTRY.claim(sid, holder, alive=_live):
+                break
+            run = uuid.uuid4().hex
+        if st.query_params.get("run") != run:
+            st.query_params["run"] = run
+        st.session_state._lq_sid = sid
+    return st.session_state._lq_sid
+
+
 def init_state():
-    if "phase" not in st.session_state:
-        st.session_state.phase = "tutorial"  # tutorial, playing, ending
-    if "tutorial_step" not in st.session_state:
-        st.session_state.tutorial_step = 0
-    if "tutorial_finished" not in st.session_state:
-        st.session_state.tutorial_finished = False
-    if "game_started" not in st.session_state:
-        st.session_state.game_started = False
-    if "round" not in st.session_state:
-        st.session_state.round = 0
-    if "queue_length" not in st.session_state:
-        st.session_state.queue_length = 2
-    if "toxicity" not in st.session_state:
-        st.session_state.toxicity = 15.0
-    if "lmbd" not in st.session_state:
-        st.session_state.lmbd = 0.8
-    if "mu" not in st.session_state:
-        st.session_state.mu = 1.1
-    if "survival_prob" not in st.session_state:
-        st.session_state.survival_prob = 1.0
-    if "alive" not in st.session_state:
-        st.session_state.alive = True
-    if "phase_part" not in st.session_state:
-        st.session_state.phase_part = "queue"
-    if "bullet_pos" not in st.session_state:
-        st.session_state.bullet_pos = random.randint(1, 6)
-    if "chamber_pointer" not in st.session_state:
-        st.session_state.chamber_pointer = 1
-    if "ending_type" not in st.session_state:
-        st.session_state.ending_type = None
-    if "lam_poison" not in st.session_state:
-        st.session_state.lam_poison = 0.45
-    if "antidote_chance" not in st.session_state:
-        st.session_state.antidote_chance = 0.18
-    if "displayed_messages" not in st.session_state:
-        st.session_state.displayed_messages = set()
-    if "_displayed_keys" not in st.session_state:
-        st.session_state._displayed_keys = set()
-
-init_state()
+    """This session's GameState, owned by the process-wide registry; marks the session active."""
+    return REGISTRY.get(session_id())
+
+
+def checkpointed(screen):
+    """Snapshot the game once the screen's run is over, however it ends (st.rerun included)."""
+    @functools.wraps(screen)
+    def run(*args, **kwargs):
+        try:
+            return screen(*args, **kwargs)
+        finally:
+            sid = session_id()
+            checkpoint.STORE.save(sid, REGISTRY.get(sid))  # Restart may have swapped the state
+    return run
+
+g = init_state()
+metrics.label(g)
 
 # ---------------- Tutorial text (elaborated) ----------------
-tutorial_lines = [
-    "SYSTEM BOOTING...",
-    "ACCESS GRANTED.",
-    "WELCOME, SUBJECT #417.",
-    "YOU HAVE ENTERED: THE LAB OF UNCERTAINTY.",
-    "PLEASE REMAIN CALM.",
-    "YOUR BODY CONTAINS A CONTROLLED TOXIN—CODE NAME: LAMBDA SERUM.",
-    "THE ANTIDOTE IS UNSTABLE, DISTRIBUTED BY CHANCE.",
-    "TO SURVIVE, YOU MUST PLAY A GAME OF ORDER AND CHAOS.",
-    "",
-    "EVERY TURN, YOU FACE THREE PHASES:",
-    "",
-    "[1] THE QUEUE PHASE — THE WAIT.",
-    "    Subjects arrive randomly. λ = ARRIVAL RATE.",
-    "    Services happen at rate μ = SERVICE RATE.",
-    "    When λ ≥ μ, the system becomes unstable.",
-    "",
-    "[2] THE ROULETTE PHASE — THE TEST.",
-    "    Six chambers, one bullet. Spin or don't spin.",
-    "    Spin: independent 1/6 chance. Don't spin: dependent.",
-    "",
-    "[3] THE POISON PHASE — THE DRIFT.",
-    "    Toxin leaks randomly (Poisson). Antidotes appear sometimes.",
-    "",
-    "AFTER EACH ROUND, DR. LAMBDA REPORTS:",
-    "    • Rounds Survived",
-    "    • Current Toxicity (%)",
-    "    • λ and μ",
-    "    • Survival Probability",
-    "",
-    "IF TOXICITY ≥ 100% → TOXIC DEATH.",
-    "IF λ ≥ μ → QUEUE COLLAPSE.",
-    "IF REVOLVER FIRES → ROULETTE DEATH.",
-    "",
-    "YOU CAN QUIT AFTER ANY REPORT (Voluntary Exit).",
-    "THE ONLY WAY TO 'WIN' IS TO OUTLAST ENTROPY.",
-    "",
-    "THIS IS YOUR WARNING. PREPARE.",
-    "THE EXPERIMENT BEGINS NOW."
-]
+tutorial_lines = narrative.TUTORIAL_LINES
 
 # ---------------- Endings narratives (user-provided exact text) ----------------
-ending_texts = {
-    "roulette_death": (
-        "The revolver hums. The cylinder stops.\n"
-        "You hear a sharp click — or was it—\n"
-        "BANG.\n"
-        "The walls splatter in noise and red logic.\n"
-        "Experiment #417: Terminated."
-    ),
-    "toxic_death": (
-        "Your veins pulse neon.\n"
-        "You feel numbers crawling under your skin.\n"
-        "100% reached.\n"
-        "Biological system—irreversible.\n"
-        "☠ Simulation Terminated ☠"
-    ),
-    "queue_collapse": (
-        "The hallway grows crowded.\n"
-        "Screams echo in infinite recursion.\n"
-        "λ ≥ μ.\n"
-        "The Lab cannot stabilize its arrivals.\n"
-        "System collapses into chaos."
-    ),
-    "escape": (
-        "Dr. Lambda leans forward.\n"
-        "For the first time, the screen shows no red.\n"
-        "You balanced the rates.\n"
-        "Entropy tamed.\n"
-        "The Lab of Uncertainty fades away."
-    ),
-    "secret": (
-        "The system no longer tests you.\n"
-        "It integrates you.\n"
-        "You are no longer Subject #417.\n"
-        "You are λ.\n"
-        "You are μ.\n"
-        "You are balance.\n"
-        "> Simulation Complete <"
-    ),
-    "voluntary_exit": (
-        "You close your eyes.\n"
-        "Machines hum without you.\n"
-        "Somewhere, another subject takes your place.\n"
-        "Experiment #418 begins."
-    )
-}
+ending_texts = narrative.ENDING_TEXTS
+
+# ---------------- Analytics events for the operator page ----------------
+def track(kind, value=0.0):
+    """Queue one phase transition for the cross-session aggregates (lab/events.py); never blocks."""
+    from lab import events
+    events.PIPELINE.emit(kind, g, value)
+
+
+def pull(spin):
+    """game.pull plus its event; True if the revolver fired."""
+    fired = game.pull(g, spin=spin)
+    track("spin" if spin else "stay", fired)
+    return fired
 
 # ---------------- Utility to trigger endings ----------------
 def trigger_ending(kind):
-    st.session_state.ending_type = kind
-    st.session_state.phase = "ending"
-    st.session_state.alive = False
+    game.end(g, kind)
+    if g.game_started:
+        track("ending", game.ENDINGS.index(kind))
+        from lab import leaderboard
+        leaderboard.BOARD.record(g)  # queued; the writer thread does the disk work
 
 # ---------------- Start a new game ----------------
 def start_game():
-    st.session_state.game_started = True
-    st.session_state.phase = "playing"
-    st.session_state.round = 1
-    st.session_state.queue_length = 2
-    st.session_state.toxicity = 15.0
-    st.session_state.lmbd = round(max(0.3, random.gauss(0.8, 0.12)), 2)
-    st.session_state.mu = round(max(0.6, random.gauss(1.1, 0.15)), 2)
-    st.session_state.survival_prob = 1.0
-    st.session_state.alive = True
-    st.session_state.phase_part = "queue"
-    st.session_state.bullet_pos = random.randint(1, 6)
-    st.session_state.chamber_pointer = 1
-    st.session_state.displayed_messages = set()
-    # clear displayed keys
-    for k in list(st.session_state.keys()):
-        if k.startswith("_displayed_"):
-            del st.session_state[k]
+    from lab import solver  # NumPy and the solver load with the first game, not the tutorial
+    servers = settings.CROWD_SERVERS if st.session_state.get("crowded") else settings.QUEUE_SERVERS
+    if st.session_state.get("shared"):
+        try:
+            game.start(g, lab=lab_number())
+        except ConnectionError:
+            announce("lab_closed", "Dr. Lambda: 'The shared lab is closed today. You will queue alone.'")
+            game.start(g, servers=servers)
+    else:
+        game.start(g, servers=servers)
+    track("start")
+    g.displayed.clear()
+    solver.warm()
     st.rerun()
 
+def lab_number():
+    """Shared lab to join: ?lab=N in the URL, so a link puts players in the same one."""
+    v = st.query_params.get("lab", "0")
+    return int(v) if v.isdigit() else 0
+
+# ---------------- Odds from the report screen ----------------
+@st.cache_data(max_entries=4096, show_spinner=False)
+def ending_odds(rnd, queue_length, toxicity, cleared, lmbd, mu):
+    """Exact ending distribution if the player presses Continue (see lab/solver.py)."""
+    from lab import solver
+    return solver.after_report(rnd, queue_length, toxicity, cleared, lmbd, mu)
+
+
+def odds_text(odds):
+    return (
+        "--- ODDS IF YOU CONTINUE ---\n"
+        f"P(escape): {odds['escape']:.1%}\n"
+        f"P(secret): {odds['secret']:.1%}\n"
+        f"P(roulette death): {odds['roulette_death']:.1%}\n"
+        f"P(toxic death): {odds['toxic_death']:.1%}\n"
+        f"P(queue collapse): {odds['queue_collapse']:.1%}\n"
+        "(assuming you spin half the time)"
+    )
+
+# ---------------- Roulette hint ----------------
+def hint_text():
+    """Dr. Lambda's advice for this pull, read from the memory-mapped policy table."""
+    from lab import policy
+    adv = policy.advantage(g.round, g.queue_length, g.toxicity, g.cleared, g.lmbd, g.mu)
+    if adv is None:
+        policy.warm()
+        return "Dr. Lambda: 'Give me a moment, I am still working out the odds.'"
+    if adv > 5e-4:
+        return f"Dr. Lambda: 'Spin. It adds {adv:.1%} to your chance of getting out.'"
+    if adv < -5e-4:
+        return f"Dr. Lambda: 'Don't spin. It adds {-adv:.1%} to your chance of getting out.'"
+    return "Dr. Lambda: 'It makes no difference this time.'"
+
 # ---------------- UI header ----------------
 st.markdown(f"<div class='title'>λ: THE LAST QUEUE</div>", unsafe_allow_html=True)
 st.markdown("<div class='hr'></div>", unsafe_allow_html=True)
-
-# ---------------- Main states ----------------
-if st.session_state.phase == "tutorial":
-    idx = st.session_state.tutorial_step
+st.sidebar.toggle("Instant text", key="instant_text")
+st.sidebar.toggle("Crowded lab", key="crowded", disabled=g.game_started,
+                  help=f"Next game runs the queue as M/M/c with {settings.CROWD_SERVERS} servers in continuous time.")
+from lab.labserver import CLIENT  # connects only once a shared game starts
+st.sidebar.toggle("Shared lab", key="shared", disabled=g.game_started or not CLIENT.available(),
+                  help="Next game queues with everyone else in the same lab (?lab=N in the URL).")
+st.sidebar.toggle("Dr. Lambda hint", key="lambda_hint", help="Best move at the roulette, from a precomputed policy table.")
+
+# ---------------- Screens ----------------
+# Each screen is an st.fragment: a click that stays on the same screen reruns
+# only that function (rerun_screen). Moving to another screen reruns the whole
+# app so the header, sidebar and dispatch below follow.
+def rerun_screen():
+    """st.rerun() limited to the current screen when the click came in as a fragment rerun."""
+    ctx = get_script_run_ctx()
+    st.rerun(scope="fragment" if ctx is not None and ctx.fragment_ids_this_run else "app")
+
+
+@st.fragment
+@checkpointed
+@metrics.fragment
+def tutorial_screen():
+    global g
+    g = init_state()  # fragment reruns skip the top of the script; this also marks the session active
+    metrics.label(g)
+    idx = g.tutorial_step
     if idx < len(tutorial_lines):
         key = f"tutorial_{idx}"
         typewriter_once(key, tutorial_lines[idx], speed=0.02)
@@ -244,19 +301,19 @@ if st.session_state.phase == "tutorial":
         colA, colB, colC, colD = st.columns([0.8, 1, 0.8, 1])
         with colB:
             if st.button("Next"):
-                st.session_state.tutorial_step += 1
-                if st.session_state.tutorial_step >= len(tutorial_lines):
-                    st.session_state.tutorial_finished = True
-                st.rerun()
+                g.tutorial_step += 1
+                if g.tutorial_step >= len(tutorial_lines):
+                    g.tutorial_finished = True
+                rerun_screen()
         with colD:
             if st.button("⏩ Skip Tutorial"):
-                st.session_state.tutorial_finished = True
-                st.session_state.tutorial_step = len(tutorial_lines)
-                st.rerun()
+                g.tutorial_finished = True
+                g.tutorial_step = len(tutorial_lines)
+                rerun_screen()
     else:
-        st.session_state.tutorial_finished = True
+        g.tutorial_finished = True
 
-    if st.session_state.tutorial_finished:
+    if g.tutorial_finished:
         st.markdown("<div class='game-text'>Tutorial complete. Do you accept the experiment?</div>", unsafe_allow_html=True)
         colA, colB, colC = st.columns([1, 2, 1])
         with colB:
@@ -268,160 +325,189 @@ if st.session_state.phase == "tutorial":
                 st.rerun()
 
 
-# ---------------- Playing state ----------------
-elif st.session_state.phase == "playing":
+@st.fragment(run_every=settings.LAB_REFRESH)
+def lab_panel():
+    """Live numbers of this game's shared lab, from the deltas this process already has."""
+    from lab.labserver import CLIENT
+    s = CLIENT.state(g.lab)
+    if s is None:
+        return
+    st.markdown(f"<div class='game-text small'>LAB {g.lab}: {s['subjects']} subject(s), {s['queue']} in the queue, "
+                f"{s['arrivals']} arrived / {s['departures']} served so far</div>", unsafe_allow_html=True)
+
+
+@st.fragment
+@checkpointed
+@metrics.fragment
+def play_screen():
+    global g
+    g = init_state()
+    metrics.label(g)
+    flush_announcements()
     # persistent toxicity meter
-    st.markdown(f"<div class='toxbar'>{toxicity_bar(st.session_state.toxicity)}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='toxbar'>{toxicity_bar(g.toxicity)}</div>", unsafe_allow_html=True)
     st.markdown("<div class='hr'></div>", unsafe_allow_html=True)
-    st.markdown(f"<div class='game-text'>--- ROUND {st.session_state.round} ---</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='game-text'>--- ROUND {g.round} ---</div>", unsafe_allow_html=True)
 
-    part = st.session_state.phase_part
+    part = g.phase_part
 
     # --- QUEUE PHASE ---
     if part == "queue":
-        # update params with small drift
-        st.session_state.lmbd = round(max(0.2, random.gauss(st.session_state.lmbd, 0.08)), 2)
-        st.session_state.mu = round(max(0.5, random.gauss(st.session_state.mu, 0.1)), 2)
-
-        arrivals = np.random.poisson(lam=st.session_state.lmbd)
-        services = min(st.session_state.queue_length + arrivals, max(1, np.random.poisson(lam=st.session_state.mu)))
-        st.session_state.queue_length = max(0, st.session_state.queue_length + arrivals - services)
-
-        key = f"r{st.session_state.round}_queue"
+        key = f"r{g.round}_queue"
         s = (
             "[QUEUE PHASE]\n"
-            f"New arrivals: {arrivals}\n"
-            f"Services processed: {services}\n"
-            f"Queue length: {st.session_state.queue_length}\n"
-            f"λ = {st.session_state.lmbd}   μ = {st.session_state.mu}"
+            f"New arrivals: {g.arrivals}\n"
+            f"Services processed: {g.services}\n"
+            f"Queue length: {g.queue_length}\n"
+            f"λ = {g.lmbd}   μ = {g.mu}"
         )
+        if g.servers > 1:
+            s += f"   ({g.servers} servers)"
+        if g.lab is not None:
+            s += f"   (shared lab {g.lab})"
         typewriter_once(key, s)
 
         # check collapse
-        if st.session_state.lmbd >= st.session_state.mu or st.session_state.queue_length > 12:
-            typewriter_once(f"qc_warn_{st.session_state.round}", "\nSYSTEM: λ >= μ — queue instability detected.")
+        if game.collapsed(g):
+            announce(f"qc_warn_{g.round}", "\nSYSTEM: λ >= μ — queue instability detected.")
             trigger_ending("queue_collapse")
             st.rerun()
 
         c1, c2 = st.columns([1, 1])
         with c2:
             if st.button("→ Proceed to Roulette"):
-                st.session_state.phase_part = "roulette"
-                st.rerun()
+                game.proceed(g)
+                track("roulette")
+                rerun_screen()
 
     # --- ROULETTE PHASE ---
     elif part == "roulette":
-        key = f"r{st.session_state.round}_roulette"
+        key = f"r{g.round}_roulette"
         s = "[ROULETTE PHASE]\nThe revolver is placed before you.\nSix chambers. One bullet."
         typewriter_once(key, s)
 
+        if st.session_state.get("lambda_hint"):
+            st.markdown(f"<div class='game-text small'>{hint_text()}</div>", unsafe_allow_html=True)
+
         col1, col2, col3 = st.columns([1, 0.6, 1])
         with col1:
             if st.button("Spin (Independent)"):
-                chamber = random.randint(1, 6)
-                if chamber == st.session_state.bullet_pos:
+                if pull(spin=True):
                     # death
-                    typewriter_once(f"bang_{st.session_state.round}_spin", "You spun the cylinder...\nClick... BANG!")
-                    ascii_bang()
+                    announce(f"bang_{g.round}_spin", "You spun the cylinder...\nClick... BANG!")
+                    announce_bang()
                     trigger_ending("roulette_death")
                     st.rerun()
                 else:
-                    typewriter_once(f"safe_{st.session_state.round}_spin", "You spun... click. Empty. You survive this pull.")
-                    st.session_state.survival_prob *= (5/6)
-                    st.session_state.toxicity = max(0.0, st.session_state.toxicity - 10)
-                    st.session_state.chamber_pointer = random.randint(1, 6)
-                    st.session_state.phase_part = "poison"
-                    st.rerun()
+                    announce(f"safe_{g.round}_spin", "You spun... click. Empty. You survive this pull.")
+                    rerun_screen()
 
         with col3:
             if st.button("Don't Spin (Dependent)"):
-                cp = st.session_state.chamber_pointer
-                if cp == st.session_state.bullet_pos:
-                    typewriter_once(f"bang_{st.session_state.round}_nospin", "You do not spin...\nClick... BANG!")
-                    ascii_bang()
+                if pull(spin=False):
+                    announce(f"bang_{g.round}_nospin", "You do not spin...\nClick... BANG!")
+                    announce_bang()
                     trigger_ending("roulette_death")
                     st.rerun()
                 else:
-                    typewriter_once(f"safe_{st.session_state.round}_nospin", "You don't spin... click. Empty. You live.")
-                    st.session_state.survival_prob *= (5/6)
-                    st.session_state.toxicity = max(0.0, st.session_state.toxicity - 10)
-                    st.session_state.chamber_pointer = (st.session_state.chamber_pointer % 6) + 1
-                    st.session_state.phase_part = "poison"
-                    st.rerun()
+                    announce(f"safe_{g.round}_nospin", "You don't spin... click. Empty. You live.")
+                    rerun_screen()
 
     # --- POISON PHASE ---
     elif part == "poison":
-        key = f"r{st.session_state.round}_poison"
-        drops = np.random.poisson(lam=st.session_state.lam_poison)
+        key = f"r{g.round}_poison"
         text = "[POISON PHASE]\n"
-        if drops > 0:
-            inc = drops * 8
-            st.session_state.toxicity = min(100.0, st.session_state.toxicity + inc)
-            text += f"{drops} toxin drop(s) leaked. Toxicity +{inc}%.\n"
+        if g.drops > 0:
+            text += f"{g.drops} toxin drop(s) leaked. Toxicity +{g.drops * game.RULES.drop_toxicity:g}%.\n"
         else:
             text += "No new leaks detected.\n"
-        if random.random() < st.session_state.antidote_chance:
-            red = random.randint(5, 15)
-            st.session_state.toxicity = max(0.0, st.session_state.toxicity - red)
-            text += f"An antidote cart arrives. Toxicity -{red}%.\n"
-        text += f"Current toxicity: {st.session_state.toxicity:.1f}%"
+        if g.antidote:
+            text += f"An antidote cart arrives. Toxicity -{g.antidote}%.\n"
+        text += f"Current toxicity: {g.toxicity:.1f}%"
         typewriter_once(key, text)
 
-        if st.session_state.toxicity >= 100.0:
-            typewriter_once(f"toxic_end_{st.session_state.round}", "\n☠ TOXICITY CRITICAL — SYSTEM FAILURE.")
+        if game.toxic(g):
+            announce(f"toxic_end_{g.round}", "\n☠ TOXICITY CRITICAL — SYSTEM FAILURE.")
             trigger_ending("toxic_death")
             st.rerun()
 
         if st.button("→ View Round Report"):
-            st.session_state.phase_part = "report"
-            st.rerun()
+            game.view_report(g)
+            track("report")
+            rerun_screen()
 
     # --- REPORT PHASE ---
     elif part == "report":
-        rho = st.session_state.lmbd / st.session_state.mu if st.session_state.mu > 0 else 999
+        rho = game.rho(g)
         Lq = (rho**2)/(1-rho) if rho < 1 else float('inf')
-        key = f"r{st.session_state.round}_report"
+        waits = ""
+        if g.waits is not None:
+            from lab import des
+            th = des.theory(g.servers, g.lmbd * g.servers, g.mu)
+            Lq = th["Lq"] if th else float('inf')
+            p50, p90, p99, n = g.waits
+            waits = (f"Waits this round ({n} subjects): p50 {p50:.2f}  p90 {p90:.2f}  p99 {p99:.2f}\n"
+                     f"Theory: p50 {des.wait_quantile(g.servers, g.lmbd * g.servers, g.mu, 0.5):.2f}  "
+                     f"p90 {des.wait_quantile(g.servers, g.lmbd * g.servers, g.mu, 0.9):.2f}\n") if th else ""
+        risk = ""
+        if g.servers <= 1 and g.lab is None:  # a shared lab's queue is everyone's, not this λ/μ
+            from lab import transient
+            p1, p3, p5 = transient.collapse_within(g.lmbd, g.mu, g.queue_length, (1, 3, 5))
+            risk = f"P(queue overflow within 1/3/5 rounds): {p1:.2%} / {p3:.2%} / {p5:.2%}\n"
+        key = f"r{g.round}_report"
         report = (
             f"--- ROUND SUMMARY ---\n"
-            f"Rounds Survived: {st.session_state.round}\n"
-            f"Current Toxicity: {st.session_state.toxicity:.1f}%\n"
-            f"Queue length: {st.session_state.queue_length}\n"
+            f"Rounds Survived: {g.round}\n"
+            f"Current Toxicity: {g.toxicity:.1f}%\n"
+            f"Queue length: {g.queue_length}\n"
             f"Expected Queue Length (Lq): {Lq if not math.isinf(Lq) else '∞'}\n"
-            f"λ = {st.session_state.lmbd:.2f}   μ = {st.session_state.mu:.2f}\n"
-            f"Survival Probability (so far): {st.session_state.survival_prob:.3f}\n"
+            f"{waits}"
+            f"{risk}"
+            f"λ = {g.lmbd:.2f}   μ = {g.mu:.2f}\n"
+            f"Survival Probability (so far): {g.survival_prob:.3f}\n"
             f"System Stability: {'Stable' if rho < 1 else 'Collapsed'}\n"
             f"----------------------"
         )
         typewriter_once(key, report)
 
         # check escape / secret endings
-        if st.session_state.round >= 10 and rho < 1 and st.session_state.toxicity < 80:
-            typewriter_once("escape_trigger", "\nDr. Lambda: 'You have balanced the rates. The experiment concludes.'")
+        if game.escaped(g):
+            announce("escape_trigger", "\nDr. Lambda: 'You have balanced the rates. The experiment concludes.'")
             trigger_ending("escape")
             st.rerun()
-        if st.session_state.round >= 20 and st.session_state.survival_prob >= 0.9:
-            typewriter_once("secret_trigger", "\nThe console hums. You become the equation.")
+        if game.transcended(g):
+            announce("secret_trigger", "\nThe console hums. You become the equation.")
             trigger_ending("secret")
             st.rerun()
 
+        if g.lab is None:  # the solver models this player's own queue, not a shared lab's
+            from lab import solver
+            if solver.ready():
+                odds = ending_odds(g.round, g.queue_length, g.toxicity, g.cleared, g.lmbd, g.mu)
+                typewriter_once(f"r{g.round}_odds", odds_text(odds))
+            else:
+                solver.warm()
+                st.markdown("<div class='game-text small'>Dr. Lambda is still computing the odds...</div>", unsafe_allow_html=True)
+
         c1, c2, c3 = st.columns([1, 1, 1])
         with c1:
             if st.button("Continue"):
-                st.session_state.round += 1
-                st.session_state.phase_part = "queue"
-                st.session_state.lmbd = min(2.0, round(st.session_state.lmbd + random.uniform(0.02, 0.12), 2))
-                st.rerun()
+                game.next_round(g)
+                track("continue")
+                rerun_screen()
         with c2:
             if st.button("Quit (Voluntary Exit)"):
                 trigger_ending("voluntary_exit")
                 st.rerun()
         with c3:
-            if st.button("Force Status Check"):
-                st.rerun()
+            if g.lab is None and st.button("Force Status Check"):  # the lab panel is live in a shared lab
+                rerun_screen()
+
 
-# ---------------- Ending screens ----------------
-elif st.session_state.phase == "ending":
-    end = st.session_state.ending_type
+@checkpointed
+def ending_screen():
+    flush_announcements()
+    end = g.ending_type
     st.markdown("<div class='game-text'>--- EXPERIMENT TERMINATED ---</div>", unsafe_allow_html=True)
 
     # Use the exact narratives provided by the user
@@ -456,20 +542,42 @@ elif st.session_state.phase == "ending":
         st.markdown("<div class='game-text'>RESULT: Unknown</div>", unsafe_allow_html=True)
 
     st.markdown("<div class='hr'></div>", unsafe_allow_html=True)
-    st.markdown(f"<div class='game-text'>Rounds survived: {st.session_state.round}</div>", unsafe_allow_html=True)
-    st.markdown(f"<div class='toxbar'>{toxicity_bar(st.session_state.toxicity)}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='game-text'>Rounds survived: {g.round}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='toxbar'>{toxicity_bar(g.toxicity)}</div>", unsafe_allow_html=True)
+
+    top = []
+    if g.game_started:
+        from lab import leaderboard
+        top = leaderboard.BOARD.top(end, 5)
+    if top:
+        rows = "\n".join(f"{i}. {r[0]:>2} rounds  tox {r[1]:.0f}%" for i, r in enumerate(top, 1))
+        st.markdown(f"<div class='game-text'>BEST RUNS — {end.replace('_', ' ').upper()}\n{rows}</div>",
+                    unsafe_allow_html=True)
+
+    if g.log is not None:
+        st.download_button("Download run log", g.log.to_bytes(g.seed), file_name=f"lq-run-{g.seed}.bin", on_click="ignore",
+                           help="Seed and every draw of this run, for bug reports (python -m lab.game FILE).")
 
     if st.button("Restart Game"):
-        # clear session and re-init
-        keys = list(st.session_state.keys())
-        for k in keys:
-            del st.session_state[k]
-        init_state()
+        # drop the game state and start over
+        REGISTRY.reset(session_id())
         st.rerun()
 
+
+# ---------------- Main states ----------------
+if g.phase == "tutorial":
+    tutorial_screen()
+elif g.phase == "playing":
+    if g.lab is not None:
+        lab_panel()
+    play_screen()
+elif g.phase == "ending":
+    ending_screen()
+
 # ---------------- Footer ----------------
 st.markdown("<div class='hr'></div>", unsafe_allow_html=True)
 st.markdown("<div class='small'>Dr. Lambda is Priyansh Gajbhiye</div>", unsafe_allow_html=True)
 
 st.markdown("<div class='small'>24CE10011</div>", unsafe_allow_html=True)
 
+metrics.end()
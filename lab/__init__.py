@@ -0,0 +1,2 @@
+# lab/__init__.py
+"""Headless game logic and tooling for λ: The Last Queue."""
@@ -0,0 +1,181 @@
+# lab/bots.py
+"""Scripted players: the Spin / Don't Spin and Continue / Quit choices as code.
+
+A :class:`Strategy` gets a :class:`lab.engine.View` (arrays: one entry per
+live game) and returns a bool array: :meth:`~Strategy.spin` at the roulette,
+:meth:`~Strategy.quit` at the report, after escape and secret were checked,
+exactly where the buttons are in app.py. :func:`lab.engine.play` takes one
+with ``strategy=``.
+
+Strategies are named by specs, ``name`` or ``name=arg,arg``, and ``A+B``
+takes the roulette choice from A and the report choice from B::
+
+    always_spin   never_spin   mixed=0.3   spin_after=2   optimal
+    quit_toxicity=70   quit_rho=0.95   quit_round=5
+    always_spin+quit_toxicity=80
+
+New ones are added with :func:`register`, or named by import path
+(``mypkg.bots.Cautious=3``) without touching this file. A class that sets
+``takes_rules`` is also given the :class:`lab.rules.Rules` of the games it
+will play, as ``rules=``.
+"""
+import importlib
+
+import numpy as np
+
+from lab.rules import DEFAULT_RULES
+
+STRATEGIES = {}
+
+
+def register(name):
+    """Class decorator: make a Strategy available as ``name`` in specs."""
+    def deco(cls):
+        STRATEGIES[name] = cls
+        cls.name = name
+        return cls
+    return deco
+
+
+class Strategy:
+    """Spins half the time and never quits, like :func:`lab.engine.play` without a strategy."""
+    name = "base"
+    args = ()
+    takes_rules = False
+
+    def spin(self, v):
+        return v.u < 0.5
+
+    def quit(self, v):
+        return np.zeros(len(v), bool)
+
+    def __str__(self):
+        return self.name + (("=" + ",".join(f"{a:g}" for a in self.args)) if self.args else "")
+
+
+# ---------------- Roulette ----------------
+@register("mixed")
+class Mixed(Strategy):
+    """Spin with probability ``p``."""
+
+    def __init__(self, p=0.5):
+        self.p = float(p)
+        self.args = (self.p,)
+
+    def spin(self, v):
+        return v.u < self.p
+
+
+@register("always_spin")
+class AlwaysSpin(Strategy):
+    def spin(self, v):
+        return np.ones(len(v), bool)
+
+
+@register("never_spin")
+class NeverSpin(Strategy):
+    def spin(self, v):
+        return np.zeros(len(v), bool)
+
+
+@register("spin_after")
+class SpinAfter(Strategy):
+    """Don't Spin until ``k`` chambers have been cleared since the last spin, then Spin."""
+
+    def __init__(self, k=1):
+        self.k = int(k)
+        self.args = (self.k,)
+
+    def spin(self, v):
+        return v.cleared >= self.k
+
+
+@register("optimal")
+class Optimal(Strategy):
+    """The value-iteration policy of lab/policy.py for the rules played (``python -m lab.policy`` builds it)."""
+    takes_rules = True
+
+    def __init__(self, rules=DEFAULT_RULES):
+        from lab import policy
+        if policy.load(rules) is None:
+            how = "python -m lab.policy" if rules == DEFAULT_RULES else "lab.policy.build(rules)"
+            raise ValueError(f"no policy table for these rules yet; build it with {how}")
+        self.rules = rules
+
+    def spin(self, v):
+        from lab import policy
+        return policy.advantages(v.round, v.queue_length, v.toxicity, v.cleared, v.lmbd, v.mu, self.rules) > 0
+
+
+# ---------------- Report ----------------
+@register("quit_toxicity")
+class QuitToxicity(Strategy):
+    """Quit at the first report with toxicity above ``x`` percent."""
+
+    def __init__(self, x=70.0):
+        self.x = float(x)
+        self.args = (self.x,)
+
+    def quit(self, v):
+        return v.toxicity > self.x
+
+
+@register("quit_rho")
+class QuitRho(Strategy):
+    """Quit at the first report with ρ = λ/μ at or above ``x`` (the queue is about to go)."""
+
+    def __init__(self, x=0.95):
+        self.x = float(x)
+        self.args = (self.x,)
+
+    def quit(self, v):
+        return v.lmbd >= self.x * v.mu
+
+
+@register("quit_round")
+class QuitRound(Strategy):
+    """Quit at the report of round ``k``."""
+
+    def __init__(self, k=5):
+        self.k = int(k)
+        self.args = (self.k,)
+
+    def quit(self, v):
+        return v.round >= self.k
+
+
+class Both(Strategy):
+    """Roulette choice of one strategy, report choice of another (``A+B``)."""
+
+    def __init__(self, roulette, report):
+        self.roulette, self.report = roulette, report
+
+    def spin(self, v):
+        return self.roulette.spin(v)
+
+    def quit(self, v):
+        return self.report.quit(v)
+
+    def __str__(self):
+        return f"{self.roulette}+{self.report}"
+
+
+# ---------------- Specs ----------------
+def strategy(spec, rules=DEFAULT_RULES):
+    """The Strategy a spec names (see the module docstring), for games played under ``rules``."""
+    if "+" in spec:
+        roulette, _, report = spec.partition("+")
+        return Both(strategy(roulette, rules), strategy(report, rules))
+    name, _, args = spec.partition("=")
+    if "." in name:
+        module, _, attr = name.rpartition(".")
+        cls = getattr(importlib.import_module(module), attr)
+    elif name in STRATEGIES:
+        cls = STRATEGIES[name]
+    else:
+        raise ValueError(f"unknown strategy {name!r}; choose from {', '.join(STRATEGIES)} or give module.Class")
+    kwargs = {"rules": rules} if getattr(cls, "takes_rules", False) else {}
+    s = cls(*(float(a) for a in args.split(",") if a), **kwargs)
+    if "." in name:
+        s.name = name
+    return s
@@ -0,0 +1,322 @@
+# lab/checkpoint.py
+"""Game checkpoints outside the process, so any replica can pick a run back up.
+
+A snapshot holds the GameState fields init_state defines (phase, round,
+rates, toxicity, revolver, ...) plus the run's seed and event log; the
+typewriter markers, queued announcements and other per-process bookkeeping
+are left out. Restoring re-plays the log with :func:`lab.game.resume`, which
+rebuilds the RNG and the continuous-time queue exactly, so the restored game
+draws the same numbers the original would have.
+
+:meth:`Checkpointer.save` is called when each screen's run ends (app.py's
+``checkpointed``, in a ``finally``, so runs cut short by ``st.rerun`` count
+too) and costs a tuple compare unless the game moved on since the last
+snapshot. New snapshots are encoded there (tens of µs) and handed to one
+daemon writer, which keeps only the newest per session and writes them every
+``LQ_CHECKPOINT_DEBOUNCE`` seconds in one batch.
+
+Keys come from app.session_id(): the ``run`` link plus the browser's owner
+cookie. The one-live-tab lease of :meth:`lab.state.SessionRegistry.claim`
+lives in each process's registry, so it does not hold across replicas; two
+tabs on the same link and cookie served by different replicas can both
+resume the run, and the later snapshot wins.
+
+A store is anything with ``get(key)``, ``put_many({key: blob})`` and
+``delete(key)`` over bytes; :class:`SQLiteStore` and :class:`FileStore` are
+provided, and a Redis client wrapped as GET / MSET / DEL fits the same shape.
+
+    LQ_CHECKPOINT=sqlite:/srv/lq/checkpoints.db   one file shared by the replicas on a host or volume
+    LQ_CHECKPOINT=file:/srv/lq/checkpoints        one file per run
+    python -m lab.checkpoint --bench 2000
+"""
+import atexit
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+from dataclasses import fields
+from pathlib import Path
+
+from lab import settings
+from lab.state import GameState
+
+# per-process objects and bookkeeping; everything else is saved
+SKIP = ("started_at", "rng", "log", "des", "displayed", "announcements", "last_seen", "saved")
+FIELDS = tuple(f.name for f in fields(GameState) if f.name not in SKIP)
+
+MAGIC = b"LQC1"
+HEADER = struct.Struct("<4sI")  # magic, length of the JSON fields; the event log follows
+
+
+# ---------------- Snapshots ----------------
+def version(g):
+    """Changes whenever the game moves: every transition either steps the tutorial or logs an event."""
+    return (g.phase, g.tutorial_step, g.tutorial_finished, len(g.log) if g.log is not None else 0)
+
+
+def encode(g):
+    state = {name: getattr(g, name) for name in FIELDS}
+    state["played"] = time.monotonic() - g.started_at if g.started_at is not None else None
+    head = json.dumps(state, separators=(",", ":")).encode()
+    log = g.log.to_bytes(g.seed) if g.log is not None else b""
+    return HEADER.pack(MAGIC, len(head)) + head + log
+
+
+def decode(blob):
+    """GameState from :func:`encode` output; None if its log does not resume under the current rules."""
+    from lab import game
+
+    magic, n = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("not a λ: The Last Queue checkpoint")
+    state = json.loads(blob[HEADER.size:HEADER.size + n])
+    played = state.pop("played")
+    log = blob[HEADER.size + n:]
+    if log:
+        seed, events = game.EventLog.from_bytes(log)
+        g = game.resume(seed, events)
+        if g is None:
+            return None
+        g.started_at = time.monotonic() - (played or 0.0)
+    else:
+        g = GameState()
+    for name in FIELDS:
+        if name in state:
+            v = state[name]
+            setattr(g, name, tuple(v) if isinstance(v, list) else v)  # waits, lab_seen
+    g.saved = version(g)
+    return g
+
+
+# ---------------- Stores ----------------
+class SQLiteStore:
+    """key -> blob in one SQLite file (WAL), safe for several processes on one filesystem."""
+
+    SCHEMA = "CREATE TABLE IF NOT EXISTS checkpoints (key TEXT PRIMARY KEY, state BLOB NOT NULL, saved_at REAL NOT NULL)"
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _con(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute(self.SCHEMA)
+        return con
+
+    def get(self, key):
+        row = self._con().execute("SELECT state FROM checkpoints WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, items):
+        now = time.time()
+        with self._con() as con:
+            con.executemany("INSERT OR REPLACE INTO checkpoints (key, state, saved_at) VALUES (?, ?, ?)",
+                            [(k, v, now) for k, v in items.items()])
+
+    def delete(self, key):
+        with self._con() as con:
+            con.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+
+    def prune(self, max_age):
+        with self._con() as con:
+            return con.execute("DELETE FROM checkpoints WHERE saved_at < ?", (time.time() - max_age,)).rowcount
+
+
+class FileStore:
+    """key -> blob as one file per key, replaced atomically (a shared volume works too)."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        if not key.isalnum():
+            raise ValueError(f"bad checkpoint key {key!r}")
+        return self.root / f"{key}.lqc"
+
+    def get(self, key):
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put_many(self, items):
+        for key, blob in items.items():
+            path = self._path(key)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(blob)
+            os.replace(tmp, path)
+
+    def delete(self, key):
+        self._path(key).unlink(missing_ok=True)
+
+    def prune(self, max_age):
+        cutoff, n = time.time() - max_age, 0
+        for path in self.root.glob("*.lqc"):
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                n += 1
+        return n
+
+
+def open_store(spec):
+    """Store for an ``LQ_CHECKPOINT`` value; None when checkpoints are off."""
+    kind, _, arg = spec.partition(":")
+    if kind == "sqlite":
+        return SQLiteStore(arg)
+    if kind == "file":
+        return FileStore(arg)
+    if kind:
+        raise ValueError(f"unknown checkpoint store {spec!r}; use sqlite:PATH or file:DIR")
+    return None
+
+
+# ---------------- Debounced writer ----------------
+class Checkpointer:
+    """Newest snapshot per session, written by one daemon thread every ``debounce`` seconds."""
+
+    def __init__(self, store, debounce=None, max_age=None):
+        self.store = store
+        self.debounce = debounce if debounce is not None else settings.CHECKPOINT_DEBOUNCE
+        self.max_age = max_age if max_age is not None else settings.CHECKPOINT_MAX_AGE
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer = None
+        self.written = 0
+        self.batches = 0
+        self.superseded = 0  # snapshots replaced by a newer one before they were written
+
+    def save(self, key, g):
+        """Hand the game to the writer if it changed since its last snapshot; never touches the store."""
+        if self.store is None:
+            return
+        v = version(g)
+        if v == g.saved:
+            return
+        g.saved = v
+        blob = encode(g)
+        with self._lock:
+            self.superseded += key in self._pending
+            self._pending[key] = blob
+        self._ensure_writer()
+
+    def restore(self, key):
+        """The checkpointed game for ``key``, or None (SessionRegistry.restore)."""
+        if self.store is None:
+            return None
+        with self._lock:
+            blob = self._pending.get(key)
+        if blob is None:
+            blob = self.store.get(key)
+        return decode(blob) if blob is not None else None
+
+    def flush(self):
+        """Write everything pending now, on the calling thread (CLI, shutdown)."""
+        with self._lock:
+            items, self._pending = self._pending, {}
+        if items:
+            self.store.put_many(items)
+            self.written += len(items)
+            self.batches += 1
+
+    def close(self):
+        if self._writer is not None:
+            self._writer, writer = None, self._writer
+            self._wake.set()
+            writer.join()
+        if self.store is not None:
+            self.flush()
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._wake.clear()
+                self._writer = threading.Thread(target=self._write_loop, name="lq-checkpoint-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _write_loop(self):
+        pruned = 0.0
+        while self._writer is not None:
+            self._wake.wait(self.debounce)
+            self.flush()
+            if time.monotonic() - pruned > 3600:
+                self.store.prune(self.max_age)
+                pruned = time.monotonic()
+
+
+STORE = Checkpointer(open_store(settings.CHECKPOINT))
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    import argparse
+    import tempfile
+
+    import numpy as np
+
+    from lab import game
+
+    p = argparse.ArgumentParser(description="Time checkpoint snapshots, writes and restores.")
+    p.add_argument("--store", default=None, help="sqlite:PATH or file:DIR (default: a temporary SQLite file)")
+    p.add_argument("--bench", type=int, default=1000, help="sessions to checkpoint")
+    p.add_argument("--rounds", type=int, default=8, help="rounds each game has played")
+    p.add_argument("--servers", type=int, default=0)
+    args = p.parse_args(argv)
+
+    tmp = tempfile.TemporaryDirectory()
+    store = open_store(args.store or f"sqlite:{tmp.name}/checkpoints.db")
+    cp = Checkpointer(store)
+    games = []
+    for i in range(args.bench):
+        g = GameState()
+        game.start(g, seed=i, servers=args.servers)
+        for _ in range(args.rounds):
+            game.proceed(g)
+            if game.pull(g, spin=True):
+                game.end(g, "roulette_death")
+                break
+            game.view_report(g)
+            game.next_round(g)
+        games.append(g)
+
+    lat = np.empty(len(games))
+    for i, g in enumerate(games):
+        t = time.perf_counter()
+        cp.save(f"s{i}", g)
+        lat[i] = time.perf_counter() - t
+    t = time.perf_counter()
+    cp.save("s0", games[0])
+    unchanged = time.perf_counter() - t
+    size = np.mean([len(encode(g)) for g in games])
+    t = time.perf_counter()
+    cp.close()
+    written = time.perf_counter() - t
+    print(f"{len(games)} snapshots of {size:.0f} B: save() p50 {np.percentile(lat, 50) * 1e6:.1f} µs  "
+          f"p99 {np.percentile(lat, 99) * 1e6:.1f} µs, unchanged {unchanged * 1e6:.2f} µs")
+    print(f"written in {written * 1000:.1f} ms ({cp.batches} batch)")
+
+    lat = np.empty(len(games))
+    same = 0
+    for i, g in enumerate(games):
+        t = time.perf_counter()
+        r = cp.restore(f"s{i}")
+        lat[i] = time.perf_counter() - t
+        same += r.log == g.log and all(getattr(r, n) == getattr(g, n) for n in FIELDS) and (
+            r.rng.bit_generator.state == g.rng.bit_generator.state)
+    print(f"restore() p50 {np.percentile(lat, 50) * 1e3:.2f} ms  p99 {np.percentile(lat, 99) * 1e3:.2f} ms, "
+          f"{same}/{len(games)} identical (fields, log and RNG state)")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
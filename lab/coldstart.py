@@ -0,0 +1,165 @@
+# lab/coldstart.py
+"""Cold start and time-to-first-render of the real server.
+
+For each asset mode a fresh ``streamlit run app.py`` is started. We time
+process start until ``/_stcore/health`` answers (cold start), then open the
+app's websocket like a browser tab would and time the first script run until
+``script_finished`` (time to first render), counting the messages and bytes
+it pushed. A second rerun on the same socket shows the warm cost. A separate
+interpreter times the imports app.py needs before the first game.
+
+    python -m lab.coldstart --repeat 3 --out coldstart.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+APP = str(ROOT / "app.py")
+MODES = ("remote", "local")
+
+IMPORTS = """
+import sys, time
+t0 = time.perf_counter()
+import streamlit
+t1 = time.perf_counter()
+from lab import game, narrative, settings, state
+t2 = time.perf_counter()
+numpy_before_game = "numpy" in sys.modules
+from lab import solver
+t3 = time.perf_counter()
+print(t1 - t0, t2 - t1, t3 - t2, int(numpy_before_game))
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url, timeout=1):
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        return r.read()
+
+
+async def _renders(port, reruns):
+    """Open the app's websocket and time ``reruns`` script runs; returns [(s, msgs, bytes)]."""
+    import websockets
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    out = []
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None) as ws:
+        for _ in range(reruns):
+            msg = BackMsg()
+            msg.rerun_script.query_string = ""
+            msg.rerun_script.page_script_hash = ""
+            t0 = time.perf_counter()
+            await ws.send(msg.SerializeToString())
+            n = size = 0
+            while True:
+                raw = await ws.recv()
+                fwd = ForwardMsg()
+                fwd.ParseFromString(raw)
+                n += 1
+                size += len(raw)
+                if fwd.WhichOneof("type") == "script_finished":
+                    break
+            out.append((time.perf_counter() - t0, n, size))
+    return out
+
+
+def server_run(mode, timeout=60):
+    """One cold server start in ``mode``; returns a dict of timings and sizes."""
+    port = _free_port()
+    env = dict(os.environ, LQ_ASSETS=mode)
+    cmd = [sys.executable, "-m", "streamlit", "run", APP, "--server.headless", "true",
+           "--server.port", str(port), "--server.enableXsrfProtection", "false",
+           "--browser.gatherUsageStats", "false"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                _get(f"http://127.0.0.1:{port}/_stcore/health")
+                break
+            except OSError:
+                if proc.poll() is not None or time.perf_counter() - t0 > timeout:
+                    raise RuntimeError(f"streamlit did not come up in {mode} mode")
+                time.sleep(0.01)
+        ready = time.perf_counter() - t0
+        (first, first_msgs, first_bytes), (warm, warm_msgs, warm_bytes) = asyncio.run(_renders(port, 2))
+        assets = {}
+        if mode == "local":
+            for name in ("font.css", "lq.css", "fonts/PressStart2P-Regular.ttf"):
+                try:
+                    assets[name] = len(_get(f"http://127.0.0.1:{port}/app/static/{name}"))
+                except OSError:
+                    assets[name] = None
+        return {"server_ready_s": ready, "first_render_s": first, "time_to_first_render_s": ready + first,
+                "first_msgs": first_msgs, "first_bytes": first_bytes,
+                "warm_rerun_s": warm, "warm_msgs": warm_msgs, "warm_bytes": warm_bytes, "static_bytes": assets}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def import_run():
+    """Import times (s) in a fresh interpreter, and whether NumPy loads before the first game."""
+    out = subprocess.run([sys.executable, "-c", IMPORTS], cwd=ROOT, capture_output=True, text=True, check=True)
+    st_s, lab_s, solver_s, numpy_early = out.stdout.split()
+    return {"streamlit_s": float(st_s), "lab_s": float(lab_s), "deferred_solver_s": float(solver_s),
+            "numpy_before_game": bool(int(numpy_early))}
+
+
+def _median(runs):
+    keys = [k for k, v in runs[0].items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    out = {k: float(np.median([r[k] for r in runs])) for k in keys}
+    out.update({k: v for k, v in runs[0].items() if k not in out})
+    return out
+
+
+def run(repeat=3, modes=MODES):
+    report = {"imports": _median([import_run() for _ in range(repeat)]), "modes": {}}
+    for mode in modes:
+        report["modes"][mode] = _median([server_run(mode) for _ in range(repeat)])
+    report["host"] = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()}
+    report["repeat"] = repeat
+    return report
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Cold start and time-to-first-render of app.py.")
+    p.add_argument("--repeat", type=int, default=3, help="cold starts per mode (medians are reported)")
+    p.add_argument("--mode", choices=MODES, action="append", default=None)
+    p.add_argument("--out", default="coldstart.json")
+    args = p.parse_args(argv)
+
+    report = run(args.repeat, tuple(args.mode or MODES))
+    Path(args.out).write_text(json.dumps(report, indent=2))
+
+    imp = report["imports"]
+    print(f"import streamlit {imp['streamlit_s'] * 1000:.0f} ms, lab {imp['lab_s'] * 1000:.0f} ms, "
+          f"solver+NumPy deferred {imp['deferred_solver_s'] * 1000:.0f} ms "
+          f"(NumPy before first game: {imp['numpy_before_game']})")
+    for mode, m in report["modes"].items():
+        print(f"{mode:<7} server ready {m['server_ready_s'] * 1000:.0f} ms, first render +{m['first_render_s'] * 1000:.0f} ms "
+              f"({m['first_msgs']:.0f} msgs, {m['first_bytes']:.0f} B), warm rerun {m['warm_rerun_s'] * 1000:.0f} ms "
+              f"({m['warm_bytes']:.0f} B)")
+    print(f"-> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
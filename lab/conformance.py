@@ -0,0 +1,416 @@
+# lab/conformance.py
+"""Does the round logic produce the distributions the tutorial promises, and how fast?
+
+Games are driven headlessly through lab/game.py exactly as the screens in
+app.py drive them (the player spins half the time and never quits), and the
+draws are read back from their event logs:
+
+    spin_chamber        a spin lands on each chamber with probability 1/6        chi-square
+    spin_fires          a spin fires with probability 1/6                         binomial
+    no_spin_hazard      Don't Spin fires with probability 1/(6 - k) after k
+                        empty chambers (dependent)                                chi-square
+    arrivals            arrivals ~ Poisson(λ) at each round's λ                   KS on randomised PIT
+    services            services = min(queue + arrivals, max(1, Poisson(μ)))     KS on randomised PIT
+    toxin_drops         drops ~ Poisson(lam_poison)                               chi-square
+    antidote_rate       a cart comes with probability antidote_chance             binomial
+    antidote_amount     and takes off antidote_min..antidote_max, uniformly       chi-square
+    collapse_rule       the game ends in queue collapse exactly when λ ≥ μ or
+                        the queue passes queue_cap                                 count (must be 0)
+    survival_prob       survival_prob is pull_factor ** (pulls survived)          count (must be 0)
+    engine_endings      lab/engine.py gives the same endings × rounds as game.py  chi-square
+    engine_toxicity     and the same toxicity at the end                          two-sample KS
+    replay              replay() of each log rebuilds the live state, one-step
+                        and M/M/c queues alike, and verify() accepts it            count (must be 0)
+
+A randomised PIT, F(x - 1) + V·P(x) with V uniform, is uniform for a discrete
+x exactly when x has distribution F, so one KS test covers draws whose λ or
+μ differ from round to round. Every test fails at p < alpha / (number of
+tests); the seeds are fixed, so a run is reproducible.
+
+Benchmarks time rounds per second through lab/engine.py and lab/game.py,
+and events per second through replay, and fail when one falls more than
+``--tolerance`` below lab/conformance.json (``--update-baselines`` rewrites it
+on the machine that should be the reference).
+
+    python -m lab.conformance
+    python -m lab.conformance --games 100000 --engine-games 2000000 --skip-perf
+"""
+import json
+import math
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+
+from lab import engine, game
+from lab.rules import ENDINGS, UNFINISHED
+from lab.state import GameState
+
+BASELINES = Path(__file__).with_suffix(".json")
+ROUND_BUCKETS = 8   # rounds 1..7 and 8+ in the endings × rounds table
+
+
+@dataclass
+class Result:
+    name: str
+    stat: float
+    p: float            # p-value; None for counts that must be zero
+    n: int              # samples behind the test
+    passed: bool = True
+    detail: str = ""
+
+
+# ---------------- Distributions ----------------
+def _gammaq(a, x):
+    """Regularised upper incomplete gamma Q(a, x) (series below a + 1, continued fraction above)."""
+    if x <= 0:
+        return 1.0
+    lead = math.exp(-x + a * math.log(x) - math.lgamma(a))
+    if x < a + 1:
+        term = total = 1.0 / a
+        k = a
+        while abs(term) > abs(total) * 1e-15:
+            k += 1
+            term *= x / k
+            total += term
+        return max(0.0, 1.0 - lead * total)
+    b = x + 1 - a
+    c, d = 1e300, 1 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1 / d if abs(d) > 1e-300 else 1e300
+        c = b + an / c if abs(c) > 1e-300 else 1e-300
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return lead * h
+
+
+def chi2_sf(x, dof):
+    return _gammaq(dof / 2, x / 2)
+
+
+def ks_sf(d, n):
+    """P(D_n > d) for the one-sample KS statistic (Stephens' approximation)."""
+    lam = (math.sqrt(n) + 0.12 + 0.11 / math.sqrt(n)) * d
+    if lam < 0.2:
+        return 1.0
+    return min(1.0, max(0.0, 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * lam * lam) for k in range(1, 101))))
+
+
+def poisson_cdf(k, lam):
+    """P(X ≤ k) for X ~ Poisson(lam), elementwise; 0 where k < 0."""
+    k = np.asarray(k, np.int64)
+    lam = np.asarray(lam, float)
+    top = max(0, int(k.max(initial=0)))
+    j = np.arange(top + 1)
+    logfact = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, top + 1)))))
+    pmf = np.exp(j * np.log(np.maximum(lam, 1e-300))[:, None] - lam[:, None] - logfact)
+    cdf = np.cumsum(pmf, axis=1)
+    return np.where(k < 0, 0.0, cdf[np.arange(len(k)), np.clip(k, 0, top)])
+
+
+# ---------------- Tests ----------------
+def chisquare(observed, expected, name, ddof=0):
+    """Goodness of fit, with bins of expected count < 5 pooled into their neighbours."""
+    obs, exp = list(map(float, observed)), list(map(float, expected))
+    while len(exp) > 2 and exp[-1] < 5:
+        o, e = obs.pop(), exp.pop()
+        obs[-1] += o
+        exp[-1] += e
+    while len(exp) > 2 and exp[0] < 5:
+        o, e = obs.pop(0), exp.pop(0)
+        obs[0] += o
+        exp[0] += e
+    obs, exp = np.array(obs), np.array(exp)
+    stat = float(((obs - exp) ** 2 / exp).sum())
+    dof = len(obs) - 1 - ddof
+    return Result(name, stat, chi2_sf(stat, dof), int(obs.sum()), detail=f"{dof} dof")
+
+
+def binomial(k, n, p, name):
+    """Two-sided normal-approximation test of k successes in n trials at rate p."""
+    z = (k - n * p) / math.sqrt(n * p * (1 - p))
+    return Result(name, z, 2 * (1 - NormalDist().cdf(abs(z))), n, detail=f"{k / n:.5f} vs {p:.5f}")
+
+
+def ks_uniform(u, name):
+    u = np.sort(u)
+    n = len(u)
+    i = np.arange(1, n + 1)
+    d = float(max((i / n - u).max(), (u - (i - 1) / n).max()))
+    return Result(name, d, ks_sf(d, n), n)
+
+
+def ks_two(a, b, name):
+    """Two-sample KS test (conservative with ties)."""
+    a, b = np.sort(a), np.sort(b)
+    x = np.concatenate([a, b])
+    d = float(np.abs(np.searchsorted(a, x, "right") / len(a) - np.searchsorted(b, x, "right") / len(b)).max())
+    n = len(a) * len(b) / (len(a) + len(b))
+    return Result(name, d, ks_sf(d, n), len(a) + len(b))
+
+
+def contingency(table, name):
+    """Chi-square test that the rows of ``table`` come from one distribution (empty columns dropped)."""
+    t = np.asarray(table, float)
+    t = t[:, t.sum(axis=0) > 0]
+    exp = t.sum(axis=1, keepdims=True) * t.sum(axis=0) / t.sum()
+    keep = exp.min(axis=0) >= 5
+    t = np.column_stack([t[:, keep], t[:, ~keep].sum(axis=1)]) if (~keep).any() else t
+    exp = t.sum(axis=1, keepdims=True) * t.sum(axis=0) / t.sum()
+    stat = float(((t - exp) ** 2 / exp).sum())
+    dof = (t.shape[0] - 1) * (t.shape[1] - 1)
+    return Result(name, stat, chi2_sf(stat, dof), int(t.sum()), detail=f"{dof} dof")
+
+
+def zero(count, n, name, what):
+    return Result(name, count, None, n, passed=count == 0, detail=f"{count} {what}")
+
+
+# ---------------- Headless play ----------------
+def drive(n, seed=0, spin=0.5, max_rounds=200, servers=0):
+    """Play ``n`` games through lab/game.py the way app.py's screens do; returns [(seed, log, state)]."""
+    rng = np.random.default_rng(seed)
+    played = []
+    for s in rng.integers(0, 2 ** 63, n, dtype=np.uint64):
+        g = GameState()
+        game.start(g, int(s), servers)
+        while True:
+            if game.collapsed(g):
+                game.end(g, "queue_collapse")
+                break
+            game.proceed(g)
+            if game.pull(g, bool(rng.random() < spin)):
+                game.end(g, "roulette_death")
+                break
+            if game.toxic(g):
+                game.end(g, "toxic_death")
+                break
+            game.view_report(g)
+            if game.escaped(g):
+                game.end(g, "escape")
+                break
+            if game.transcended(g):
+                game.end(g, "secret")
+                break
+            if g.round >= max_rounds:
+                break
+            game.next_round(g)
+        played.append((int(s), g.log, g))
+    return played
+
+
+def samples(played):
+    """The draws of every phase, read back from the event logs."""
+    r = game.RULES
+    out = {k: [] for k in ("arrivals", "services", "chamber", "spin_fired", "no_spin", "drops", "antidote",
+                           "amount")}
+    collapse_bad = surv_bad = 0
+    for seed, log, _ in played:
+        events = list(log)
+        g = GameState()
+        survived = 0
+        for i, (code, v) in enumerate(events):
+            nxt = events[i + 1][0] if i + 1 < len(events) else None
+            if code == game.ARRIVALS:
+                out["arrivals"].append((g.lmbd, v))
+            elif code == game.SERVICES:
+                out["services"].append((g.mu, g.queue_length, v))
+            elif code == game.PULL and v:
+                out["chamber"].append(events[i + 1][1])
+                out["spin_fired"].append(events[i + 2][0] != game.SURVIVE if i + 2 < len(events) else True)
+            elif code == game.PULL:
+                out["no_spin"].append((g.cleared, nxt != game.SURVIVE))
+            elif code == game.DROPS:
+                out["drops"].append(v)
+                out["antidote"].append(nxt == game.ANTIDOTE)
+            elif code == game.ANTIDOTE:
+                out["amount"].append(v)
+            game.apply(g, code, v)
+            if code == game.SERVICES:
+                ended = nxt == game.ENDING and events[i + 1][1] == ENDINGS.index("queue_collapse")
+                collapse_bad += game.collapsed(g) != ended
+            elif code == game.SURVIVE:
+                survived += 1
+                surv_bad += not math.isclose(g.survival_prob, r.pull_factor ** survived, rel_tol=1e-12)
+    return {k: np.array(v) for k, v in out.items()}, collapse_bad, surv_bad
+
+
+REPLAYED = ("phase", "phase_part", "round", "queue_length", "toxicity", "lmbd", "mu", "survival_prob",
+            "bullet_pos", "chamber_pointer", "cleared", "ending_type", "servers", "arrivals", "services")
+
+
+def replay_mismatches(played):
+    """Games whose replayed state differs from the live one, or whose log does not verify."""
+    bad = 0
+    for seed, log, g in played:
+        r = game.replay(seed, log)
+        bad += any(getattr(r, f) != getattr(g, f) for f in REPLAYED) or not game.verify(seed, log)
+    return bad
+
+
+def _pit(lo, hi, rng):
+    """Randomised probability integral transform from P(X < x) and P(X ≤ x)."""
+    return lo + rng.random(len(lo)) * (hi - lo)
+
+
+def _table(ending, rounds):
+    row = np.where(ending == UNFINISHED, len(ENDINGS), ending)
+    t = np.zeros((len(ENDINGS) + 1, ROUND_BUCKETS), np.int64)
+    np.add.at(t, (row, np.minimum(rounds, ROUND_BUCKETS) - 1), 1)
+    return t.ravel()
+
+
+def check(games=20000, engine_games=500000, seed=0, max_rounds=200):
+    """Every statistical test; a list of :class:`Result`."""
+    r = game.RULES
+    rng = np.random.default_rng([seed, 1])
+    played = drive(games, seed, max_rounds=max_rounds)
+    s, collapse_bad, surv_bad = samples(played)
+    results = []
+    c = r.chambers
+
+    ch = s["chamber"].astype(np.int64)
+    results.append(chisquare(np.bincount(ch, minlength=c + 1)[1:], np.full(c, len(ch) / c), "spin_chamber"))
+    results.append(binomial(int(s["spin_fired"].sum()), len(s["spin_fired"]), 1 / c, "spin_fires"))
+
+    # after k empty chambers the bullet is in one of the c - k left; at k = c - 1 it must fire
+    k, fired = s["no_spin"][:, 0].astype(np.int64), s["no_spin"][:, 1].astype(bool)
+    n_k = np.bincount(k, minlength=c)[:c]
+    obs = np.bincount(k[fired], minlength=c)[:c]
+    h = 1 / (c - np.arange(c - 1))
+    used = n_k[:-1] * h * (1 - h) >= 5
+    stat = float(((obs[:-1] - n_k[:-1] * h) ** 2 / (n_k[:-1] * h * (1 - h)))[used].sum())
+    missed = int(n_k[-1] - obs[-1])
+    results.append(Result("no_spin_hazard", stat, chi2_sf(stat, int(used.sum())), int(n_k.sum()),
+                          passed=missed == 0, detail=f"{int(used.sum())} dof, {missed} misses at k={c - 1}"))
+
+    lam, x = s["arrivals"][:, 0], s["arrivals"][:, 1].astype(np.int64)
+    results.append(ks_uniform(_pit(poisson_cdf(x - 1, lam), poisson_cdf(x, lam), rng), "arrivals"))
+
+    mu, cap, x = s["services"][:, 0], s["services"][:, 1].astype(np.int64), s["services"][:, 2].astype(np.int64)
+
+    def served_cdf(v):
+        return np.where(v >= cap, 1.0, np.where(v < 1, 0.0, poisson_cdf(v, mu)))
+
+    results.append(ks_uniform(_pit(served_cdf(x - 1), served_cdf(x), rng), "services"))
+
+    d = s["drops"].astype(np.int64)
+    top = int(d.max())
+    pmf = np.diff(poisson_cdf(np.arange(-1, top + 1), np.full(top + 2, r.lam_poison)))  # 0..top
+    expected = len(d) * np.append(pmf, 1 - pmf.sum())                                    # and top + 1 and up
+    results.append(chisquare(np.bincount(d, minlength=top + 2), expected, "toxin_drops"))
+
+    results.append(binomial(int(s["antidote"].sum()), len(s["antidote"]), r.antidote_chance, "antidote_rate"))
+    a = s["amount"].astype(np.int64) - r.antidote_min
+    width = r.antidote_max - r.antidote_min + 1
+    results.append(chisquare(np.bincount(a, minlength=width), np.full(width, len(a) / width), "antidote_amount"))
+
+    phases = len(s["services"])
+    results.append(zero(collapse_bad, phases, "collapse_rule", "queue phases ended wrongly"))
+    results.append(zero(surv_bad, int(len(s["chamber"]) + len(s["no_spin"])), "survival_prob", "pulls misrecorded"))
+
+    ending = np.array([ENDINGS.index(g.ending_type) if g.ending_type else UNFINISHED for _, _, g in played])
+    rounds = np.array([g.round for _, _, g in played])
+    batch = engine.play(engine_games, r, np.random.default_rng([seed, 2]), max_rounds=max_rounds)
+    results.append(contingency([_table(ending, rounds), _table(batch.ending, batch.rounds)], "engine_endings"))
+    results.append(ks_two(np.array([g.toxicity for _, _, g in played]), batch.toxicity, "engine_toxicity"))
+
+    crowded = [p for c in (2, 100) for p in drive(max(50, games // 100), seed + c, max_rounds=max_rounds, servers=c)]
+    results.append(zero(replay_mismatches(played[:2000] + crowded), min(games, 2000) + len(crowded), "replay",
+                        "games replay differently"))
+    return results
+
+
+# ---------------- Benchmarks ----------------
+def _best(fn, repeat):
+    best = math.inf
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def bench(repeat=3, seed=0):
+    """Throughput of each path: {name: per second}."""
+    dt, batch = _best(lambda: engine.play(200000, rng=np.random.default_rng(seed)), repeat)
+    engine_rps = batch.rounds.sum() / dt
+    dt, played = _best(lambda: drive(2000, seed), repeat)
+    game_rps = sum(g.round for _, _, g in played) / dt
+    events = sum(len(log) for _, log, _ in played)
+    dt, _ = _best(lambda: [game.replay(s, log) for s, log, _ in played], repeat)
+    return {"engine_rounds_per_s": round(float(engine_rps)), "game_rounds_per_s": round(float(game_rps)),
+            "replay_events_per_s": round(events / dt)}
+
+
+def compare(measured, baselines, tolerance):
+    """Results for each benchmark against its baseline; slower than (1 - tolerance) × baseline fails."""
+    out = []
+    for name, v in measured.items():
+        base = baselines.get(name)
+        if base is None:
+            out.append(Result(name, v, None, 0, detail=f"{v:,.0f}/s (no baseline)"))
+            continue
+        out.append(Result(name, v / base, None, 0, passed=v >= base * (1 - tolerance),
+                          detail=f"{v:,.0f}/s vs {base:,.0f}/s baseline ({v / base - 1:+.0%})"))
+    return out
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    import argparse
+    import platform
+
+    p = argparse.ArgumentParser(description="Statistical conformance and performance regression checks.")
+    p.add_argument("--games", type=int, default=20000, help="games driven through lab/game.py")
+    p.add_argument("--engine-games", type=int, default=500000, help="games through lab/engine.py to compare")
+    p.add_argument("--alpha", type=float, default=0.001, help="overall false-alarm rate of the statistical tests")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown against the baselines")
+    p.add_argument("--repeat", type=int, default=3, help="timing runs per benchmark (best is kept)")
+    p.add_argument("--skip-perf", action="store_true")
+    p.add_argument("--skip-stats", action="store_true")
+    p.add_argument("--update-baselines", action="store_true", help=f"write this machine's numbers to {BASELINES.name}")
+    args = p.parse_args(argv)
+
+    failed = 0
+    if not args.skip_stats:
+        t0 = time.perf_counter()
+        results = check(args.games, args.engine_games, args.seed)
+        level = args.alpha / sum(res.p is not None for res in results)
+        print(f"conformance: {args.games:,} games through lab/game.py, {args.engine_games:,} through lab/engine.py, "
+              f"{time.perf_counter() - t0:.1f}s; fail at p < {level:.1e}")
+        for res in results:
+            if res.p is not None:
+                res.passed = res.passed and res.p >= level
+            failed += not res.passed
+            p_text = f"p={res.p:.4f}" if res.p is not None else ""
+            print(f"  {'ok  ' if res.passed else 'FAIL'} {res.name:<16} n={res.n:>9,}  {p_text:<9}  {res.detail}")
+
+    if not args.skip_perf:
+        measured = bench(args.repeat, args.seed)
+        if args.update_baselines:
+            BASELINES.write_text(json.dumps({"machine": f"{platform.machine()} {platform.python_version()} "
+                                                        f"numpy {np.__version__}", **measured}, indent=2) + "\n")
+            print(f"baselines written to {BASELINES}")
+        baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+        print(f"performance (best of {args.repeat}, fail below -{args.tolerance:.0%}; "
+              f"baselines from {baselines.get('machine', 'nowhere')}):")
+        for res in compare(measured, baselines, args.tolerance):
+            failed += not res.passed
+            print(f"  {'ok  ' if res.passed else 'FAIL'} {res.name:<20} {res.detail}")
+
+    if failed:
+        raise SystemExit(f"{failed} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
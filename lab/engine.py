@@ -0,0 +1,258 @@
+# lab/engine.py
+"""Vectorized Monte Carlo engine: millions of independent games advanced as NumPy arrays.
+
+Each call to :func:`play` runs the same round logic as the ``queue``/``roulette``/
+``poison``/``report`` branches of ``app.py`` on a whole batch of games at once.
+Finished games are dropped from the working arrays after every round, so the
+cost of a round is proportional to the games still alive. The two button
+choices, Spin / Don't Spin and Continue / Quit, come from a strategy (see
+:mod:`lab.bots`); by default players spin with probability ``spin`` and
+always continue.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from lab.rules import (
+    DEFAULT_RULES, ENDINGS, ESCAPE, QUEUE_COLLAPSE, ROULETTE_DEATH, SECRET, TOXIC_DEATH, UNFINISHED, VOLUNTARY_EXIT,
+)
+
+DEFAULT_CHUNK = 1 << 20
+
+
+# ---------------- Per-game results ----------------
+@dataclass
+class Batch:
+    """Outcome of every game in one batch (one entry per game)."""
+    ending: np.ndarray      # int8 ending code, UNFINISHED if the round cap was hit
+    rounds: np.ndarray      # round in which the game ended
+    toxicity: np.ndarray    # toxicity when the game ended
+    lmbd: np.ndarray        # λ when the game ended
+    mu: np.ndarray          # μ when the game ended
+
+    def __len__(self):
+        return len(self.ending)
+
+
+# ---------------- Aggregated results ----------------
+@dataclass
+class Summary:
+    """Ending-type counts and rounds-survived histograms over many games.
+
+    Row ``i`` of ``counts``/``rounds`` is ``ENDINGS[i]``; the last row counts unfinished games.
+    """
+    counts: np.ndarray      # (len(ENDINGS) + 1,)
+    rounds: np.ndarray      # (len(ENDINGS) + 1, max_rounds + 1)
+
+    @classmethod
+    def empty(cls, max_rounds):
+        return cls(np.zeros(len(ENDINGS) + 1, np.int64),
+                   np.zeros((len(ENDINGS) + 1, max_rounds + 1), np.int64))
+
+    @property
+    def games(self):
+        return int(self.counts.sum())
+
+    def add(self, batch):
+        """Fold a :class:`Batch` into the running totals."""
+        row = np.where(batch.ending == UNFINISHED, len(ENDINGS), batch.ending)
+        self.counts += np.bincount(row, minlength=len(self.counts))
+        np.add.at(self.rounds, (row, np.minimum(batch.rounds, self.rounds.shape[1] - 1)), 1)
+        return self
+
+    def merge(self, other):
+        """Fold another :class:`Summary` into this one."""
+        self.counts += other.counts
+        self.rounds += other.rounds
+        return self
+
+    def distribution(self):
+        """Fraction of games per ending name (plus ``"unfinished"``)."""
+        total = max(1, self.games)
+        names = ENDINGS + ("unfinished",)
+        return {name: self.counts[i] / total for i, name in enumerate(names)}
+
+    def mean_rounds(self):
+        """Mean round at which games ended."""
+        r = self.rounds.sum(axis=0)
+        return float((r * np.arange(len(r))).sum() / max(1, r.sum()))
+
+
+# ---------------- What a player sees ----------------
+class View:
+    """The screen of every live game at a decision, as arrays, for a strategy to act on.
+
+    ``u`` is one uniform draw per game and round, for randomised strategies;
+    it is drawn whether or not the strategy uses it, so every strategy sees
+    the same random stream.
+    """
+    __slots__ = ("round", "queue_length", "toxicity", "lmbd", "mu", "survival_prob", "cleared", "u")
+
+    def __init__(self, round, queue_length, toxicity, lmbd, mu, survival_prob, cleared, u):
+        self.round, self.queue_length, self.toxicity = round, queue_length, toxicity
+        self.lmbd, self.mu, self.survival_prob, self.cleared, self.u = lmbd, mu, survival_prob, cleared, u
+
+    def __len__(self):
+        return len(self.round)
+
+
+# ---------------- Core loop ----------------
+def play(n, rules=DEFAULT_RULES, rng=None, spin=0.5, max_rounds=200, strategy=None):
+    """Play ``n`` games to completion and return a :class:`Batch`.
+
+    ``strategy`` (a :class:`lab.bots.Strategy`) makes the roulette and report
+    choices. Without one, a player chooses "Spin" over "Don't Spin" with
+    probability ``spin`` and always presses "Continue" after the report.
+    """
+    if strategy is None:
+        from lab.bots import Mixed
+        strategy = Mixed(spin)
+    rng = np.random.default_rng(rng)
+    r = rules
+    out = Batch(np.full(n, UNFINISHED, np.int8), np.zeros(n, np.int32),
+                np.zeros(n), np.zeros(n), np.zeros(n))
+
+    # start_game
+    ids = np.arange(n)
+    rnd = np.ones(n, np.int32)
+    q = np.full(n, r.start_queue, np.int64)
+    tox = np.full(n, r.start_toxicity)
+    lam = np.round(np.maximum(r.lam_start_floor, rng.normal(r.lam_mean, r.lam_sd, n)), 2)
+    mu = np.round(np.maximum(r.mu_start_floor, rng.normal(r.mu_mean, r.mu_sd, n)), 2)
+    surv = np.ones(n)
+    bullet = rng.integers(1, r.chambers + 1, n)
+    cp = np.ones(n, np.int64)
+    cleared = np.zeros(n, np.int64)
+
+    for _ in range(max_rounds):
+        m = len(ids)
+        if m == 0:
+            break
+        ending = np.full(m, UNFINISHED, np.int8)
+
+        # queue phase
+        lam = np.round(np.maximum(r.lam_floor, lam + r.lam_drift * rng.standard_normal(m)), 2)
+        mu = np.round(np.maximum(r.mu_floor, mu + r.mu_drift * rng.standard_normal(m)), 2)
+        arrivals = rng.poisson(lam)
+        services = np.minimum(q + arrivals, np.maximum(1, rng.poisson(mu)))
+        q = np.maximum(0, q + arrivals - services)
+        ending[(lam >= mu) | (q > r.queue_cap)] = QUEUE_COLLAPSE
+        live = ending == UNFINISHED
+
+        # roulette phase
+        u = rng.random(m)
+        spins = np.asarray(strategy.spin(View(rnd, q, tox, lam, mu, surv, cleared, u)), bool)
+        chamber = rng.integers(1, r.chambers + 1, m)
+        hit = np.where(spins, chamber == bullet, cp == bullet)
+        ending[live & hit] = ROULETTE_DEATH
+        live &= ~hit
+        surv = np.where(live, surv * r.pull_factor, surv)
+        tox = np.where(live, np.maximum(0.0, tox - r.pull_relief), tox)
+        cp = np.where(spins, rng.integers(1, r.chambers + 1, m), cp % r.chambers + 1)
+        cleared = np.where(spins, 0, cleared + 1)
+
+        # poison phase
+        drops = rng.poisson(r.lam_poison, m)
+        poisoned = np.minimum(100.0, tox + drops * r.drop_toxicity)
+        antidote = rng.random(m) < r.antidote_chance
+        red = rng.integers(r.antidote_min, r.antidote_max + 1, m)
+        poisoned = np.where(antidote, np.maximum(0.0, poisoned - red), poisoned)
+        tox = np.where(live, poisoned, tox)
+        dead = live & (tox >= 100.0)
+        ending[dead] = TOXIC_DEATH
+        live &= ~dead
+
+        # report phase
+        escaped = live & (rnd >= r.escape_round) & (lam / mu < 1) & (tox < r.escape_toxicity)
+        ending[escaped] = ESCAPE
+        live &= ~escaped
+        secret = live & (rnd >= r.secret_round) & (surv >= r.secret_survival)
+        ending[secret] = SECRET
+        live &= ~secret
+        quits = live & np.asarray(strategy.quit(View(rnd, q, tox, lam, mu, surv, cleared, u)), bool)
+        ending[quits] = VOLUNTARY_EXIT
+        live &= ~quits
+
+        # record finished games, then drop them from the working set
+        done = ~live
+        d = ids[done]
+        out.ending[d] = ending[done]
+        out.rounds[d] = rnd[done]
+        out.toxicity[d] = tox[done]
+        out.lmbd[d] = lam[done]
+        out.mu[d] = mu[done]
+        ids, rnd, q, tox, lam, mu, surv, bullet, cp, cleared = (
+            a[live] for a in (ids, rnd, q, tox, lam, mu, surv, bullet, cp, cleared))
+
+        # "Continue"
+        rnd += 1
+        lam = np.minimum(r.lam_max, np.round(lam + rng.uniform(r.lam_creep_min, r.lam_creep_max, len(ids)), 2))
+
+    # games still running at the cap
+    out.rounds[ids] = rnd - 1
+    out.toxicity[ids] = tox
+    out.lmbd[ids] = lam
+    out.mu[ids] = mu
+    return out
+
+
+def _play_chunk(args):
+    n, rules, seed, spin, max_rounds = args
+    return Summary.empty(max_rounds).add(play(n, rules, np.random.default_rng(seed), spin, max_rounds))
+
+
+def simulate(n, rules=DEFAULT_RULES, seed=None, spin=0.5, max_rounds=200, chunk=DEFAULT_CHUNK, workers=1):
+    """Play ``n`` games in chunks of ``chunk`` and return a :class:`Summary`.
+
+    Memory stays bounded by ``chunk`` per worker no matter how large ``n`` is.
+    Every chunk gets its own child seed, so results for a given ``seed`` do not
+    depend on ``workers``.
+    """
+    sizes = [min(chunk, n - i) for i in range(0, n, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(k, rules, s, spin, max_rounds) for k, s in zip(sizes, seeds)]
+    summary = Summary.empty(max_rounds)
+    if workers > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as pool:
+            for part in pool.map(_play_chunk, jobs):
+                summary.merge(part)
+    else:
+        for job in jobs:
+            summary.merge(_play_chunk(job))
+    return summary
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    import argparse
+    import time
+
+    p = argparse.ArgumentParser(description="Headless Monte Carlo run of λ: The Last Queue.")
+    p.add_argument("-n", "--games", type=float, default=1e6)
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--spin", type=float, default=0.5, help="probability of choosing Spin")
+    p.add_argument("--max-rounds", type=int, default=200)
+    p.add_argument("--chunk", type=int, default=DEFAULT_CHUNK)
+    p.add_argument("--workers", type=int, default=1, help="processes to spread chunks over")
+    args = p.parse_args(argv)
+
+    n = int(args.games)
+    t0 = time.perf_counter()
+    s = simulate(n, seed=args.seed, spin=args.spin, max_rounds=args.max_rounds,
+                 chunk=args.chunk, workers=args.workers)
+    dt = time.perf_counter() - t0
+
+    print(f"{n:,} games in {dt:.2f}s ({n / dt:,.0f} games/s)")
+    for name, frac in s.distribution().items():
+        print(f"  {name:<16} {frac:8.4%}")
+    print(f"  mean rounds      {s.mean_rounds():.2f}")
+    hist = s.rounds.sum(axis=0)
+    last = int(np.flatnonzero(hist).max()) if hist.any() else 0
+    print("rounds survived:")
+    for rnd in range(1, last + 1):
+        print(f"  {rnd:>3} {hist[rnd] / max(1, s.games):8.4%}")
+
+
+if __name__ == "__main__":
+    main()
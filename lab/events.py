@@ -0,0 +1,311 @@
+# lab/events.py
+"""Game transitions streamed into live cross-session aggregates for the operator page.
+
+app.py calls :meth:`Pipeline.emit` at every phase transition; that only puts
+a 7-tuple on a bounded in-memory queue (and drops it if the queue is full,
+like the leaderboard). One daemon consumer takes whatever has piled up, folds
+the batch into :class:`Aggregates` with a few vectorised adds, and appends it
+to the current segment. Segments are written as Parquet files, a new one every
+``LQ_EVENTS_SEGMENT_ROWS`` events or ``LQ_EVENTS_SEGMENT_SECONDS`` seconds,
+and only the newest ``LQ_EVENTS_KEEP`` are kept; the aggregates are saved next
+to them on every rotation and loaded again at startup.
+
+The aggregates are fixed-size arrays (counters, histograms, a ring of
+per-minute buckets), so the dashboard reads the same few KB whether ten games
+or ten million have been played. The raw segments are for offline analysis
+only; nothing in the app reads them back.
+
+    python -m lab.events --bench 1000000
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from lab import settings
+from lab.rules import ENDINGS
+
+KINDS = ("start", "roulette", "spin", "stay", "report", "continue", "ending")
+START, ROULETTE, SPIN, STAY, REPORT, CONTINUE, ENDING = range(len(KINDS))
+COLUMNS = ("t", "kind", "round", "toxicity", "lmbd", "mu", "value")  # value: fired for pulls, ending index
+
+ROUNDS_MAX = 40    # rounds survived past this share the last bin
+TOX_BINS = 10      # toxicity in 10% steps
+RATE_EDGES = tuple(i / 10 for i in range(21))  # λ and μ bins at collapse, 0.0 .. 2.0 (higher goes in the last)
+WINDOW = 60        # minutes in the rolling window
+
+_STOP = object()
+
+
+# ---------------- Aggregates ----------------
+class Aggregates:
+    """Everything the dashboard shows, as fixed-size NumPy arrays updated batch by batch."""
+
+    ARRAYS = ("kinds", "endings", "rounds", "tox_hist", "tox_sum", "pulls", "collapse", "ring", "ring_minute")
+
+    def __init__(self):
+        import numpy as np
+
+        n_rates = len(RATE_EDGES) - 1
+        self.kinds = np.zeros(len(KINDS), np.int64)
+        self.endings = np.zeros(len(ENDINGS), np.int64)
+        self.rounds = np.zeros((len(ENDINGS), ROUNDS_MAX + 1), np.int64)    # rounds survived per ending
+        self.tox_hist = np.zeros((ROUNDS_MAX + 1, TOX_BINS), np.int64)       # toxicity at each round's report
+        self.tox_sum = np.zeros(ROUNDS_MAX + 1)
+        self.pulls = np.zeros((2, 2), np.int64)                              # [spin, stay] x [survived, fired]
+        self.collapse = np.zeros((n_rates, n_rates), np.int64)               # λ x μ at queue collapse
+        self.ring = np.zeros((WINDOW, 1 + len(ENDINGS)), np.int64)           # per minute: starts, endings
+        self.ring_minute = np.full(WINDOW, -1, np.int64)
+        self._lock = threading.Lock()
+
+    def fold(self, rows):
+        """Add a batch of events, an (n, len(COLUMNS)) float array."""
+        import numpy as np
+
+        t, kind, rnd, tox, lam, mu, value = rows.T
+        kind = kind.astype(np.intp)
+        rnd = np.minimum(rnd.astype(np.intp), ROUNDS_MAX)
+        end = kind == ENDING
+        rep = kind == REPORT
+        pull = (kind == SPIN) | (kind == STAY)
+        ei = value[end].astype(np.intp)
+        collapse = ei == ENDINGS.index("queue_collapse")
+        edges = np.asarray(RATE_EDGES)
+        li = np.clip(np.searchsorted(edges, lam[end][collapse], "right") - 1, 0, len(edges) - 2)
+        mi = np.clip(np.searchsorted(edges, mu[end][collapse], "right") - 1, 0, len(edges) - 2)
+        minute = (t // 60).astype(np.int64)
+        col = np.where(end, 1 + value.astype(np.intp), 0)
+        counted = end | (kind == START)
+        with self._lock:
+            self.kinds += np.bincount(kind, minlength=len(KINDS))
+            np.add.at(self.endings, ei, 1)
+            np.add.at(self.rounds, (ei, rnd[end]), 1)
+            np.add.at(self.tox_hist, (rnd[rep], np.minimum((tox[rep] // (100 / TOX_BINS)).astype(np.intp), TOX_BINS - 1)), 1)
+            np.add.at(self.tox_sum, rnd[rep], tox[rep])
+            np.add.at(self.pulls, ((kind[pull] == STAY).astype(np.intp), value[pull].astype(np.intp)), 1)
+            np.add.at(self.collapse, (li, mi), 1)
+            for m in np.unique(minute[counted]):
+                slot = m % WINDOW
+                if self.ring_minute[slot] != m:
+                    self.ring[slot] = 0
+                    self.ring_minute[slot] = m
+                sel = counted & (minute == m)
+                np.add.at(self.ring[slot], col[sel], 1)
+
+    def snapshot(self, now=None):
+        """Copies of every array, with the ring cut to the last WINDOW minutes (oldest first)."""
+        import numpy as np
+
+        with self._lock:
+            out = {name: getattr(self, name).copy() for name in self.ARRAYS}
+        minute = int((time.time() if now is None else now) // 60)
+        order = np.arange(minute - WINDOW + 1, minute + 1)
+        ring = np.zeros_like(out["ring"])
+        live = out["ring_minute"][order % WINDOW] == order
+        ring[live] = out["ring"][order[live] % WINDOW]
+        out["window"] = ring
+        out["window_start"] = int(order[0])
+        return out
+
+    def save(self, path):
+        import numpy as np
+
+        with self._lock:
+            arrays = {name: getattr(self, name).copy() for name in self.ARRAYS}
+        tmp = Path(f"{path}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """Pick up the totals a previous process saved; silently starts from zero if the shapes changed."""
+        import numpy as np
+
+        try:
+            with np.load(path) as saved:
+                arrays = {name: saved[name] for name in self.ARRAYS}
+        except (OSError, KeyError, ValueError):
+            return False
+        if any(arrays[name].shape != getattr(self, name).shape for name in self.ARRAYS):
+            return False
+        with self._lock:
+            for name, a in arrays.items():
+                setattr(self, name, a.astype(getattr(self, name).dtype))
+        return True
+
+
+# ---------------- Pipeline ----------------
+class Pipeline:
+    """Bounded queue of events, one consumer folding and writing them."""
+
+    def __init__(self, directory=None, queue_max=None, segment_rows=None, segment_seconds=None, keep=None):
+        directory = directory if directory is not None else settings.EVENTS_DIR
+        self.dir = Path(directory) if directory else None  # None: aggregates only, nothing on disk
+        self.segment_rows = segment_rows or settings.EVENTS_SEGMENT_ROWS
+        self.segment_seconds = segment_seconds or settings.EVENTS_SEGMENT_SECONDS
+        self.keep = keep or settings.EVENTS_KEEP
+        self._queue = queue.Queue(queue_max if queue_max is not None else settings.EVENTS_QUEUE)
+        self._agg = None
+        self._lock = threading.Lock()
+        self._consumer = None
+        self.folded = 0
+        self.dropped = 0
+        self.segments = 0
+
+    @property
+    def agg(self):
+        """The live aggregates (created, and reloaded from disk, on first use)."""
+        if self._agg is None:
+            with self._lock:
+                if self._agg is None:
+                    agg = Aggregates()
+                    if self.dir is not None:
+                        agg.load(self.dir / "aggregates.npz")
+                    self._agg = agg
+        return self._agg
+
+    def emit(self, kind, g, value=0.0):
+        """Queue one transition of ``g``; ``kind`` is a name from KINDS. Never blocks."""
+        self.put((time.time(), KINDS.index(kind), g.round, g.toxicity, g.lmbd, g.mu, float(value)))
+
+    def put(self, row):
+        self._ensure_consumer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        """Block until every event queued so far is folded and written (CLI, shutdown)."""
+        if self._consumer is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._consumer is not None:
+            self._queue.put(_STOP)
+            self._consumer.join()
+            self._consumer = None
+
+    def _ensure_consumer(self):
+        if self._consumer is not None:
+            return
+        with self._lock:
+            if self._consumer is None:
+                self._consumer = threading.Thread(target=self._consume, name="lq-events", daemon=True)
+                self._consumer.start()
+                atexit.register(self.close)
+
+    def _consume(self):
+        import numpy as np
+
+        agg = self.agg
+        segment, rows_in_segment = [], 0
+        opened = time.monotonic()
+        while True:
+            try:
+                items = [self._queue.get(timeout=self.segment_seconds)]
+            except queue.Empty:
+                items = []
+            while items and len(items) < self.segment_rows:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [it for it in items if isinstance(it, tuple)]
+            if rows:
+                batch = np.array(rows, np.float64)
+                agg.fold(batch)
+                self.folded += len(rows)
+                if self.dir is not None:
+                    segment.append(batch)
+                    rows_in_segment += len(rows)
+            stop = any(it is _STOP for it in items)
+            flush = stop or any(isinstance(it, threading.Event) for it in items)
+            if segment and (flush or rows_in_segment >= self.segment_rows
+                            or time.monotonic() - opened >= self.segment_seconds):
+                self._write_segment(np.concatenate(segment))
+                segment, rows_in_segment = [], 0
+                opened = time.monotonic()
+            for it in items:
+                if isinstance(it, threading.Event):
+                    it.set()
+            if stop:
+                return
+
+    def _write_segment(self, batch):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        cols = [pa.array(batch[:, i]) for i in range(len(COLUMNS))]
+        cols[1] = pa.array(batch[:, 1].astype("int8"))
+        cols[2] = pa.array(batch[:, 2].astype("int32"))
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(batch[0, 0]))
+        path = self.dir / f"events-{stamp}-{os.getpid()}-{self.segments:06d}.parquet"
+        tmp = path.with_suffix(".tmp")
+        pq.write_table(pa.table(cols, names=list(COLUMNS)), tmp, compression="zstd")
+        os.replace(tmp, path)
+        self.segments += 1
+        self.agg.save(self.dir / "aggregates.npz")
+        for old in sorted(self.dir.glob("events-*.parquet"))[:-self.keep]:
+            old.unlink(missing_ok=True)
+
+
+PIPELINE = Pipeline()
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    import argparse
+    import tempfile
+
+    import numpy as np
+
+    p = argparse.ArgumentParser(description="Time emit(), the consumer and a dashboard read.")
+    p.add_argument("--bench", type=int, default=200000, help="synthetic events to push through")
+    p.add_argument("--dir", default=None, help="where segments go (default: a temporary directory)")
+    args = p.parse_args(argv)
+
+    tmp = tempfile.TemporaryDirectory()
+    pipe = Pipeline(args.dir or tmp.name, queue_max=args.bench + 1)
+    rng = np.random.default_rng(0)
+    kinds = rng.integers(0, len(KINDS), args.bench)
+    rows = [(time.time() - rng.uniform(0, 7200), int(k), int(rng.integers(0, 30)), rng.uniform(0, 100),
+             rng.uniform(0.2, 2.0), rng.uniform(0.5, 2.0),
+             float(rng.integers(0, len(ENDINGS))) if k == ENDING else float(rng.integers(0, 2)))
+            for k in kinds]
+    lat = np.empty(len(rows))
+    t0 = time.perf_counter()
+    for i, row in enumerate(rows):
+        t = time.perf_counter()
+        pipe.put(row)
+        lat[i] = time.perf_counter() - t
+    queued = time.perf_counter() - t0
+    pipe.flush()
+    total = time.perf_counter() - t0
+    print(f"{args.bench} events: put() p50 {np.percentile(lat, 50) * 1e6:.2f} µs  p99 {np.percentile(lat, 99) * 1e6:.2f} µs, "
+          f"queued in {queued * 1000:.0f} ms, folded and written after {total * 1000:.0f} ms "
+          f"({args.bench / total:,.0f} events/s, {pipe.segments} segments, {pipe.dropped} dropped)")
+
+    for n in (10, 1000):
+        t = time.perf_counter()
+        for _ in range(n):
+            snap = pipe.agg.snapshot()
+        dt = (time.perf_counter() - t) / n
+    size = sum(a.nbytes for a in snap.values() if hasattr(a, "nbytes"))
+    print(f"dashboard snapshot: {dt * 1e6:.0f} µs, {size / 1024:.1f} KB, for {int(snap['kinds'].sum()):,} events")
+    on_disk = sum(f.stat().st_size for f in Path(pipe.dir).glob("events-*.parquet"))
+    print(f"segments on disk: {on_disk / max(1, args.bench):.1f} B/event")
+    pipe.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
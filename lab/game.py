@@ -0,0 +1,411 @@
+# lab/game.py
+"""One game, step by step: seeded per-game RNG, event log and replay.
+
+Every random draw and every player decision goes through :func:`record`, which
+appends ``(code, value)`` to the game's :class:`EventLog` and applies it to
+the :class:`~lab.state.GameState` via :func:`apply`. Because state only ever
+changes in ``apply``, replaying a log on a fresh state rebuilds the game
+exactly, without touching the RNG or the UI.
+
+Phase outcomes are drawn once, when the phase is entered, and kept on the
+state, so reruns of a phase screen show the same numbers.
+
+In a shared lab the queue phase comes from the other players instead of the
+RNG (:func:`queue_shared`); those games replay but cannot be verified.
+"""
+import secrets
+import struct
+import sys
+import time
+from array import array
+
+from lab.rules import DEFAULT_RULES, ENDINGS
+from lab.state import GameState
+
+RULES = DEFAULT_RULES
+PARTS = ("queue", "roulette", "poison", "report")
+
+# ---------------- Event codes ----------------
+(START, LAM, MU, BULLET, PART, ARRIVALS, SERVICES, PULL, CHAMBER, SURVIVE,
+ RESPIN, ADVANCE, DROPS, ANTIDOTE, CREEP, ENDING, SERVERS, LAB, QUEUE) = range(19)
+EVENT_NAMES = ("start", "lam", "mu", "bullet", "part", "arrivals", "services", "pull", "chamber", "survive",
+               "respin", "advance", "drops", "antidote", "creep", "ending", "servers", "lab", "queue")
+
+
+# ---------------- Event log ----------------
+class EventLog:
+    """Flat ``array('d')`` of (code, value) pairs: 16 bytes per event."""
+    __slots__ = ("data",)
+
+    MAGIC = b"LQ1\0"
+    HEADER = struct.Struct("<4sQ")
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else array("d")
+
+    def append(self, code, value):
+        self.data.append(code)
+        self.data.append(value)
+
+    def __iter__(self):
+        d = self.data
+        for i in range(0, len(d), 2):
+            yield int(d[i]), d[i + 1]
+
+    def __len__(self):
+        return len(self.data) // 2
+
+    def __eq__(self, other):
+        return isinstance(other, EventLog) and self.data == other.data
+
+    def nbytes(self):
+        return sys.getsizeof(self.data)
+
+    def to_bytes(self, seed):
+        data = self.data
+        if sys.byteorder != "little":
+            data = array("d", data)
+            data.byteswap()
+        return self.HEADER.pack(self.MAGIC, seed) + data.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob):
+        """(seed, log) from :meth:`to_bytes` output."""
+        magic, seed = cls.HEADER.unpack_from(blob)
+        if magic != cls.MAGIC:
+            raise ValueError("not a λ: The Last Queue run log")
+        data = array("d")
+        data.frombytes(blob[cls.HEADER.size:])
+        if sys.byteorder != "little":
+            data.byteswap()
+        return seed, cls(data)
+
+
+# ---------------- State transitions ----------------
+def apply(g, code, v):
+    """The only place a game's state changes."""
+    if code == START:
+        g.game_started = True
+        g.phase = "playing"
+        g.round = 1
+        g.queue_length = RULES.start_queue
+        g.toxicity = RULES.start_toxicity
+        g.survival_prob = 1.0
+        g.alive = True
+        g.chamber_pointer = 1
+        g.cleared = 0
+        g.ending_type = None
+    elif code == LAM:
+        g.lmbd = v
+    elif code == MU:
+        g.mu = v
+    elif code == BULLET:
+        g.bullet_pos = int(v)
+    elif code == PART:
+        g.phase_part = PARTS[int(v)]
+    elif code == ARRIVALS:
+        g.arrivals = int(v)
+        g.queue_length += int(v)
+    elif code == SERVICES:
+        g.services = int(v)
+        g.queue_length -= int(v)
+    elif code == SURVIVE:
+        g.survival_prob *= RULES.pull_factor
+        g.toxicity = max(0.0, g.toxicity - RULES.pull_relief)
+    elif code == RESPIN:
+        g.chamber_pointer = int(v)
+        g.cleared = 0
+    elif code == ADVANCE:
+        g.chamber_pointer = (g.chamber_pointer % RULES.chambers) + 1
+        g.cleared += 1
+    elif code == DROPS:
+        g.drops = int(v)
+        g.antidote = 0
+        if v > 0:
+            g.toxicity = min(100.0, g.toxicity + v * RULES.drop_toxicity)
+    elif code == ANTIDOTE:
+        g.antidote = int(v)
+        g.toxicity = max(0.0, g.toxicity - v)
+    elif code == CREEP:
+        g.round += 1
+        g.lmbd = v
+    elif code == ENDING:
+        g.ending_type = ENDINGS[int(v)]
+        g.phase = "ending"
+        g.alive = False
+    elif code == SERVERS:
+        g.servers = int(v)
+    elif code == LAB:
+        g.lab = int(v)
+    elif code == QUEUE:
+        g.queue_length = int(v)
+    # PULL and CHAMBER are kept for the audit trail only
+
+
+def record(g, code, value=0.0):
+    if g.log is not None:
+        g.log.append(code, value)
+    apply(g, code, value)
+
+
+# ---------------- Live play ----------------
+def start(g, seed=None, servers=0, lab=None):
+    """start_game: fresh seed, RNG and log, then the first queue phase.
+
+    ``servers > 0`` runs the queue phase on the continuous-time M/M/c engine
+    (lab/des.py) with that many servers and arrivals scaled to match.
+    ``lab`` joins that shared lab as subject ``seed``; ConnectionError, with
+    nothing changed, if the coordinator is not there.
+    """
+    g.seed = secrets.randbits(63) if seed is None else seed
+    if lab is not None:
+        from lab.labserver import CLIENT
+        joined = CLIENT.call("join", lab, g.seed)
+    g.started_at = time.monotonic()
+    import numpy as np  # not needed before the first game
+    g.rng = np.random.default_rng(g.seed)
+    g.log = EventLog()
+    rng, r = g.rng, RULES
+    record(g, START)
+    g.des = g.waits = None
+    g.servers = 0
+    g.lab = g.lab_seen = None
+    if servers:
+        record(g, SERVERS, servers)
+    if lab is not None:
+        record(g, LAB, lab)
+        g.lab_seen = (joined["arrivals"], joined["departures"])
+    record(g, LAM, round(max(r.lam_start_floor, float(rng.normal(r.lam_mean, r.lam_sd))), 2))
+    record(g, MU, round(max(r.mu_start_floor, float(rng.normal(r.mu_mean, r.mu_sd))), 2))
+    record(g, BULLET, int(rng.integers(1, r.chambers + 1)))
+    enter_queue(g)
+
+
+def enter_queue(g):
+    """λ/μ drift, then this round's arrivals and services."""
+    rng, r = g.rng, RULES
+    record(g, PART, PARTS.index("queue"))
+    record(g, LAM, round(max(r.lam_floor, float(rng.normal(g.lmbd, r.lam_drift))), 2))
+    record(g, MU, round(max(r.mu_floor, float(rng.normal(g.mu, r.mu_drift))), 2))
+    if g.servers:
+        queue_continuous(g)
+        return
+    if g.lab is not None and queue_shared(g):
+        return
+    arrivals = int(rng.poisson(g.lmbd))
+    services = min(g.queue_length + arrivals, max(1, int(rng.poisson(g.mu))))
+    record(g, ARRIVALS, arrivals)
+    record(g, SERVICES, services)
+
+
+def queue_continuous(g):
+    """One time unit of the M/M/c queue; ``queue_length`` is everyone in the lab's system."""
+    from lab import des
+
+    c = g.servers
+    if g.des is None:
+        g.des = des.Queue(c, g.queue_length * c, g.rng, g.mu)
+        record(g, QUEUE, len(g.des))  # everyone already in the system, so replay starts from it too
+    stats = g.des.advance(1.0, g.lmbd * c, g.mu, g.rng)
+    g.waits = stats.summary()
+    record(g, ARRIVALS, stats.arrivals)
+    record(g, SERVICES, stats.departures)
+
+
+def queue_shared(g):
+    """Arrive in the shared lab; the phase shows who else came and went since this subject last queued.
+
+    ``queue_length`` becomes the lab's queue. False if the coordinator did not
+    answer, and this round's queue is drawn as in a solo game.
+    """
+    from lab.labserver import CLIENT
+
+    try:
+        s = CLIENT.call("arrive", g.lab, g.seed)
+    except ConnectionError:
+        return False
+    seen = g.lab_seen or (s["arrivals"] - 1, s["departures"])
+    record(g, ARRIVALS, max(0, s["arrivals"] - seen[0] - 1))
+    record(g, SERVICES, max(0, s["departures"] - seen[1]))
+    record(g, QUEUE, s["queue"])
+    g.lab_seen = (s["arrivals"], s["departures"] + 1)  # + this subject's own departure at Proceed
+    return True
+
+
+def collapsed(g):
+    return g.lmbd >= g.mu or g.queue_length > RULES.queue_cap * max(1, g.servers)
+
+
+def proceed(g):
+    """→ Proceed to Roulette."""
+    record(g, PART, PARTS.index("roulette"))
+    if g.lab is not None:
+        from lab.labserver import CLIENT
+        CLIENT.send("serve", g.lab, g.seed)
+
+
+def pull(g, spin):
+    """Spin / Don't Spin. Returns True if the revolver fired; otherwise moves on to the poison phase."""
+    rng, r = g.rng, RULES
+    record(g, PULL, 1.0 if spin else 0.0)
+    if spin:
+        chamber = int(rng.integers(1, r.chambers + 1))
+        record(g, CHAMBER, chamber)
+        fired = chamber == g.bullet_pos
+    else:
+        fired = g.chamber_pointer == g.bullet_pos
+    if fired:
+        return True
+    record(g, SURVIVE)
+    if spin:
+        record(g, RESPIN, int(rng.integers(1, r.chambers + 1)))
+    else:
+        record(g, ADVANCE)
+    enter_poison(g)
+    return False
+
+
+def enter_poison(g):
+    """Toxin drops, then maybe an antidote cart."""
+    rng, r = g.rng, RULES
+    record(g, PART, PARTS.index("poison"))
+    record(g, DROPS, int(rng.poisson(g.lam_poison)))
+    if rng.random() < g.antidote_chance:
+        record(g, ANTIDOTE, int(rng.integers(r.antidote_min, r.antidote_max + 1)))
+
+
+def toxic(g):
+    return g.toxicity >= 100.0
+
+
+def view_report(g):
+    """→ View Round Report."""
+    record(g, PART, PARTS.index("report"))
+
+
+def rho(g):
+    return g.lmbd / g.mu if g.mu > 0 else 999
+
+
+def escaped(g):
+    return g.round >= RULES.escape_round and rho(g) < 1 and g.toxicity < RULES.escape_toxicity
+
+
+def transcended(g):
+    return g.round >= RULES.secret_round and g.survival_prob >= RULES.secret_survival
+
+
+def next_round(g):
+    """Continue: λ creeps up, then the next queue phase."""
+    r = RULES
+    record(g, CREEP, min(r.lam_max, round(g.lmbd + float(g.rng.uniform(r.lam_creep_min, r.lam_creep_max)), 2)))
+    enter_queue(g)
+
+
+def end(g, kind):
+    record(g, ENDING, ENDINGS.index(kind))
+    if g.lab is not None:
+        from lab.labserver import CLIENT
+        CLIENT.send("leave", g.lab, g.seed)
+
+
+# ---------------- Replay ----------------
+def replay(seed, log, upto_round=None):
+    """Rebuild a game's state from its log, optionally stopping at the report of ``upto_round``.
+
+    Nothing is drawn and nothing is rendered; the RNG is not restored.
+    """
+    g = GameState()
+    g.seed = seed
+    for code, v in log:
+        if upto_round is not None and code == CREEP and g.round >= upto_round:
+            break
+        apply(g, code, v)
+    return g
+
+
+def shared(log):
+    """True for a shared-lab game (its queue phases came from other players)."""
+    return any(code == LAB for code, _ in log)
+
+
+def resume(seed, log):
+    """Re-play the logged decisions with a fresh RNG from ``seed``.
+
+    Returns the live GameState, RNG and continuous-time queue included, so
+    play can go on from where the log stops; None if any draw differs.
+    A shared-lab game cannot be re-played; it is rebuilt with :func:`replay`
+    and goes on with a new RNG stream.
+    """
+    if shared(log):
+        import numpy as np
+        g = replay(seed, log)
+        g.log = EventLog(array("d", log.data))
+        g.rng = np.random.default_rng([seed, len(log)])
+        g.started_at = time.monotonic()
+        return g
+    events = list(log)
+    servers = int(events[1][1]) if len(events) > 1 and events[1][0] == SERVERS else 0
+    g = GameState()
+    start(g, seed, servers)
+    n = len(g.log)
+    try:
+        while n < len(events) and list(g.log) == events[:n]:
+            code, v = events[n]
+            if code == PART and PARTS[int(v)] == "roulette":
+                proceed(g)
+            elif code == PART and PARTS[int(v)] == "report":
+                view_report(g)
+            elif code == PULL:
+                pull(g, bool(v))
+            elif code == CREEP:
+                next_round(g)
+            elif code == ENDING:
+                end(g, ENDINGS[int(v)])
+            else:
+                return None
+            n = len(g.log)
+    except (IndexError, ValueError):
+        return None
+    return g if g.log == log else None
+
+
+def verify(seed, log):
+    """True if the log was produced by the seeded RNG and the current rules, with nothing edited.
+
+    This is the audit for "unfair" deaths. Shared-lab games never verify.
+    """
+    return not shared(log) and resume(seed, log) is not None
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    import argparse
+    import time
+    from pathlib import Path
+
+    p = argparse.ArgumentParser(description="Inspect a run log downloaded from the ending screen.")
+    p.add_argument("log", help="run log file")
+    p.add_argument("--round", type=int, default=None, help="state at the report of this round")
+    p.add_argument("--events", action="store_true", help="print every event")
+    args = p.parse_args(argv)
+
+    seed, log = EventLog.from_bytes(Path(args.log).read_bytes())
+    t0 = time.perf_counter()
+    g = replay(seed, log, args.round)
+    dt = time.perf_counter() - t0
+    if args.events:
+        for code, v in log:
+            print(f"  {EVENT_NAMES[code]:<9} {v:g}")
+    print(f"seed {seed}, {len(log)} events, replayed in {dt * 1e6:.0f} µs")
+    for name in ("phase", "phase_part", "round", "queue_length", "toxicity", "lmbd", "mu",
+                 "survival_prob", "bullet_pos", "chamber_pointer", "cleared", "ending_type"):
+        print(f"  {name:<16} {getattr(g, name)}")
+    if shared(log):
+        print("shared-lab game: its queue phases came from other players and cannot be verified")
+    else:
+        print("verified" if verify(seed, log) else "DOES NOT VERIFY against this seed and these rules")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+# lab/labserver.py
+"""Shared lab: one asyncio coordinator process holds every lab's queue.
+
+In shared-lab mode a player is one subject in a lab that other players are
+in too. Entering the queue phase is an arrival, pressing "Proceed to
+Roulette" is a departure (served), and a game that ends leaves the lab. The
+queue phase then shows the arrivals and departures of everyone else since
+this subject last queued (see :func:`lab.game.queue_shared`).
+
+The coordinator is a single-threaded asyncio server on a Unix socket that
+speaks newline-delimited JSON. Requests carry an ``id`` if they want a reply:
+
+    {"id": 7, "op": "arrive", "lab": 3, "subject": 123}  ->  {"id": 7, "lab": 3, "seq": .., "queue": .., ...}
+
+Every connection that has a subject in a lab is subscribed to it. Changes are
+coalesced: a lab touched by any number of ops goes out as one delta per
+subscriber every ``LQ_LAB_DELTA_SECONDS``:
+
+    {"delta": 3, "seq": 12, "subjects": 40, "queue": 6, "arrivals": 311, "departures": 305}
+
+``seq`` counts changes over the whole coordinator, not per lab, so a lab that
+emptied and was made again never goes back to an older number. A connection
+whose last subject left a lab gets one more delta for it, marked ``"left":
+true``, so its process stops showing the lab; a lab that emptied is dropped.
+
+There are no threads and no sleeps per player: a lab is a few counters, a
+set of waiting subjects and its subscribers, so hundreds of labs with
+thousands of subjects cost only the ops themselves. Subjects not heard from
+for ``LQ_LAB_IDLE_SECONDS`` are dropped, as are all of a connection's
+subjects when it closes.
+
+Each Streamlit process holds one :class:`LabClient` (one socket, its own
+event loop thread); script threads make short blocking calls on it, and the
+deltas keep its per-lab cache current, so the lab panel in app.py never
+asks the coordinator anything.
+
+    python -m lab.labserver                       serve at LQ_LAB_SOCKET
+    python -m lab.labserver --bench 5000 --labs 300
+"""
+import asyncio
+import atexit
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from lab import settings
+
+OPS = ("join", "arrive", "serve", "leave", "stats")
+
+
+# ---------------- Coordinator ----------------
+class Lab:
+    __slots__ = ("id", "subjects", "waiting", "arrivals", "departures", "seq", "subscribers")
+
+    def __init__(self, lab_id):
+        self.id = lab_id
+        self.subjects = {}      # subject -> (connection, last seen)
+        self.waiting = set()    # subjects in their queue phase
+        self.arrivals = self.departures = self.seq = 0
+        self.subscribers = {}   # connection -> subjects it has here
+
+    def state(self):
+        return {"lab": self.id, "seq": self.seq, "subjects": len(self.subjects), "queue": len(self.waiting),
+                "arrivals": self.arrivals, "departures": self.departures}
+
+
+class Connection:
+    __slots__ = ("writer", "subjects", "out")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.subjects = set()   # (lab, subject) pairs this connection joined
+        self.out = []           # delta lines waiting for the next flush
+
+
+class Coordinator:
+    """Every lab, in one event loop."""
+
+    def __init__(self, delta_seconds=None, idle_seconds=None, max_buffer=1 << 20):
+        self.delta_seconds = delta_seconds if delta_seconds is not None else settings.LAB_DELTA_SECONDS
+        self.idle_seconds = idle_seconds if idle_seconds is not None else settings.LAB_IDLE_SECONDS
+        self.max_buffer = max_buffer
+        self.labs = {}
+        self.dirty = set()
+        self.seq = 0
+        self.closed = {}        # lab id -> last state of a lab that emptied, until its final delta
+        self.dropped = {}       # lab id -> connections that left it, owed one final delta
+        self.connections = set()
+        self.ops = 0
+        self.deltas = 0
+
+    # ops
+    def join(self, conn, lab_id, subject):
+        lab = self.labs.get(lab_id)
+        if lab is None:
+            lab = self.labs[lab_id] = Lab(lab_id)
+        now = time.monotonic()
+        if subject not in lab.subjects:
+            lab.subscribers[conn] = lab.subscribers.get(conn, 0) + 1
+            conn.subjects.add((lab_id, subject))
+            self._touch(lab)
+        elif lab.subjects[subject][0] is not conn:  # the player moved to another replica
+            self.leave(lab.subjects[subject][0], lab_id, subject)
+            return self.join(conn, lab_id, subject)
+        lab.subjects[subject] = (conn, now)
+        return lab
+
+    def arrive(self, conn, lab_id, subject):
+        lab = self.join(conn, lab_id, subject)
+        if subject not in lab.waiting:
+            lab.waiting.add(subject)
+            lab.arrivals += 1
+            self._touch(lab)
+        return lab
+
+    def serve(self, conn, lab_id, subject):
+        lab = self.join(conn, lab_id, subject)
+        if subject in lab.waiting:
+            lab.waiting.discard(subject)
+            lab.departures += 1
+            self._touch(lab)
+        return lab
+
+    def leave(self, conn, lab_id, subject):
+        lab = self.labs.get(lab_id)
+        if lab is None or subject not in lab.subjects:
+            return lab
+        owner, _ = lab.subjects.pop(subject)
+        if subject in lab.waiting:
+            lab.waiting.discard(subject)
+            lab.departures += 1
+        n = lab.subscribers.get(owner, 0) - 1
+        if n > 0:
+            lab.subscribers[owner] = n
+        else:
+            lab.subscribers.pop(owner, None)
+            self.dropped.setdefault(lab_id, set()).add(owner)
+        owner.subjects.discard((lab_id, subject))
+        self._touch(lab)
+        if not lab.subjects:
+            del self.labs[lab_id]
+            self.closed[lab_id] = lab.state()
+        return lab
+
+    def stats(self):
+        return {"labs": len(self.labs), "subjects": sum(len(lab.subjects) for lab in self.labs.values()),
+                "connections": len(self.connections), "ops": self.ops, "deltas": self.deltas}
+
+    def _touch(self, lab):
+        self.seq += 1
+        lab.seq = self.seq
+        self.dirty.add(lab.id)
+
+    # transport
+    async def handle(self, reader, writer):
+        conn = Connection(writer)
+        self.connections.add(conn)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                op = msg.get("op")
+                self.ops += 1
+                try:
+                    if op == "stats":
+                        reply = self.stats()
+                    elif op in ("join", "arrive", "serve", "leave"):
+                        lab = getattr(self, op)(conn, int(msg["lab"]), int(msg["subject"]))
+                        reply = lab.state() if lab is not None else {"lab": int(msg["lab"]), "subjects": 0}
+                    else:
+                        raise ValueError(f"unknown op {op!r}")
+                except (KeyError, TypeError, ValueError) as e:
+                    reply = {"error": str(e)}
+                if "id" in msg:
+                    reply["id"] = msg["id"]
+                    writer.write(json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+                    if writer.transport.get_write_buffer_size() > self.max_buffer:
+                        await writer.drain()
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            for lab_id, subject in list(conn.subjects):
+                self.leave(conn, lab_id, subject)
+            self.connections.discard(conn)
+            writer.close()
+
+    async def flush_deltas(self):
+        while True:
+            await asyncio.sleep(self.delta_seconds)
+            if not self.dirty:
+                continue
+            dirty, self.dirty = self.dirty, set()
+            for lab_id in dirty:
+                lab = self.labs.get(lab_id)
+                closed = self.closed.pop(lab_id, None)
+                state = lab.state() if lab is not None else closed
+                if state is None:
+                    continue
+                state["delta"] = state.pop("lab")
+                line = json.dumps(state, separators=(",", ":")).encode() + b"\n"
+                subscribers = lab.subscribers if lab is not None else {}
+                for conn in subscribers:
+                    conn.out.append(line)
+                left = self.dropped.pop(lab_id, set()).difference(subscribers) & self.connections
+                if left:
+                    state["left"] = True
+                    line = json.dumps(state, separators=(",", ":")).encode() + b"\n"
+                    for conn in left:
+                        conn.out.append(line)
+            for conn in list(self.connections):
+                if not conn.out:
+                    continue
+                self.deltas += len(conn.out)
+                if conn.writer.transport.get_write_buffer_size() > self.max_buffer:
+                    conn.writer.close()  # a subscriber that stopped reading; its subjects leave when it closes
+                else:
+                    conn.writer.write(b"".join(conn.out))
+                conn.out.clear()
+
+    async def sweep(self):
+        while True:
+            await asyncio.sleep(min(30.0, self.idle_seconds))
+            cutoff = time.monotonic() - self.idle_seconds
+            for lab in list(self.labs.values()):
+                for subject, (conn, seen) in list(lab.subjects.items()):
+                    if seen < cutoff:
+                        self.leave(conn, lab.id, subject)
+
+    async def serve_forever(self, path):
+        if os.path.exists(path):
+            os.unlink(path)  # left over from a coordinator that did not shut down cleanly
+        server = await asyncio.start_unix_server(self.handle, path)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.flush_deltas(), self.sweep())
+
+
+# ---------------- Client ----------------
+class LabClient:
+    """One connection per process to the coordinator, driven by its own event loop thread.
+
+    :meth:`call` blocks the calling script thread for one round trip;
+    :meth:`send` does not wait at all; :meth:`state` reads the newest state
+    the replies and deltas brought in.
+    """
+
+    def __init__(self, path=None, timeout=None):
+        self.path = path if path is not None else settings.LAB_SOCKET
+        self.timeout = timeout if timeout is not None else settings.LAB_TIMEOUT
+        self.labs = {}          # lab -> newest state seen
+        self._pending = {}      # request id -> Future
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._writer = None
+        self._reader = None
+        self._connecting = asyncio.Lock()
+
+    def available(self):
+        return bool(self.path) and os.path.exists(self.path)
+
+    def call(self, op, lab=None, subject=None):
+        """Send one op and wait for the lab's state; ConnectionError if the coordinator is not there."""
+        fut = asyncio.run_coroutine_threadsafe(self._call(op, lab, subject, True), self._ensure_loop())
+        try:
+            return fut.result(self.timeout)
+        except (FutureTimeout, OSError) as e:
+            fut.cancel()
+            raise ConnectionError(f"shared lab coordinator at {self.path} did not answer: {e}") from None
+
+    def send(self, op, lab, subject):
+        """Fire and forget (serve, leave); errors are dropped, the coordinator's sweeper covers them."""
+        asyncio.run_coroutine_threadsafe(self._call(op, lab, subject, False), self._ensure_loop())
+
+    def close(self):
+        if self._loop is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(self.timeout)
+            except (FutureTimeout, OSError):
+                pass
+
+    def state(self, lab):
+        """Newest known state of a lab this process has subjects in, or None."""
+        return self.labs.get(lab)
+
+    def _ensure_loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="lq-lab-client", daemon=True).start()
+                    self._loop = loop
+                    atexit.register(self.close)
+        return self._loop
+
+    async def _call(self, op, lab, subject, reply):
+        try:
+            async with self._connecting:
+                if self._writer is None or self._writer.is_closing():
+                    reader, self._writer = await asyncio.open_unix_connection(self.path)
+                    self._reader = self._loop.create_task(self._read(reader, self._writer))
+            msg = {"op": op, "lab": lab, "subject": subject}
+            fut = None
+            if reply:
+                msg["id"] = rid = next(self._ids)
+                fut = self._pending[rid] = self._loop.create_future()
+            self._writer.write(json.dumps(msg, separators=(",", ":")).encode() + b"\n")
+            if fut is None:
+                return None
+            state = await fut
+        except OSError:
+            if reply:
+                raise
+            return None
+        if "error" in state:
+            raise ValueError(state["error"])
+        if "seq" in state:
+            self._update(state["lab"], state)
+        return state
+
+    async def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader is not None:
+            self._reader.cancel()
+
+    async def _read(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                if "id" in msg:
+                    fut = self._pending.pop(msg.pop("id"), None)
+                    if fut is not None and not fut.done():
+                        fut.set_result(msg)
+                else:
+                    self._update(msg.pop("delta"), msg)
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        # coordinator gone: fail the waiting calls; the next call reconnects, to a
+        # coordinator whose seq may have started over, so the cache goes too
+        writer.close()
+        self.labs.clear()
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(ConnectionError("shared lab coordinator closed the connection"))
+        self._pending.clear()
+
+    def _update(self, lab, state):
+        old = self.labs.get(lab)
+        left = state.pop("left", False)
+        if old is not None and old.get("seq", -1) >= state["seq"] + left:  # "left" may repeat the last seq
+            return
+        if left or not state["subjects"]:
+            self.labs.pop(lab, None)  # no subjects of this process there any more
+            return
+        state["lab"] = lab
+        self.labs[lab] = state
+
+
+CLIENT = LabClient()
+
+
+# ---------------- CLI ----------------
+async def _bench(path, subjects, labs, replicas, seconds, think):
+    """Simulated players: each arrives, waits ``think`` seconds, is served, waits, and so on."""
+    import random
+
+    conns = [await asyncio.open_unix_connection(path) for _ in range(replicas)]
+    pending, lat, deltas = {}, [], [0]
+    ids = itertools.count(1)
+
+    async def read(reader):
+        while line := await reader.readline():
+            msg = json.loads(line)
+            if "id" in msg:
+                pending.pop(msg["id"]).set_result(None)
+            else:
+                deltas[0] += 1
+
+    readers = [asyncio.create_task(read(r)) for r, _ in conns]
+
+    async def op(writer, name, lab, subject):
+        rid = next(ids)
+        fut = pending[rid] = asyncio.get_running_loop().create_future()
+        t = time.perf_counter()
+        writer.write(json.dumps({"id": rid, "op": name, "lab": lab, "subject": subject}).encode() + b"\n")
+        await fut
+        lat.append(time.perf_counter() - t)
+
+    async def player(subject):
+        rng = random.Random(subject)
+        _, writer = conns[subject % replicas]
+        lab = subject % labs
+        await asyncio.sleep(rng.uniform(0, think))
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            await op(writer, "arrive", lab, subject)
+            await asyncio.sleep(rng.expovariate(1 / think))
+            await op(writer, "serve", lab, subject)
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(player(s) for s in range(subjects)))
+    dt = time.perf_counter() - t0
+    for r in readers:
+        r.cancel()
+    for _, w in conns:
+        w.close()
+    return lat, deltas[0], dt
+
+
+def _cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def main(argv=None):
+    import argparse
+    import subprocess
+    import sys
+    import tempfile
+
+    import numpy as np
+
+    p = argparse.ArgumentParser(description="Run the shared-lab coordinator, or load-test one.")
+    p.add_argument("--socket", default=settings.LAB_SOCKET)
+    p.add_argument("--bench", type=int, default=0, help="simulated subjects (starts its own coordinator)")
+    p.add_argument("--labs", type=int, default=300)
+    p.add_argument("--replicas", type=int, default=8, help="client connections, like Streamlit processes")
+    p.add_argument("--seconds", type=float, default=20.0)
+    p.add_argument("--think", type=float, default=2.0, help="mean seconds between a subject's ops")
+    args = p.parse_args(argv)
+
+    if not args.bench:
+        print(f"shared lab coordinator on {args.socket}")
+        asyncio.run(Coordinator().serve_forever(args.socket))
+        return
+
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "lab.sock")
+    proc = subprocess.Popen([sys.executable, "-m", "lab.labserver", "--socket", path], stdout=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(path):
+            time.sleep(0.01)
+        cpu0 = _cpu_seconds(proc.pid)
+        lat, deltas, dt = asyncio.run(_bench(path, args.bench, args.labs, args.replicas, args.seconds, args.think))
+        cpu = _cpu_seconds(proc.pid) - cpu0
+        lat = np.array(lat)
+        print(f"{args.bench} subjects in {args.labs} labs over {args.replicas} connections, {dt:.1f}s")
+        print(f"  {len(lat):,} ops ({len(lat) / dt:,.0f}/s): round trip p50 {np.percentile(lat, 50) * 1e3:.2f} ms  "
+              f"p99 {np.percentile(lat, 99) * 1e3:.2f} ms  max {lat.max() * 1e3:.1f} ms")
+        print(f"  {deltas:,} deltas pushed ({deltas / dt:,.0f}/s)")
+        print(f"  coordinator: {cpu / dt:.1%} of one core, {_rss_mb(proc.pid):.0f} MB RSS")
+    finally:
+        proc.terminate()
+        proc.wait()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# lab/leaderboard.py
+"""Finished runs in a local SQLite file, written off the render path.
+
+:meth:`Leaderboard.record` only puts a row on an in-memory queue. One daemon
+writer thread drains that queue and inserts whatever has piled up in a single
+transaction, so a burst of endings costs one commit instead of one per run.
+The database runs in WAL mode: readers on other threads never wait for the
+writer and the writer never waits for them.
+
+    python -m lab.leaderboard --ending escape -n 10
+    python -m lab.leaderboard --bench 5000
+"""
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+
+from lab import settings
+from lab.rules import ENDINGS
+
+COLUMNS = ("ending", "rounds", "toxicity", "lmbd", "mu", "survival_prob", "duration", "seed", "finished_at")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    ending TEXT NOT NULL,
+    rounds INTEGER NOT NULL,
+    toxicity REAL NOT NULL,
+    lmbd REAL NOT NULL,
+    mu REAL NOT NULL,
+    survival_prob REAL NOT NULL,
+    duration REAL NOT NULL,
+    seed INTEGER,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_rank ON runs (ending, rounds DESC, toxicity ASC);
+"""
+INSERT = f"INSERT INTO runs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+TOP = ("SELECT rounds, toxicity, lmbd, mu, survival_prob, duration, seed, finished_at FROM runs "
+       "WHERE ending = ? ORDER BY rounds DESC, toxicity ASC LIMIT ?")
+
+_STOP = object()
+
+
+def row_of(g, now=None):
+    """The leaderboard row for a finished GameState."""
+    now = time.time() if now is None else now
+    duration = time.monotonic() - g.started_at if g.started_at is not None else 0.0
+    return (g.ending_type, g.round, float(g.toxicity), float(g.lmbd), float(g.mu),
+            float(g.survival_prob), duration, g.seed, now)
+
+
+class Leaderboard:
+    """Batched writer plus indexed, TTL-cached top-N reads over one SQLite file."""
+
+    def __init__(self, path=None, batch_max=None, ttl=None, queue_max=None):
+        self.path = str(path if path is not None else settings.LEADERBOARD_PATH)
+        self.batch_max = batch_max or settings.LEADERBOARD_BATCH
+        self.ttl = ttl if ttl is not None else settings.LEADERBOARD_TTL
+        self._queue = queue.Queue(queue_max if queue_max is not None else settings.LEADERBOARD_QUEUE)
+        self._local = threading.local()
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._writer = None
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    # ---------------- Writes ----------------
+    def record(self, g):
+        """Queue a finished game for writing; never touches the disk."""
+        self.put(row_of(g))
+
+    def put(self, row):
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1  # the disk is far behind; losing a row beats stalling a rerun
+
+    def flush(self, timeout=None):
+        """Block until every row queued so far is committed (CLI, shutdown)."""
+        if self._writer is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="lq-leaderboard-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _write_loop(self):
+        con = self._connect()
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.batch_max:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [it for it in items if isinstance(it, tuple)]
+            if rows:
+                with con:
+                    con.executemany(INSERT, rows)
+                self.written += len(rows)
+                self.batches += 1
+            for it in items:
+                if isinstance(it, threading.Event):
+                    it.set()
+            if any(it is _STOP for it in items):
+                con.close()
+                return
+
+    # ---------------- Reads ----------------
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.executescript(SCHEMA)
+        return con
+
+    def _reader(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = self._connect()
+        return con
+
+    def top(self, ending, n=10):
+        """Best ``n`` runs for one ending (most rounds, then lowest toxicity), at most ``ttl`` seconds stale."""
+        key = (ending, n)
+        now = time.monotonic()
+        hit = self._cache.get(key)
+        if hit is not None and now - hit[0] < self.ttl:
+            return hit[1]
+        rows = self._reader().execute(TOP, (ending, n)).fetchall()
+        self._cache[key] = (now, rows)
+        return rows
+
+    def counts(self):
+        """Runs recorded per ending."""
+        rows = self._reader().execute("SELECT ending, COUNT(*) FROM runs GROUP BY ending").fetchall()
+        return {name: 0 for name in ENDINGS} | dict(rows)
+
+
+BOARD = Leaderboard()
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    import argparse
+    import random
+
+    import numpy as np
+
+    p = argparse.ArgumentParser(description="Show the leaderboard, or time record() under a burst of endings.")
+    p.add_argument("--db", default=None, help=f"SQLite file (default {settings.LEADERBOARD_PATH})")
+    p.add_argument("--ending", choices=ENDINGS, default=None)
+    p.add_argument("-n", type=int, default=10)
+    p.add_argument("--bench", type=int, default=0, help="record this many synthetic endings and report latency")
+    args = p.parse_args(argv)
+
+    board = Leaderboard(args.db)
+    if args.bench:
+        lat = np.empty(args.bench)
+        t0 = time.perf_counter()
+        for i in range(args.bench):
+            row = (random.choice(ENDINGS), random.randint(1, 12), random.uniform(0, 100), 0.8, 1.1,
+                   random.random(), random.uniform(5, 300), i, time.time())
+            t = time.perf_counter()
+            board.put(row)
+            lat[i] = time.perf_counter() - t
+        queued = time.perf_counter() - t0
+        board.flush()
+        total = time.perf_counter() - t0
+        print(f"{args.bench} endings: record() p50 {np.percentile(lat, 50) * 1e6:.1f} µs  "
+              f"p99 {np.percentile(lat, 99) * 1e6:.1f} µs  max {lat.max() * 1e6:.0f} µs")
+        print(f"queued in {queued * 1000:.1f} ms, on disk after {total * 1000:.1f} ms "
+              f"in {board.batches} batches ({board.dropped} dropped)")
+        t = time.perf_counter()
+        board.top(ENDINGS[0], args.n)
+        cold = time.perf_counter() - t
+        t = time.perf_counter()
+        board.top(ENDINGS[0], args.n)
+        print(f"top-{args.n}: {cold * 1e6:.0f} µs uncached, {(time.perf_counter() - t) * 1e6:.1f} µs cached")
+        board.close()
+        return
+
+    for name in (args.ending,) if args.ending else ENDINGS:
+        rows = board.top(name, args.n)
+        print(f"{name} ({board.counts()[name]} runs)")
+        for rank, (rounds, tox, lam, mu, surv, dur, seed, _) in enumerate(rows, 1):
+            print(f"  {rank:>3}. {rounds:>3} rounds  tox {tox:5.1f}%  λ {lam:.2f}  μ {mu:.2f}  "
+                  f"surv {surv:.3f}  {dur:6.1f}s  seed {seed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# lab/loadtest.py
+"""Load test: many scripted playthroughs of app.py open at once.
+
+Each session is a ``streamlit.testing.v1.AppTest``. AppTest swaps a global
+mock Runtime in and out around every run, so runs in one process cannot
+overlap; instead every worker process keeps all of its sessions open and
+steps them round-robin, one click each, like a single-core server would.
+Use ``--workers`` to load several cores. For every click we record wall
+time, the number of ForwardMsgs the script enqueued (what the server would
+push over the websocket) and their serialized size.
+
+At most one rerun per worker is in flight, so the latencies leave out the
+script-thread and GIL contention of a real server running many reruns in
+one process. The report gives the concurrency they were measured at: the
+``workers`` bound and the mean number of reruns in flight while the
+sessions were stepped (rerun time over the longest worker loop).
+
+    python -m lab.loadtest --sessions 50 --games 3 --no-sleep --out loadtest.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+
+# labels of the buttons a scripted player presses, in the order it looks for them
+PLAY_BUTTONS = (
+    "⏩ Skip Tutorial",
+    "▶️ Begin Experiment",
+    "→ Proceed to Roulette",
+    "Spin (Independent)",
+    "Don't Spin (Dependent)",
+    "→ View Round Report",
+    "Continue",
+)
+ROULETTE = ("Spin (Independent)", "Don't Spin (Dependent)")
+
+
+# ---------------- Message metering ----------------
+class Meter:
+    """ForwardMsgs enqueued by the script runs of one session."""
+    __slots__ = ("msgs", "bytes")
+
+    def __init__(self):
+        self.msgs = 0
+        self.bytes = 0
+
+
+_meter = None  # Meter of the session whose click is running
+
+
+def _install_meter():
+    """Count every ForwardMsg enqueued while a session's click runs.
+
+    AppTest builds a fresh LocalScriptRunner for each run, so the runner's
+    queue is tagged with the Meter that is current when it is created.
+    """
+    from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    if getattr(ForwardMsgQueue, "_lq_metered", False):
+        return
+    init, enqueue = LocalScriptRunner.__init__, ForwardMsgQueue.enqueue
+
+    def metered_init(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        self.forward_msg_queue._lq_meter = _meter
+
+    def metered_enqueue(self, msg):
+        meter = getattr(self, "_lq_meter", None)
+        if meter is not None:
+            meter.msgs += 1
+            meter.bytes += msg.ByteSize()
+        return enqueue(self, msg)
+
+    LocalScriptRunner.__init__ = metered_init
+    ForwardMsgQueue.enqueue = metered_enqueue
+    ForwardMsgQueue._lq_metered = True
+
+
+def rss_bytes():
+    """Resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ---------------- One scripted player ----------------
+class Player:
+    """One open session that presses the next button each time it is stepped."""
+
+    def __init__(self, seed, games, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.rng = random.Random(seed)
+        self.games_left = games
+        self.meter = Meter()
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.loaded = False
+
+    def next_action(self):
+        if not self.loaded:
+            return "load", None
+        buttons = {b.label: b for b in self.at.button}
+        if "Restart Game" in buttons:
+            label = "Restart Game"
+        elif ROULETTE[0] in buttons:
+            label = self.rng.choice(ROULETTE)
+        else:
+            label = next((lbl for lbl in PLAY_BUTTONS if lbl in buttons), None)
+        if label is None:
+            raise RuntimeError(f"no known button among {sorted(buttons)}")
+        return label, buttons[label]
+
+    def step(self):
+        """Press one button; returns (action, seconds, msgs, bytes)."""
+        global _meter
+        action, widget = self.next_action()
+        _meter = self.meter
+        m0, b0 = self.meter.msgs, self.meter.bytes
+        t0 = time.perf_counter()
+        if widget is not None:
+            widget.click()
+        self.at.run()
+        row = (action, time.perf_counter() - t0, self.meter.msgs - m0, self.meter.bytes - b0)
+        if self.at.exception:
+            raise RuntimeError(f"{action}: {self.at.exception[0].message}")
+        self.loaded = True
+        if action == "Restart Game":
+            self.games_left -= 1
+        return row
+
+
+def _worker(args):
+    """Run a share of the sessions in this process; returns samples and memory numbers."""
+    seeds, games, no_sleep, text_mode, warm, timeout = args
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    from lab import settings, solver
+    from lab.state import REGISTRY
+
+    settings.NO_SLEEP = no_sleep
+    if text_mode:
+        settings.TEXT_MODE = text_mode
+    if warm:
+        solver.tables()  # otherwise the first reports race the background build
+    _install_meter()
+
+    # one throwaway session so import and first-compile costs stay out of the baseline
+    Player(-1, 0, timeout).step()
+    rss0 = rss_bytes()
+    players = [Player(seed, games, timeout) for seed in seeds]
+    samples = []
+    peak = REGISTRY.stats()
+    t0 = time.perf_counter()
+    while players:
+        for p in list(players):
+            samples.append(p.step())
+            if p.games_left == 0:
+                players.remove(p)
+        if len(REGISTRY) >= len(seeds):
+            peak = REGISTRY.stats()
+    return {"samples": samples, "loop_s": time.perf_counter() - t0, "rss_before": rss0, "rss_after": rss_bytes(),
+            "sessions": len(seeds), "registry": peak}
+
+
+# ---------------- Report ----------------
+def _percentiles(xs):
+    a = np.asarray(xs, float)
+    return {"p50": float(np.percentile(a, 50)), "p95": float(np.percentile(a, 95)),
+            "p99": float(np.percentile(a, 99)), "mean": float(a.mean()), "n": int(len(a))}
+
+
+def summarize(samples):
+    """Latency percentiles (ms), messages and bytes per rerun, overall and per action."""
+    def block(rows):
+        return {
+            "latency_ms": _percentiles([r[1] * 1000 for r in rows]),
+            "msgs_per_rerun": float(np.mean([r[2] for r in rows])),
+            "bytes_per_rerun": float(np.mean([r[3] for r in rows])),
+        }
+
+    by_action = {}
+    for row in samples:
+        by_action.setdefault(row[0], []).append(row)
+    return {"all": block(samples), "actions": {a: block(rows) for a, rows in sorted(by_action.items())}}
+
+
+def run(sessions=10, games=1, no_sleep=True, text_mode=None, warm=True, timeout=60, seed=0, workers=1):
+    """Drive ``sessions`` open players through ``games`` games each; returns the report dict."""
+    from lab import settings
+
+    workers = max(1, min(workers, sessions))
+    shares = [list(range(seed + i, seed + sessions, workers)) for i in range(workers)]
+    jobs = [(s, games, no_sleep, text_mode, warm, timeout) for s in shares]
+    t0 = time.perf_counter()
+    if workers == 1:
+        parts = [_worker(jobs[0])]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_worker, jobs))
+    wall = time.perf_counter() - t0
+
+    samples = [row for part in parts for row in part["samples"]]
+    per_session = [(p["rss_after"] - p["rss_before"]) / p["sessions"] for p in parts]
+    report = summarize(samples)
+    report.update({
+        "config": {"sessions": sessions, "games": games, "workers": workers, "no_sleep": no_sleep,
+                   "text_mode": text_mode or settings.TEXT_MODE, "seed": seed},
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "wall_s": wall,
+        "games_finished": sessions * games,
+        "reruns_per_s": len(samples) / wall,
+        "concurrency": {"max": workers, "mean": sum(r[1] for r in samples) / max(p["loop_s"] for p in parts)},
+        "rss_bytes": {"per_session": float(np.mean(per_session)),
+                      "per_worker": [p["rss_after"] for p in parts]},
+        "game_state_bytes": {"per_session": float(np.mean([p["registry"]["bytes"] / p["sessions"] for p in parts])),
+                             "max": max(p["registry"]["max_bytes"] for p in parts)},
+    })
+    return report
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Concurrent playthrough benchmark for app.py.")
+    p.add_argument("--sessions", type=int, default=10)
+    p.add_argument("--games", type=int, default=1, help="games per session")
+    p.add_argument("--workers", type=int, default=1, help="processes to spread the sessions over")
+    p.add_argument("--no-sleep", action="store_true", help="skip time.sleep in the animations")
+    p.add_argument("--text-mode", choices=("client", "server"), default=None)
+    p.add_argument("--no-warm", action="store_true", help="do not prebuild the solver tables")
+    p.add_argument("--timeout", type=float, default=60.0, help="per-rerun timeout (s)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default="loadtest.json")
+    args = p.parse_args(argv)
+
+    report = run(args.sessions, args.games, args.no_sleep, args.text_mode, not args.no_warm,
+                 args.timeout, args.seed, args.workers)
+    Path(args.out).write_text(json.dumps(report, indent=2))
+
+    lat = report["all"]["latency_ms"]
+    print(f"{args.sessions} sessions, {report['games_finished']} games, {lat['n']} reruns in {report['wall_s']:.1f}s")
+    conc = report["concurrency"]
+    print(f"latency ms  p50 {lat['p50']:.1f}  p95 {lat['p95']:.1f}  p99 {lat['p99']:.1f}   "
+          f"at {conc['mean']:.2f} reruns in flight (max {conc['max']}, one per worker)")
+    print(f"per rerun   {report['all']['msgs_per_rerun']:.1f} msgs  {report['all']['bytes_per_rerun']:.0f} bytes")
+    print(f"RSS/session {report['rss_bytes']['per_session'] / 1024:.0f} KiB   -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# lab/metrics.py
+"""Per-rerun profiling of app.py, exported in Prometheus text format.
+
+Off unless ``LQ_METRICS`` is set. When off, :func:`install` patches nothing
+and every hook returns after one attribute check. When on, each script run
+is timed and labelled with the phase and phase_part it started in and
+whether it ran the whole script or one st.fragment (``scope``), and we
+count the ``markdown`` calls it made (``st.markdown`` and placeholders) and
+their payload bytes, time spent in animation sleeps, and ``st.rerun()``
+chains: a run that ends in ``st.rerun()`` extends the chain, the next run
+that finishes normally closes it.
+
+    LQ_METRICS=file:/var/lib/node_exporter/lq.prom   rewritten every LQ_METRICS_EVERY seconds
+    LQ_METRICS=port:9108                             served at http://127.0.0.1:9108/metrics
+    LQ_PROFILE=lq.folded                             sampling profiler, folded stacks for flamegraph.pl
+"""
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+from lab import settings
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CALLS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+CHAIN = (0, 1, 2, 3, 4, 6, 8)
+
+
+# ---------------- Histograms ----------------
+class Histogram:
+    """Cumulative-bucket histogram per label tuple, like a Prometheus client's."""
+
+    def __init__(self, name, help, buckets, labels=("phase", "part", "scope")):
+        self.name, self.help, self.buckets, self.labels = name, help, buckets, labels
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[bisect_left(self.buckets, value)] += 1
+            s[-1] += value
+
+    def expose(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, s in series:
+            base = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, labels))
+            sep = "," if base else ""
+            acc = 0
+            for le, n in zip(self.buckets + ("+Inf",), s[:-1]):
+                acc += n
+                out.append(f'{self.name}_bucket{{{base}{sep}le="{le}"}} {acc}')
+            out.append(f"{self.name}_sum{{{base}}} {s[-1]:.6g}")
+            out.append(f"{self.name}_count{{{base}}} {acc}")
+        return out
+
+
+RERUN_SECONDS = Histogram("lq_rerun_seconds", "Wall time of one script run.", SECONDS)
+SLEEP_SECONDS = Histogram("lq_sleep_seconds", "Time one script run spent in animation sleeps.", SECONDS)
+MARKDOWN_CALLS = Histogram("lq_markdown_calls", "markdown calls made by one script run.", CALLS)
+MARKDOWN_BYTES = Histogram("lq_markdown_bytes", "markdown payload bytes sent by one script run.", BYTES)
+RERUN_CHAIN = Histogram("lq_rerun_chain_length",
+                        "st.rerun() calls in a row before a run that waits for the player, by where the chain ended.",
+                        CHAIN)
+HISTOGRAMS = (RERUN_SECONDS, SLEEP_SECONDS, MARKDOWN_CALLS, MARKDOWN_BYTES, RERUN_CHAIN)
+
+
+def expose():
+    """Every histogram in Prometheus text exposition format."""
+    lines = []
+    for h in HISTOGRAMS:
+        lines += h.expose()
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- Per-run hooks ----------------
+class Run:
+    __slots__ = ("t0", "scope", "phase", "part", "calls", "bytes", "slept")
+
+    def __init__(self, scope):
+        self.t0 = time.perf_counter()
+        self.scope = scope
+        self.phase = self.part = ""
+        self.calls = self.bytes = 0
+        self.slept = 0.0
+
+
+ENABLED = False
+_local = threading.local()  # .run: the script run on this thread; .chain: reruns in a row
+_runs = {}                  # thread id -> Run, for the sampler
+_installed = False
+_install_lock = threading.Lock()
+
+
+def begin(scope="app"):
+    """Top of app.py. A run left open by a script that raised is dropped, not continued."""
+    if not ENABLED:
+        return
+    _local.run = run = Run(scope)
+    _runs[threading.get_ident()] = run
+
+
+def fragment(fn):
+    """Time an st.fragment function as its own run (scope="fragment") when it reruns alone."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        if not ENABLED or ctx is None or not ctx.fragment_ids_this_run:
+            return fn(*args, **kwargs)  # part of a full run, already being timed
+        begin("fragment")
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            end()
+    return wrapper
+
+
+def label(g):
+    """Tag the current run with where the game was when it started."""
+    run = getattr(_local, "run", None) if ENABLED else None
+    if run is not None:
+        run.phase = g.phase
+        run.part = g.phase_part if g.phase == "playing" else ""
+
+
+def slept(seconds):
+    run = getattr(_local, "run", None) if ENABLED else None
+    if run is not None:
+        run.slept += seconds
+
+
+def end(rerun=False):
+    """Bottom of app.py (or st.rerun()); folds the run into the histograms."""
+    run = getattr(_local, "run", None) if ENABLED else None
+    if run is None:
+        return
+    _local.run = None
+    _runs.pop(threading.get_ident(), None)
+    labels = (run.phase, run.part, run.scope)
+    RERUN_SECONDS.observe(time.perf_counter() - run.t0, *labels)
+    SLEEP_SECONDS.observe(run.slept, *labels)
+    MARKDOWN_CALLS.observe(run.calls, *labels)
+    MARKDOWN_BYTES.observe(run.bytes, *labels)
+    # st.session_state follows the browser session across script threads
+    import streamlit as st
+    chain = st.session_state.get("_lq_chain", 0)
+    if rerun:
+        st.session_state["_lq_chain"] = chain + 1
+    else:
+        RERUN_CHAIN.observe(chain, *labels)
+        st.session_state["_lq_chain"] = 0
+
+
+def install():
+    """Patch Streamlit's markdown and rerun once per process, and start the exporter and sampler."""
+    global ENABLED, _installed
+    if not settings.METRICS or _installed:
+        return
+    with _install_lock:
+        if _installed:
+            return
+        import streamlit as st
+        from streamlit.delta_generator import DeltaGenerator
+
+        markdown, rerun = DeltaGenerator.markdown, st.rerun
+
+        def counted_markdown(self, body, *args, **kwargs):
+            run = getattr(_local, "run", None)
+            if run is not None:
+                run.calls += 1
+                run.bytes += len(body.encode()) if isinstance(body, str) else 0
+            return markdown(self, body, *args, **kwargs)
+
+        def chained_rerun(*args, **kwargs):
+            end(rerun=True)
+            return rerun(*args, **kwargs)
+
+        DeltaGenerator.markdown = counted_markdown
+        st.markdown = counted_markdown.__get__(st._main)
+        st.rerun = chained_rerun
+        _start_exporter(settings.METRICS)
+        if settings.PROFILE:
+            Sampler(settings.PROFILE).start()
+        ENABLED = _installed = True
+
+
+# ---------------- Exporters ----------------
+def write(path):
+    """Atomically replace ``path`` with the current exposition (textfile-collector style)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(expose())
+    os.replace(tmp, path)
+
+
+def _start_exporter(target):
+    kind, _, arg = target.partition(":")
+    if kind == "file":
+        def loop():
+            while True:
+                write(arg)
+                time.sleep(settings.METRICS_EVERY)
+        threading.Thread(target=loop, name="lq-metrics-file", daemon=True).start()
+    elif kind == "port":
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = expose().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", int(arg)), Handler)
+        threading.Thread(target=server.serve_forever, name="lq-metrics-http", daemon=True).start()
+    # anything else (e.g. LQ_METRICS=1): collect in process only, see expose()
+
+
+# ---------------- Sampling profiler ----------------
+class Sampler(threading.Thread):
+    """Samples the stacks of threads that are running app.py every ``interval`` seconds.
+
+    Counts are written as folded stacks (``frame;frame;frame count``), the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, path, interval=None):
+        super().__init__(name="lq-sampler", daemon=True)
+        self.path = path
+        self.interval = interval or settings.PROFILE_INTERVAL
+        self.counts = {}
+
+    def run(self):
+        last = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for tid, run in list(_runs.items()):
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                key = f"{run.phase}/{run.part}/{run.scope};" + ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            if time.monotonic() - last >= settings.METRICS_EVERY:
+                self.dump()
+                last = time.monotonic()
+
+    def dump(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            for key, n in sorted(self.counts.items()):
+                f.write(f"{key} {n}\n")
+        os.replace(tmp, self.path)
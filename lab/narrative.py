@@ -0,0 +1,157 @@
+# lab/narrative.py
+"""Static narrative text and the HTML built from it, rendered once per process.
+
+app.py used to rebuild the tutorial list, the endings dict, the page CSS
+and every typewriter wrapper on each rerun. Here they are module constants
+or cached, so a rerun only looks them up.
+"""
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from lab import settings
+
+STATIC = Path(__file__).resolve().parent.parent / "static"
+FONT_FILE = STATIC / "fonts" / "PressStart2P-Regular.ttf"  # SIL OFL; vendored copy for LQ_ASSETS=local
+GOOGLE_FONT = "<link href=\"https://fonts.googleapis.com/css2?family=Press+Start+2P&display=swap\" rel=\"stylesheet\">"
+
+# ---------------- Tutorial text (elaborated) ----------------
+TUTORIAL_LINES = (
+    "SYSTEM BOOTING...",
+    "ACCESS GRANTED.",
+    "WELCOME, SUBJECT #417.",
+    "YOU HAVE ENTERED: THE LAB OF UNCERTAINTY.",
+    "PLEASE REMAIN CALM.",
+    "YOUR BODY CONTAINS A CONTROLLED TOXIN—CODE NAME: LAMBDA SERUM.",
+    "THE ANTIDOTE IS UNSTABLE, DISTRIBUTED BY CHANCE.",
+    "TO SURVIVE, YOU MUST PLAY A GAME OF ORDER AND CHAOS.",
+    "",
+    "EVERY TURN, YOU FACE THREE PHASES:",
+    "",
+    "[1] THE QUEUE PHASE — THE WAIT.",
+    "    Subjects arrive randomly. λ = ARRIVAL RATE.",
+    "    Services happen at rate μ = SERVICE RATE.",
+    "    When λ ≥ μ, the system becomes unstable.",
+    "",
+    "[2] THE ROULETTE PHASE — THE TEST.",
+    "    Six chambers, one bullet. Spin or don't spin.",
+    "    Spin: independent 1/6 chance. Don't spin: dependent.",
+    "",
+    "[3] THE POISON PHASE — THE DRIFT.",
+    "    Toxin leaks randomly (Poisson). Antidotes appear sometimes.",
+    "",
+    "AFTER EACH ROUND, DR. LAMBDA REPORTS:",
+    "    • Rounds Survived",
+    "    • Current Toxicity (%)",
+    "    • λ and μ",
+    "    • Survival Probability",
+    "",
+    "IF TOXICITY ≥ 100% → TOXIC DEATH.",
+    "IF λ ≥ μ → QUEUE COLLAPSE.",
+    "IF REVOLVER FIRES → ROULETTE DEATH.",
+    "",
+    "YOU CAN QUIT AFTER ANY REPORT (Voluntary Exit).",
+    "THE ONLY WAY TO 'WIN' IS TO OUTLAST ENTROPY.",
+    "",
+    "THIS IS YOUR WARNING. PREPARE.",
+    "THE EXPERIMENT BEGINS NOW."
+)
+
+# ---------------- Endings narratives (user-provided exact text) ----------------
+ENDING_TEXTS = {
+    "roulette_death": (
+        "The revolver hums. The cylinder stops.\n"
+        "You hear a sharp click — or was it—\n"
+        "BANG.\n"
+        "The walls splatter in noise and red logic.\n"
+        "Experiment #417: Terminated."
+    ),
+    "toxic_death": (
+        "Your veins pulse neon.\n"
+        "You feel numbers crawling under your skin.\n"
+        "100% reached.\n"
+        "Biological system—irreversible.\n"
+        "☠ Simulation Terminated ☠"
+    ),
+    "queue_collapse": (
+        "The hallway grows crowded.\n"
+        "Screams echo in infinite recursion.\n"
+        "λ ≥ μ.\n"
+        "The Lab cannot stabilize its arrivals.\n"
+        "System collapses into chaos."
+    ),
+    "escape": (
+        "Dr. Lambda leans forward.\n"
+        "For the first time, the screen shows no red.\n"
+        "You balanced the rates.\n"
+        "Entropy tamed.\n"
+        "The Lab of Uncertainty fades away."
+    ),
+    "secret": (
+        "The system no longer tests you.\n"
+        "It integrates you.\n"
+        "You are no longer Subject #417.\n"
+        "You are λ.\n"
+        "You are μ.\n"
+        "You are balance.\n"
+        "> Simulation Complete <"
+    ),
+    "voluntary_exit": (
+        "You close your eyes.\n"
+        "Machines hum without you.\n"
+        "Somewhere, another subject takes your place.\n"
+        "Experiment #418 begins."
+    )
+}
+
+
+# ---------------- Page head ----------------
+@lru_cache(maxsize=None)
+def head_html(mode, static_serving):
+    """Font and CSS markup for the top of every full run, built once per process.
+
+    It is still sent on every full-app run: Streamlit removes elements a run
+    does not emit, so it cannot go out once per session. Fragment reruns skip it.
+
+    ``local`` links the stylesheets under static/ (a few hundred bytes per
+    rerun; the browser keeps the files cached), font.css only if the font
+    file is there. Without static serving, or in ``remote`` mode, the CSS is
+    inlined from static/lq.css as before, and ``remote`` also links Google Fonts.
+    """
+    if mode == "local" and static_serving:
+        font = "<link rel=\"stylesheet\" href=\"app/static/font.css\">" if FONT_FILE.exists() else ""
+        return font + "<link rel=\"stylesheet\" href=\"app/static/lq.css\">"
+    css = re.sub(r"/\*.*?\*/\n?", "", (STATIC / "lq.css").read_text(encoding="utf-8"), flags=re.S)
+    style = "<style>\n" + css + "</style>"
+    return (GOOGLE_FONT + "\n" + style) if mode == "remote" else style
+
+
+# ---------------- Typewriter HTML ----------------
+@lru_cache(maxsize=settings.HTML_CACHE)
+def typed_html(text, speed=0.02):
+    """Whole text in one element; the browser reveals it line by line with CSS steps()."""
+    lines = []
+    delay = 0.0
+    for line in text.split("\n"):
+        n = len(line)
+        if n:
+            lines.append(
+                f"<span class='tw-line' style='animation-duration:{n * speed:.2f}s;"
+                f"animation-timing-function:steps({n});animation-delay:{delay:.2f}s'>{line}</span>"
+            )
+        else:
+            lines.append("")
+        delay += n * speed
+    cursor = f"<span class='cursor' style='animation:blink 1s steps(1) infinite,vanish 0s {delay:.2f}s forwards'>█</span>"
+    return "<div class='game-text'>" + "\n".join(lines) + cursor + "</div>"
+
+
+def prerender():
+    """Fill the typed_html cache with every static narrative (done at import)."""
+    for line in TUTORIAL_LINES:
+        typed_html(line, 0.02)
+    for text in ENDING_TEXTS.values():
+        typed_html(text, 0.02)
+
+
+prerender()
@@ -0,0 +1,257 @@
+# lab/policy.py
+"""Best Spin / Don't Spin choice at every roulette state, by value iteration.
+
+Same discretised state as :mod:`lab.solver` (queue, toxicity, chambers
+cleared, λ, μ), but instead of averaging a fixed spin probability the
+roulette step takes the better of the two actions, maximising P(the game
+ends in escape or secret). The stationary rounds are iterated to a fixed
+point, earlier rounds are filled in backwards, and the result is stored as
+
+    adv[round - 1, q, tox, cleared, λ, μ] = P(win | Spin) - P(win | Don't Spin)
+
+in float16, one ``.npy`` per ``(rules, grid)`` under ``LQ_CACHE_DIR``. The
+app memory-maps it, so a hint is one indexed read. Each backward step is
+split over λ slices and run on a thread pool (NumPy releases the GIL), so a
+rebuild uses every core.
+
+    python -m lab.policy --workers 8
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from lab import settings
+from lab.rules import DEFAULT_RULES
+from lab.solver import DEFAULT_GRID, _along, _points, model
+
+
+# ---------------- Value iteration ----------------
+class Planner:
+    """Backward round operator on win probability, with a max over actions at the roulette."""
+
+    def __init__(self, rules=DEFAULT_RULES, grid=DEFAULT_GRID, workers=None):
+        self.m = model(rules, grid)
+        self.workers = workers or os.cpu_count() or 1
+        nl = len(self.m.lam)
+        bounds = np.linspace(0, nl, min(self.workers, nl) + 1).astype(int)
+        self.blocks = [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+        self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="lq-policy")
+
+    def _map(self, fn):
+        return list(self.pool.map(fn, self.blocks))
+
+    def report(self, nxt, rnd):
+        m, r = self.m, self.m.rules
+        v = _along(nxt, m.creep, 3)
+        if rnd >= r.escape_round:
+            v[:, m.escape_tox] = 1.0
+        if m._secret_on(rnd):
+            v[:, ~m.escape_tox if rnd >= r.escape_round else slice(None)] = 1.0
+        return v
+
+    def roulette(self, v, spin=None):
+        """(value before the pull, Spin minus Don't Spin) for every cleared count.
+
+        ``spin=None`` picks the better action; a number mixes them like the solver.
+        """
+        m = self.m
+        c = m.nk
+        safe = _along(v, m.relief, 1)
+        out = np.empty_like(v)
+        adv = np.empty_like(v)
+        for k in range(c):
+            q_spin = (1 - 1.0 / c) * safe[:, :, 0]
+            q_stay = (1 - 1.0 / (c - k)) * safe[:, :, k + 1] if k + 1 < c else np.zeros_like(q_spin)
+            adv[:, :, k] = q_spin - q_stay
+            out[:, :, k] = np.maximum(q_spin, q_stay) if spin is None else spin * q_spin + (1 - spin) * q_stay
+        return out, adv
+
+    def queue_phase(self, v):
+        m = self.m
+        nl, nm = len(m.lam), len(m.mu)
+        out = np.empty_like(v)
+
+        def transition(b):
+            out[..., b, :] = np.einsum("lmqp,ptklm->qtklm", m.queue[b], v[..., b, :], optimize=True)
+
+        self._map(transition)
+        flat = out.reshape(-1, nl * nm)
+        drift = m.drift.reshape(nl * nm, nl * nm)
+        res = np.empty_like(flat)
+        rows = np.linspace(0, flat.shape[0], len(self.blocks) + 1).astype(int)
+
+        def mix(i):
+            res[rows[i]:rows[i + 1]] = flat[rows[i]:rows[i + 1]] @ drift.T
+
+        list(self.pool.map(mix, range(len(self.blocks))))
+        return res.reshape(v.shape)
+
+    def round(self, nxt, rnd, spin=None):
+        """Start-of-round values of ``rnd`` and the roulette advantage in that round."""
+        m = self.m
+        v = self.report(nxt, rnd)
+        v = _along(v, m.poison, 1)
+        v, adv = self.roulette(v, spin)
+        return self.queue_phase(v), adv
+
+    def solve(self, spin=None):
+        """(start-of-round values, roulette advantage) for rounds ``1 .. stationary_from``."""
+        m, g = self.m, self.m.grid
+        shape = m.shape[1:]
+        v = np.zeros(shape)
+        for _ in range(g.max_iter):
+            nv, adv = self.round(v, m.stationary_from, spin)
+            done = np.abs(nv - v).max() < g.tol
+            v = nv
+            if done:
+                break
+        values = np.empty((m.stationary_from,) + shape, np.float32)
+        advs = np.empty((m.stationary_from,) + shape, np.float16)
+        values[-1], advs[-1] = v, adv
+        for rnd in range(m.stationary_from - 1, 0, -1):
+            v, adv = self.round(v, rnd, spin)
+            values[rnd - 1], advs[rnd - 1] = v, adv
+        return values, advs
+
+    def close(self):
+        self.pool.shutdown()
+
+
+# ---------------- Hint table on disk ----------------
+def table_path(rules=DEFAULT_RULES, grid=DEFAULT_GRID):
+    """Where the table for these parameters lives; changing any parameter changes the name."""
+    key = hashlib.sha1(repr((rules, grid)).encode()).hexdigest()[:12]
+    return Path(settings.CACHE_DIR) / f"policy-{key}.npy"
+
+
+def build(rules=DEFAULT_RULES, grid=DEFAULT_GRID, workers=None):
+    """Solve and write the advantage table atomically; returns its path."""
+    planner = Planner(rules, grid, workers)
+    try:
+        _, adv = planner.solve()
+    finally:
+        planner.close()
+    path = table_path(rules, grid)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp.npy")
+    np.save(tmp, adv)
+    os.replace(tmp, path)
+    return path
+
+
+@lru_cache(maxsize=4)
+def _load(path):
+    return np.load(path, mmap_mode="r")
+
+
+def load(rules=DEFAULT_RULES, grid=DEFAULT_GRID):
+    """The memory-mapped table, or None if it has not been built for these parameters."""
+    path = table_path(rules, grid)
+    return _load(str(path)) if path.exists() else None
+
+
+_warming = {}
+_failed = {}                # (rules, grid) -> time.monotonic() of the last build that raised
+_warm_lock = threading.Lock()
+RETRY_SECONDS = 60.0
+
+
+def _build(rules, grid):
+    try:
+        build(rules, grid)
+    except Exception:
+        _failed[(rules, grid)] = time.monotonic()  # e.g. disk full or LQ_CACHE_DIR not writable
+        raise
+    finally:
+        with _warm_lock:
+            _warming.pop((rules, grid), None)
+
+
+def warm(rules=DEFAULT_RULES, grid=DEFAULT_GRID):
+    """Build the table in a daemon thread if it is not on disk yet; a failed build is retried after RETRY_SECONDS."""
+    key = (rules, grid)
+    with _warm_lock:
+        if key in _warming or table_path(rules, grid).exists():
+            return
+        if time.monotonic() - _failed.get(key, -RETRY_SECONDS) < RETRY_SECONDS:
+            return
+        _warming[key] = threading.Thread(target=_build, args=key, name="lq-policy-build", daemon=True)
+        _warming[key].start()
+
+
+@lru_cache(maxsize=4)
+def _axes(rules, grid):
+    return (_points(0.0, 100.0, grid.tox_step), _points(rules.lam_floor, rules.lam_max, grid.rate_step),
+            _points(rules.mu_floor, grid.mu_max, grid.rate_step))
+
+
+def _index(pts, x):
+    return min(max(int(round((x - pts[0]) / (pts[1] - pts[0]))), 0), len(pts) - 1)
+
+
+def advantage(rnd, queue_length, toxicity, cleared, lmbd, mu, rules=DEFAULT_RULES, grid=DEFAULT_GRID):
+    """P(win | Spin) - P(win | Don't Spin) at the roulette, or None if there is no table yet."""
+    table = load(rules, grid)
+    if table is None:
+        return None
+    tox, lam, mus = _axes(rules, grid)
+    r = min(max(int(rnd), 1), table.shape[0]) - 1
+    q = min(max(int(queue_length), 0), table.shape[1] - 1)
+    k = min(max(int(cleared), 0), table.shape[3] - 1)
+    return float(table[r, q, _index(tox, toxicity), k, _index(lam, lmbd), _index(mus, mu)])
+
+
+def advantages(rnd, queue_length, toxicity, cleared, lmbd, mu, rules=DEFAULT_RULES, grid=DEFAULT_GRID):
+    """:func:`advantage` for arrays of states at once (lab/bots.py); None if there is no table yet."""
+    table = load(rules, grid)
+    if table is None:
+        return None
+    tox, lam, mus = _axes(rules, grid)
+
+    def index(pts, x):
+        return np.clip(np.rint((np.asarray(x) - pts[0]) / (pts[1] - pts[0])).astype(np.intp), 0, len(pts) - 1)
+
+    r = np.clip(np.asarray(rnd, np.intp), 1, table.shape[0]) - 1
+    q = np.clip(np.asarray(queue_length, np.intp), 0, table.shape[1] - 1)
+    k = np.clip(np.asarray(cleared, np.intp), 0, table.shape[3] - 1)
+    return table[r, q, index(tox, toxicity), k, index(lam, lmbd), index(mus, mu)].astype(np.float32)
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    import argparse
+    import time
+
+    from lab.solver import _start_weights
+
+    p = argparse.ArgumentParser(description="Build the optimal roulette policy table.")
+    p.add_argument("--workers", type=int, default=None, help="threads (default: every core)")
+    args = p.parse_args(argv)
+
+    t0 = time.perf_counter()
+    path = build(workers=args.workers)
+    print(f"built {path} in {time.perf_counter() - t0:.1f}s ({path.stat().st_size / 1e6:.1f} MB)")
+
+    # what the optimal policy is worth from a fresh game, against always / never / half spinning
+    r, m = DEFAULT_RULES, model()
+    wl = _start_weights(m.lam, r.lam_mean, r.lam_sd, r.lam_start_floor)
+    wm = _start_weights(m.mu, r.mu_mean, r.mu_sd, r.mu_start_floor)
+    qi, ti = r.start_queue, _index(m.tox, r.start_toxicity)
+    planner = Planner(workers=args.workers)
+    for name, spin in (("optimal", None), ("always spin", 1.0), ("never spin", 0.0), ("spin half", 0.5)):
+        values, _ = planner.solve(spin)
+        win = float(wl @ values[0, qi, ti, 0] @ wm)
+        print(f"  {name:<12} P(escape or secret) from start {win:.4%}")
+    planner.close()
+    adv = load()
+    print(f"  Spin is better in {(adv > 0).mean():.1%} of table states")
+
+
+if __name__ == "__main__":
+    main()
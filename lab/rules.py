@@ -0,0 +1,54 @@
+# lab/rules.py
+"""The game's balance numbers, gathered in one place."""
+from dataclasses import dataclass, replace
+
+# ---------------- Ending codes ----------------
+ENDINGS = ("roulette_death", "toxic_death", "queue_collapse", "escape", "secret", "voluntary_exit")
+ROULETTE_DEATH, TOXIC_DEATH, QUEUE_COLLAPSE, ESCAPE, SECRET, VOLUNTARY_EXIT = range(len(ENDINGS))
+UNFINISHED = -1  # game still running when a simulation hit its round cap
+
+
+# ---------------- Rules ----------------
+@dataclass(frozen=True)
+class Rules:
+    """Every tunable number of one round: queue → roulette → poison → report."""
+    # start_game
+    start_queue: int = 2
+    start_toxicity: float = 15.0
+    lam_mean: float = 0.8
+    lam_sd: float = 0.12
+    lam_start_floor: float = 0.3
+    mu_mean: float = 1.1
+    mu_sd: float = 0.15
+    mu_start_floor: float = 0.6
+    # queue phase
+    lam_drift: float = 0.08
+    lam_floor: float = 0.2
+    mu_drift: float = 0.1
+    mu_floor: float = 0.5
+    queue_cap: int = 12
+    # roulette phase
+    chambers: int = 6
+    pull_factor: float = 5 / 6
+    pull_relief: float = 10.0
+    # poison phase
+    lam_poison: float = 0.45
+    drop_toxicity: float = 8.0
+    antidote_chance: float = 0.18
+    antidote_min: int = 5
+    antidote_max: int = 15
+    # report phase
+    escape_round: int = 10
+    escape_toxicity: float = 80.0
+    secret_round: int = 20
+    secret_survival: float = 0.9
+    lam_creep_min: float = 0.02
+    lam_creep_max: float = 0.12
+    lam_max: float = 2.0
+
+    def with_(self, **changes):
+        """Copy with some numbers changed, e.g. ``DEFAULT_RULES.with_(queue_cap=20)``."""
+        return replace(self, **changes)
+
+
+DEFAULT_RULES = Rules()
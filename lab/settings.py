@@ -0,0 +1,77 @@
+# lab/settings.py
+"""Process-wide switches, read once from the environment."""
+import os
+
+# "client": text is sent once and typed out by CSS in the browser.
+# "server": the original per-character placeholder updates with time.sleep.
+TEXT_MODE = os.environ.get("LQ_TEXT_MODE", "client")
+
+# Typewriter keys remembered per session; older keys fall out (and would replay).
+DISPLAYED_MAX = int(os.environ.get("LQ_DISPLAYED_MAX", "64"))
+
+# Sessions untouched for this long are evicted by the registry's sweeper.
+IDLE_SECONDS = float(os.environ.get("LQ_IDLE_SECONDS", "1800"))
+SWEEP_SECONDS = float(os.environ.get("LQ_SWEEP_SECONDS", "60"))
+
+# Skip every time.sleep in the animations (benchmarks measuring pure compute).
+NO_SLEEP = os.environ.get("LQ_NO_SLEEP", "") == "1"
+
+# Finished runs go to this SQLite file through one batched background writer.
+LEADERBOARD_PATH = os.environ.get("LQ_LEADERBOARD", "leaderboard.db")
+LEADERBOARD_BATCH = int(os.environ.get("LQ_LEADERBOARD_BATCH", "512"))
+LEADERBOARD_QUEUE = int(os.environ.get("LQ_LEADERBOARD_QUEUE", "100000"))
+# Seconds a top-N query result is reused before asking SQLite again.
+LEADERBOARD_TTL = float(os.environ.get("LQ_LEADERBOARD_TTL", "5"))
+
+# "local": font and CSS from static/ (needs server.enableStaticServing, see .streamlit/config.toml);
+# nothing is fetched from other hosts, so this is the one to use offline. The pixel font is used
+# only once static/fonts/PressStart2P-Regular.ttf is there (see static/font.css), monospace until then.
+# "remote": Google Fonts link plus inlined CSS, the original behaviour and the default until the
+# font file is vendored, so a default deployment keeps the pixel font.
+ASSETS = os.environ.get("LQ_ASSETS", "remote")
+
+# Typewriter HTML strings kept per process (static narratives are pre-rendered at import).
+HTML_CACHE = int(os.environ.get("LQ_HTML_CACHE", "1024"))
+
+# Per-rerun profiling (lab/metrics.py): "file:PATH", "port:N", or "1" to collect in process only.
+METRICS = os.environ.get("LQ_METRICS", "")
+METRICS_EVERY = float(os.environ.get("LQ_METRICS_EVERY", "15"))
+# Folded-stack output of the sampling profiler (needs LQ_METRICS); empty = off.
+PROFILE = os.environ.get("LQ_PROFILE", "")
+PROFILE_INTERVAL = float(os.environ.get("LQ_PROFILE_INTERVAL", "0.005"))
+
+# Precomputed tables that are memory-mapped at startup (lab/policy.py).
+CACHE_DIR = os.environ.get("LQ_CACHE_DIR", ".lq-cache")
+
+# Servers of the continuous-time queue (lab/des.py): 0 keeps the one-step queue phase, 1 is M/M/1.
+QUEUE_SERVERS = int(os.environ.get("LQ_QUEUE_SERVERS", "0"))
+# Servers in "crowded lab" mode, with arrivals scaled to keep ρ = λ/μ.
+CROWD_SERVERS = int(os.environ.get("LQ_CROWD_SERVERS", "10000"))
+
+# Game checkpoints shared by every replica (lab/checkpoint.py): "sqlite:PATH", "file:DIR", or "" for off.
+CHECKPOINT = os.environ.get("LQ_CHECKPOINT", "sqlite:checkpoints.db")
+# A session's snapshots are written at most this often; the newest one wins.
+CHECKPOINT_DEBOUNCE = float(os.environ.get("LQ_CHECKPOINT_DEBOUNCE", "0.5"))
+# Checkpoints not rewritten for this long are pruned.
+CHECKPOINT_MAX_AGE = float(os.environ.get("LQ_CHECKPOINT_MAX_AGE", str(7 * 24 * 3600)))
+
+# Analytics events for the operator page (lab/events.py): bounded queue, then Parquet
+# segments rotated by size or age under LQ_EVENTS_DIR ("" keeps the aggregates in memory only).
+EVENTS_DIR = os.environ.get("LQ_EVENTS_DIR", "lq-events")
+EVENTS_QUEUE = int(os.environ.get("LQ_EVENTS_QUEUE", "100000"))
+EVENTS_SEGMENT_ROWS = int(os.environ.get("LQ_EVENTS_SEGMENT_ROWS", "100000"))
+EVENTS_SEGMENT_SECONDS = float(os.environ.get("LQ_EVENTS_SEGMENT_SECONDS", "60"))
+EVENTS_KEEP = int(os.environ.get("LQ_EVENTS_KEEP", "48"))
+# Seconds between refreshes of the operator page.
+DASHBOARD_EVERY = float(os.environ.get("LQ_DASHBOARD_EVERY", "2"))
+# The operator page answers only /operator?token=<this>; "" (the default) keeps it closed.
+OPERATOR_TOKEN = os.environ.get("LQ_OPERATOR_TOKEN", "")
+
+# Shared-lab coordinator (lab/labserver.py): its Unix socket ("" = shared mode off), how often
+# it pushes coalesced lab deltas, how long a silent subject stays in its lab, and how often the
+# lab panel redraws from this process's copy of those deltas.
+LAB_SOCKET = os.environ.get("LQ_LAB_SOCKET", ".lq-lab.sock")
+LAB_DELTA_SECONDS = float(os.environ.get("LQ_LAB_DELTA_SECONDS", "0.05"))
+LAB_TIMEOUT = float(os.environ.get("LQ_LAB_TIMEOUT", "2"))
+LAB_IDLE_SECONDS = float(os.environ.get("LQ_LAB_IDLE_SECONDS", "300"))
+LAB_REFRESH = float(os.environ.get("LQ_LAB_REFRESH", "1"))
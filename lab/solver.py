@@ -0,0 +1,397 @@
+# lab/solver.py
+"""Exact ending distribution by dynamic programming over a discretised game state.
+
+The state at the start of a round is ``(queue_length, toxicity, cleared, λ, μ)``
+where ``cleared`` counts chambers passed with "Don't Spin" since the last spin.
+The player never sees ``bullet_pos``, so from their side the bullet is uniform
+over the ``chambers - cleared`` chambers not yet passed; that is what the
+solver averages over. λ, μ and toxicity live on a grid (see :class:`Grid`);
+``queue_length`` and ``cleared`` are exact.
+
+Value tables ``V[e, q, t, k, l, m]`` hold P(ending ``e``) from the start of a
+round. Rounds past every round-dependent threshold behave alike, so they share
+one table found by iterating the round operator to a fixed point; earlier
+rounds are filled in backwards from it. Tables are built once per
+``(rules, grid, spin)`` and kept in an LRU, so a lookup is a few slices.
+"""
+import math
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from lab.rules import DEFAULT_RULES, ENDINGS, ESCAPE, QUEUE_COLLAPSE, ROULETTE_DEATH, SECRET, TOXIC_DEATH
+
+_LATTICE = 0.01  # app.py rounds λ and μ to two decimals
+
+# the solver's player always continues, so voluntary_exit is never reached
+OUTCOMES = ENDINGS[:SECRET + 1]
+
+
+# ---------------- Grid ----------------
+@dataclass(frozen=True)
+class Grid:
+    """Resolution of the discretised λ, μ and toxicity axes.
+
+    The round operator runs at ``rate_step``; stored tables keep every
+    ``store_stride``-th λ/μ point and lookups interpolate between them.
+    """
+    rate_step: float = 0.05
+    mu_max: float = 2.0
+    tox_step: float = 10.0
+    store_stride: int = 2
+    poisson_terms: int = 40
+    tol: float = 1e-7
+    max_iter: int = 500
+
+
+DEFAULT_GRID = Grid()
+
+
+def _points(lo, hi, step):
+    return lo + step * np.arange(int(round((hi - lo) / step)) + 1)
+
+
+def _erf_cdf(x, mean, sd):
+    return 0.5 * (1 + np.vectorize(math.erf)((x - mean) / (sd * math.sqrt(2))))
+
+
+def _lattice_pmf(centers, sd, floor, lattice):
+    """pmf over ``lattice`` of round(max(floor, N(c, sd)), 2) for each c in ``centers``."""
+    half = (lattice[1] - lattice[0]) / 2
+    edges = np.concatenate([[-np.inf], lattice[1:] - half, [np.inf]])
+    edges = np.where(edges <= floor + half, -np.inf, edges)
+    edges[-1] = np.inf
+    return np.diff(_erf_cdf(edges[None, :], centers[:, None], sd), axis=1)
+
+
+def _nearest(pts, x):
+    return np.clip(np.rint((x - pts[0]) / (pts[1] - pts[0])).astype(int), 0, len(pts) - 1)
+
+
+def _creep_matrix(pts, lo, hi, cap):
+    """P(next bucket j | now at pts[i]) for min(cap, x + U(lo, hi))."""
+    edges = np.concatenate([[-np.inf], (pts[1:] + pts[:-1]) / 2, [np.inf]])
+    a = pts[:, None] + lo
+    b = pts[:, None] + hi
+    cdf = np.clip((edges[None, :] - a) / (b - a), 0, 1)
+    mat = np.diff(cdf, axis=1)
+    # mass pushed past the cap lands on the cap's bucket
+    top = int(np.abs(pts - cap).argmin())
+    mat[:, top] += mat[:, top + 1:].sum(axis=1)
+    mat[:, top + 1:] = 0
+    return mat
+
+
+def _spread(pts, values, probs, out_row):
+    """Add ``probs`` of landing on ``values`` to ``out_row``, split linearly between grid points."""
+    step = pts[1] - pts[0]
+    pos = np.clip((values - pts[0]) / step, 0, len(pts) - 1)
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, len(pts) - 1)
+    w = pos - lo
+    np.add.at(out_row, lo, probs * (1 - w))
+    np.add.at(out_row, hi, probs * w)
+
+
+def _poisson_pmf(lam, terms):
+    k = np.arange(terms)
+    if lam <= 0:
+        return (k == 0).astype(float)
+    return np.exp(k * math.log(lam) - lam - np.array([math.lgamma(i + 1) for i in k]))
+
+
+def _along(a, mat, axis):
+    """Apply ``mat`` to ``axis`` of ``a``: out[..., i, ...] = Σ_j mat[i, j] a[..., j, ...]."""
+    return np.moveaxis(np.tensordot(mat, a, axes=(1, axis)), 0, axis)
+
+
+# ---------------- Model ----------------
+class Model:
+    """Transition pieces of one round for a given ``Rules`` and ``Grid``."""
+
+    def __init__(self, rules=DEFAULT_RULES, grid=DEFAULT_GRID):
+        r, gr = rules, grid
+        self.rules, self.grid = r, gr
+        self.lam = _points(r.lam_floor, r.lam_max, gr.rate_step)
+        self.mu = _points(r.mu_floor, gr.mu_max, gr.rate_step)
+        self.tox = _points(0.0, 100.0, gr.tox_step)
+        self.nq, self.nk = r.queue_cap + 1, r.chambers
+        self.shape = (len(OUTCOMES), self.nq, len(self.tox), self.nk, len(self.lam), len(self.mu))
+
+        self._build_drift()
+        self.creep = _creep_matrix(self.lam, r.lam_creep_min, r.lam_creep_max, r.lam_max)
+        self._build_queue()
+        self._build_toxicity()
+        self.stationary_from = self._stationary_from()
+        self.lam_stored = self.lam[::gr.store_stride]
+        self.mu_stored = self.mu[::gr.store_stride]
+
+    def _build_drift(self):
+        """drift[l, m, a, b]: P(λ' near lam[a], μ' near mu[b], λ' < μ') from (lam[l], mu[m]).
+
+        The collapse check runs on the two-decimal values the game really draws,
+        not on the coarse grid; ``drift_collapse[l, m]`` is the mass with λ' ≥ μ'.
+        """
+        r = self.rules
+        hi = max(self.lam[-1], self.mu[-1]) + 6 * max(r.lam_drift, r.mu_drift)
+        fine = np.round(np.arange(r.lam_floor, hi, _LATTICE), 2)
+        pl = _lattice_pmf(self.lam, r.lam_drift, r.lam_floor, fine)
+        pm = _lattice_pmf(self.mu, r.mu_drift, r.mu_floor, fine)
+        to_l = np.eye(len(self.lam))[_nearest(self.lam, fine)]   # (fine, L)
+        to_m = np.eye(len(self.mu))[_nearest(self.mu, fine)]     # (fine, M)
+        # above[m, x, b]: mass of μ' in bucket b with μ' > fine[x]
+        per_b = pm[:, :, None] * to_m[None]
+        above = np.flip(np.cumsum(np.flip(per_b, 1), 1), 1)
+        above = np.concatenate([above[:, 1:], np.zeros_like(above[:, :1])], 1)
+        self.drift = np.einsum("lx,xa,mxb->lmab", pl, to_l, above)
+        self.drift_collapse = 1.0 - self.drift.sum(axis=(2, 3))
+
+    def _build_queue(self):
+        """queue[l, m, q, q'] and overflow collapse[l, m, q] for post-drift rates."""
+        r, terms = self.rules, self.grid.poisson_terms
+        nl, nm, nq = len(self.lam), len(self.mu), self.nq
+        self.queue = np.zeros((nl, nm, nq, nq))
+        self.collapse = np.zeros((nl, nm, nq))
+        for i, lam in enumerate(self.lam):
+            pa = _poisson_pmf(lam, terms)
+            for j, mu in enumerate(self.mu):
+                ps = _poisson_pmf(mu, terms)
+                ps[1] += ps[0]  # services floor at 1
+                ps[0] = 0.0
+                # X = arrivals - services, offset by terms - 1
+                px = np.convolve(pa, ps[::-1])
+                x = np.arange(len(px)) - (terms - 1)
+                for q in range(nq):
+                    nxt = np.maximum(0, q + x)
+                    ok = nxt <= r.queue_cap
+                    np.add.at(self.queue[i, j, q], nxt[ok], px[ok])
+                    self.collapse[i, j, q] = px[~ok].sum()
+
+    def _build_toxicity(self):
+        """relief[t, t'] after a survived pull; poison[t, t'] and toxic[t] for the poison phase."""
+        r, pts = self.rules, self.tox
+        n = len(pts)
+        self.relief = np.zeros((n, n))
+        for i, t in enumerate(pts):
+            _spread(pts, np.array([max(0.0, t - r.pull_relief)]), np.array([1.0]), self.relief[i])
+
+        drops = _poisson_pmf(r.lam_poison, self.grid.poisson_terms)
+        reds = np.arange(r.antidote_min, r.antidote_max + 1)
+        self.poison = np.zeros((n, n))
+        self.toxic = np.zeros(n)
+        for i, t in enumerate(pts):
+            after = np.minimum(100.0, t + np.arange(len(drops)) * r.drop_toxicity)
+            for t1, pd in zip(after, drops):
+                if pd < 1e-15:
+                    continue
+                # no antidote
+                if t1 >= 100.0:
+                    self.toxic[i] += pd * (1 - r.antidote_chance)
+                else:
+                    _spread(pts, np.array([t1]), np.array([pd * (1 - r.antidote_chance)]), self.poison[i])
+                # antidote
+                t2 = np.maximum(0.0, t1 - reds)
+                pr = np.full(len(reds), pd * r.antidote_chance / len(reds))
+                dead = t2 >= 100.0
+                self.toxic[i] += pr[dead].sum()
+                _spread(pts, t2[~dead], pr[~dead], self.poison[i])
+        self.escape_tox = pts < r.escape_toxicity
+
+    def _secret_on(self, rnd):
+        r = self.rules
+        return rnd >= r.secret_round and r.pull_factor ** rnd >= r.secret_survival
+
+    def _stationary_from(self):
+        """First round from which the report checks no longer depend on the round."""
+        r = self.rules
+        if not self._secret_on(max(r.secret_round, 1)):
+            return max(1, r.escape_round)
+        if r.pull_factor >= 1:
+            return max(r.escape_round, r.secret_round)
+        last = r.secret_round
+        while self._secret_on(last + 1):
+            last += 1
+        return max(r.escape_round, last + 1)
+
+    # ---------------- One round, backwards ----------------
+    def report(self, nxt, rnd):
+        """Values at the report of round ``rnd`` given start-of-round values of ``rnd + 1``."""
+        v = _along(nxt, self.creep, 4)
+        if rnd >= self.rules.escape_round:
+            v[:, :, self.escape_tox] = 0.0
+            v[ESCAPE, :, self.escape_tox] = 1.0
+        if self._secret_on(rnd):
+            rest = ~self.escape_tox if rnd >= self.rules.escape_round else slice(None)
+            v[:, :, rest] = 0.0
+            v[SECRET, :, rest] = 1.0
+        return v
+
+    def poison_phase(self, v):
+        v = _along(v, self.poison, 2)
+        v[TOXIC_DEATH] += self.toxic[None, :, None, None, None]
+        return v
+
+    def roulette(self, v, spin):
+        """Mix of Spin (probability ``spin``) and Don't Spin at every ``cleared`` value."""
+        c = self.nk
+        safe = _along(v, self.relief, 2)
+        out = np.empty_like(v)
+        p_spin = 1.0 / c
+        for k in range(c):
+            p_stay = 1.0 / (c - k)
+            spun = (1 - p_spin) * safe[:, :, :, 0]
+            kept = (1 - p_stay) * safe[:, :, :, k + 1] if k + 1 < c else np.zeros_like(spun)
+            out[:, :, :, k] = spin * spun + (1 - spin) * kept
+            out[ROULETTE_DEATH, :, :, k] += spin * p_spin + (1 - spin) * p_stay
+        return out
+
+    def queue_phase(self, v):
+        v = np.einsum("lmqp,eptklm->eqtklm", self.queue, v, optimize=True)
+        v[QUEUE_COLLAPSE] += self.collapse.transpose(2, 0, 1)[:, None, None]
+        nl, nm = len(self.lam), len(self.mu)
+        flat = v.reshape(-1, nl * nm) @ self.drift.reshape(nl * nm, nl * nm).T
+        v = flat.reshape(v.shape)
+        v[QUEUE_COLLAPSE] += self.drift_collapse
+        return v
+
+    def round(self, nxt, rnd, spin):
+        """Start-of-round values of ``rnd`` from those of ``rnd + 1``."""
+        v = self.report(nxt, rnd)
+        v = self.poison_phase(v)
+        v = self.roulette(v, spin)
+        return self.queue_phase(v)
+
+    # ---------------- Tables ----------------
+    def solve(self, spin=0.5):
+        """Tables for rounds ``1 .. stationary_from``; the last one serves every later round."""
+        g = self.grid
+        st = g.store_stride
+        v = np.zeros(self.shape)
+        for _ in range(g.max_iter):
+            nv = self.round(v, self.stationary_from, spin)
+            done = np.abs(nv - v).max() < g.tol
+            v = nv
+            if done:
+                break
+        shape = self.shape[:4] + (len(self.lam_stored), len(self.mu_stored))
+        tables = np.empty((self.stationary_from,) + shape, np.float32)
+        tables[-1] = v[..., ::st, ::st]
+        for rnd in range(self.stationary_from - 1, 0, -1):
+            v = self.round(v, rnd, spin)
+            tables[rnd - 1] = v[..., ::st, ::st]
+        return tables
+
+
+@lru_cache(maxsize=4)
+def model(rules=DEFAULT_RULES, grid=DEFAULT_GRID):
+    return Model(rules, grid)
+
+
+@lru_cache(maxsize=4)
+def _tables(rules, grid, spin):
+    return model(rules, grid).solve(spin)
+
+
+_built = set()
+_warming = {}
+_warm_lock = threading.Lock()
+
+
+def tables(rules=DEFAULT_RULES, grid=DEFAULT_GRID, spin=0.5):
+    """Value tables for these arguments, built on first use."""
+    t = _tables(rules, grid, spin)
+    _built.add((rules, grid, spin))
+    return t
+
+
+def warm(rules=DEFAULT_RULES, grid=DEFAULT_GRID, spin=0.5):
+    """Start building the tables in a daemon thread; no-op if already started."""
+    key = (rules, grid, spin)
+    with _warm_lock:
+        if key not in _warming and key not in _built:
+            _warming[key] = threading.Thread(target=tables, args=key, name="lq-solver", daemon=True)
+            _warming[key].start()
+
+
+def ready(rules=DEFAULT_RULES, grid=DEFAULT_GRID, spin=0.5):
+    """True once the tables for these arguments are built."""
+    return (rules, grid, spin) in _built
+
+
+# ---------------- Lookups ----------------
+def _weights(pts, x):
+    pos = float(np.clip((x - pts[0]) / (pts[1] - pts[0]), 0, len(pts) - 1))
+    lo = int(pos)
+    hi = min(lo + 1, len(pts) - 1)
+    return ((lo, 1 - (pos - lo)), (hi, pos - lo))
+
+
+def _at(m, table, q, tox, cleared, lmbd, mu):
+    """Multilinear interpolation of ``table[:, q, ·, cleared, ·, ·]`` at (tox, λ, μ)."""
+    q = min(max(int(q), 0), m.nq - 1)
+    k = min(max(int(cleared), 0), m.nk - 1)
+    out = np.zeros(table.shape[0])
+    for ti, tw in _weights(m.tox, tox):
+        for li, lw in _weights(m.lam_stored, lmbd):
+            for mi, mw in _weights(m.mu_stored, mu):
+                w = tw * lw * mw
+                if w:
+                    out += w * table[:, q, ti, k, li, mi]
+    return out
+
+
+def _as_dict(p):
+    p = np.clip(p, 0.0, 1.0)
+    out = {name: float(p[i]) for i, name in enumerate(OUTCOMES)}
+    out["unresolved"] = max(0.0, 1.0 - float(p.sum()))
+    return out
+
+
+def start_of_round(rnd, queue_length, toxicity, cleared, lmbd, mu,
+                   rules=DEFAULT_RULES, grid=DEFAULT_GRID, spin=0.5):
+    """P(each ending) from the start of round ``rnd`` (before the queue drift)."""
+    m, t = model(rules, grid), tables(rules, grid, spin)
+    table = t[min(max(rnd, 1), m.stationary_from) - 1]
+    return _as_dict(_at(m, table, queue_length, toxicity, cleared, lmbd, mu))
+
+
+def after_report(rnd, queue_length, toxicity, cleared, lmbd, mu,
+                 rules=DEFAULT_RULES, grid=DEFAULT_GRID, spin=0.5):
+    """P(each ending) for a player at the report of round ``rnd`` who presses "Continue"."""
+    m, t = model(rules, grid), tables(rules, grid, spin)
+    table = t[min(rnd + 1, m.stationary_from) - 1]
+    r = rules
+    # "Continue" sets λ to min(lam_max, round(λ + U(creep_min, creep_max), 2))
+    lo, hi = round(r.lam_creep_min * 100), round(r.lam_creep_max * 100)
+    steps = np.arange(lo, hi + 1)
+    w = np.ones(len(steps))
+    w[[0, -1]] = 0.5
+    w /= w.sum()
+    p = np.zeros(len(OUTCOMES))
+    for j, cw in zip(steps, w):
+        lam = min(r.lam_max, round(lmbd + j * _LATTICE, 2))
+        p += cw * _at(m, table, queue_length, toxicity, cleared, lam, mu)
+    return _as_dict(p)
+
+
+def _start_weights(pts, mean, sd, floor):
+    """Grid weights of max(floor, N(mean, sd)); everything below the floor lands on its bucket."""
+    edges = (pts[1:] + pts[:-1]) / 2
+    edges = np.concatenate([[-np.inf], np.where(edges <= floor, -np.inf, edges), [np.inf]])
+    return np.diff(_erf_cdf(edges, mean, sd))
+
+
+def from_start(rules=DEFAULT_RULES, grid=DEFAULT_GRID, spin=0.5):
+    """P(each ending) for a fresh game, averaged over the start_game draws of λ and μ."""
+    r = rules
+    m, t = model(rules, grid), tables(rules, grid, spin)
+    wl = _start_weights(m.lam, r.lam_mean, r.lam_sd, r.lam_start_floor)
+    wm = _start_weights(m.mu, r.mu_mean, r.mu_sd, r.mu_start_floor)
+    p = np.zeros(len(OUTCOMES))
+    for li, lw in enumerate(wl):
+        for mi, mw in enumerate(wm):
+            if lw * mw > 1e-12:
+                p += lw * mw * _at(m, t[0], r.start_queue, r.start_toxicity, 0, m.lam[li], m.mu[mi])
+    return _as_dict(p)
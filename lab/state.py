@@ -0,0 +1,195 @@
+# lab/state.py
+"""Per-player game state and the process-wide registry that owns it."""
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+
+from lab import settings
+from lab.rules import DEFAULT_RULES
+
+
+# ---------------- Displayed-text markers ----------------
+class DisplayedLRU:
+    """Which text each typewriter key last showed, as a CRC32, for the most recent keys only."""
+    __slots__ = ("capacity", "_marks")
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or settings.DISPLAYED_MAX
+        self._marks = OrderedDict()
+
+    def shown(self, key, text):
+        """True if ``key`` already played exactly ``text``."""
+        mark = self._marks.get(key)
+        if mark is None:
+            return False
+        self._marks.move_to_end(key)
+        return mark == zlib.crc32(text.encode())
+
+    def mark(self, key, text):
+        self._marks[key] = zlib.crc32(text.encode())
+        self._marks.move_to_end(key)
+        while len(self._marks) > self.capacity:
+            self._marks.popitem(last=False)
+
+    def clear(self):
+        self._marks.clear()
+
+    def __len__(self):
+        return len(self._marks)
+
+    def nbytes(self):
+        n = sys.getsizeof(self._marks)
+        for k, v in self._marks.items():
+            n += sys.getsizeof(k) + sys.getsizeof(v)
+        return n
+
+
+# ---------------- Game state ----------------
+@dataclass(slots=True)
+class GameState:
+    """Everything init_state used to put into st.session_state, in one object."""
+    phase: str = "tutorial"  # tutorial, playing, ending
+    tutorial_step: int = 0
+    tutorial_finished: bool = False
+    game_started: bool = False
+    round: int = 0
+    queue_length: int = DEFAULT_RULES.start_queue
+    toxicity: float = DEFAULT_RULES.start_toxicity
+    lmbd: float = DEFAULT_RULES.lam_mean
+    mu: float = DEFAULT_RULES.mu_mean
+    survival_prob: float = 1.0
+    alive: bool = True
+    phase_part: str = "queue"
+    bullet_pos: int = field(default_factory=lambda: random.randint(1, DEFAULT_RULES.chambers))
+    chamber_pointer: int = 1
+    cleared: int = 0  # chambers passed with "Don't Spin" since the last spin
+    ending_type: str = None
+    lam_poison: float = DEFAULT_RULES.lam_poison
+    antidote_chance: float = DEFAULT_RULES.antidote_chance
+    # this game's RNG and event log (see lab/game.py)
+    seed: int = None
+    started_at: float = None  # time.monotonic() at start_game, for the leaderboard's duration
+    rng: object = None
+    log: object = None
+    # outcomes of the current phase, drawn once when it was entered
+    arrivals: int = 0
+    services: int = 0
+    drops: int = 0
+    antidote: int = 0
+    # continuous-time queue (lab/des.py); servers == 0 keeps the one-step queue phase
+    servers: int = 0
+    des: object = None
+    waits: tuple = None  # (p50, p90, p99, subjects) of this round's waits
+    # shared lab (lab/labserver.py); None keeps the queue phase to this game alone
+    lab: int = None
+    lab_seen: tuple = None  # the lab's (arrivals, departures) totals when this subject last queued
+    displayed: DisplayedLRU = field(default_factory=DisplayedLRU)
+    announcements: list = field(default_factory=list)
+    last_seen: float = field(default_factory=time.monotonic)
+    saved: tuple = None  # checkpoint.version() of the last snapshot handed to the store
+
+    def nbytes(self):
+        """Approximate bytes held by this state, markers included."""
+        n = sys.getsizeof(self)
+        for f in fields(self):
+            v = getattr(self, f.name)
+            n += v.nbytes() if hasattr(v, "nbytes") else sys.getsizeof(v)
+        for item in self.announcements:
+            n += sum(sys.getsizeof(x) for x in item)
+        return n
+
+
+# ---------------- Registry ----------------
+class SessionRegistry:
+    """Owns every live GameState, keyed by the run key app.session_id() derives.
+
+    A daemon thread drops states that have not been touched for
+    ``idle_seconds``, so abandoned tabs stop holding memory. ``restore``, if
+    set, is asked for a session this process does not hold (a restart, an
+    evicted tab, a player moved over from another replica) before a fresh
+    GameState is made. ``claim`` records which browser session is playing a
+    key, so a second tab on the same link does not drive the same game.
+    """
+
+    def __init__(self, idle_seconds=None, sweep_every=None, restore=None):
+        self.idle_seconds = idle_seconds if idle_seconds is not None else settings.IDLE_SECONDS
+        self.sweep_every = sweep_every if sweep_every is not None else settings.SWEEP_SECONDS
+        self.restore = restore
+        self._states = {}
+        self._holders = {}  # key -> Streamlit session id playing it
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.evicted = 0
+
+    def get(self, session_id):
+        """The session's state, restored or created on first use; marks the session active."""
+        with self._lock:
+            g = self._states.get(session_id)
+            if g is not None:
+                g.last_seen = time.monotonic()
+                return g
+        g = (self.restore(session_id) if self.restore is not None else None) or GameState()
+        with self._lock:
+            g = self._states.setdefault(session_id, g)  # another run of the session may have won
+            g.last_seen = time.monotonic()
+        self._ensure_sweeper()
+        return g
+
+    def claim(self, session_id, holder, alive=None):
+        """Give ``session_id`` to ``holder`` unless another holder is still alive; True if it did."""
+        with self._lock:
+            current = self._holders.get(session_id)
+            if current not in (None, holder) and alive is not None and alive(current):
+                return False
+            self._holders[session_id] = holder
+        return True
+
+    def reset(self, session_id):
+        with self._lock:
+            g = self._states[session_id] = GameState()
+        return g
+
+    def sweep(self, now=None):
+        """Evict idle sessions; returns how many were dropped."""
+        cutoff = (now if now is not None else time.monotonic()) - self.idle_seconds
+        with self._lock:
+            stale = [sid for sid, g in self._states.items() if g.last_seen < cutoff]
+            for sid in stale:
+                del self._states[sid]
+                self._holders.pop(sid, None)
+            self.evicted += len(stale)
+        return len(stale)
+
+    def stats(self):
+        """Session count and bytes held, in total and for the largest session."""
+        with self._lock:
+            sizes = [g.nbytes() for g in self._states.values()]
+        return {
+            "sessions": len(sizes),
+            "bytes": sum(sizes),
+            "max_bytes": max(sizes, default=0),
+            "evicted": self.evicted,
+        }
+
+    def __len__(self):
+        return len(self._states)
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="lq-session-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_every)
+            self.sweep()
+
+
+REGISTRY = SessionRegistry()
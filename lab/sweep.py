@@ -0,0 +1,181 @@
+# lab/sweep.py
+"""Balance sweeps: play many games for every cell of a grid over the Rules knobs.
+
+A sweep lives in one directory:
+
+    spec.json     parameters, their values, games per cell, seed
+    results.npy   float32 (*grid, len(ENDINGS) + 2): ending frequencies,
+                  unfinished fraction, mean rounds
+    done.npy      bool (*grid): cells whose row in results.npy is final
+
+Both arrays are memory-mapped. Workers write their cells straight into
+``results.npy`` and then set the cell in ``done.npy``, so killing a sweep
+loses at most the cells in flight, and running the same command again skips
+everything already done. Every cell gets its own seed from
+``SeedSequence(seed, spawn_key=(cell,))``, so a cell's numbers do not depend
+on which worker ran it or when.
+
+    python -m lab.sweep out/ -p lam_mean=0.6:1.0:9 -p antidote_chance=0.1,0.18,0.3 --games 20000 --workers 32
+    python -m lab.sweep out/            # resume
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import fields
+from pathlib import Path
+
+import numpy as np
+
+from lab import engine
+from lab.rules import DEFAULT_RULES, ENDINGS
+
+COLUMNS = ENDINGS + ("unfinished", "mean_rounds")
+_FIELDS = {f.name: type(getattr(DEFAULT_RULES, f.name)) for f in fields(DEFAULT_RULES)}
+
+
+# ---------------- Grid spec ----------------
+def parse_param(text):
+    """``name=lo:hi:n`` (n evenly spaced values) or ``name=a,b,c``."""
+    name, _, values = text.partition("=")
+    if name not in _FIELDS:
+        raise ValueError(f"unknown parameter {name!r}; choose from {', '.join(_FIELDS)}")
+    if ":" in values:
+        lo, hi, n = values.split(":")
+        vals = np.linspace(float(lo), float(hi), int(n)).tolist()
+    else:
+        vals = [float(v) for v in values.split(",")]
+    cast = _FIELDS[name]
+    return name, [cast(round(v)) if cast is int else float(v) for v in vals]
+
+
+class Sweep:
+    """An on-disk sweep: its spec and memory-mapped result and done arrays."""
+
+    def __init__(self, out, params=None, games=10000, seed=0, max_rounds=200):
+        self.out = Path(out)
+        spec_path = self.out / "spec.json"
+        spec = {"params": params, "games": games, "seed": seed, "max_rounds": max_rounds}
+        if spec_path.exists():
+            on_disk = json.loads(spec_path.read_text())
+            if params is not None and spec != on_disk:
+                raise ValueError(f"{self.out} holds a different sweep; use a new directory")
+            spec = on_disk
+        elif params is None:
+            raise ValueError(f"no sweep in {self.out}; give at least one parameter")
+        self.spec = spec
+        self.names = [p[0] for p in spec["params"]]
+        self.values = [p[1] for p in spec["params"]]
+        self.shape = tuple(len(v) for v in self.values)
+        if not spec_path.exists():
+            self.out.mkdir(parents=True, exist_ok=True)
+            np.lib.format.open_memmap(self.out / "results.npy", "w+", np.float32, self.shape + (len(COLUMNS),))
+            np.lib.format.open_memmap(self.out / "done.npy", "w+", np.bool_, self.shape)
+            spec_path.write_text(json.dumps(spec, indent=2))  # last: a spec means the arrays exist
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    def results(self, mode="r"):
+        return np.load(self.out / "results.npy", mmap_mode=mode)
+
+    def done(self, mode="r"):
+        return np.load(self.out / "done.npy", mmap_mode=mode)
+
+    def rules(self, cell):
+        idx = np.unravel_index(cell, self.shape)
+        return DEFAULT_RULES.with_(**{n: v[i] for n, v, i in zip(self.names, self.values, idx)})
+
+    def todo(self):
+        return np.flatnonzero(~np.asarray(self.done()).reshape(-1))
+
+
+# ---------------- Workers ----------------
+def _run_cells(args):
+    """Play every cell in ``cells`` and write its row, then its done flag."""
+    out, cells = args
+    sweep = Sweep(out)
+    res, done = sweep.results("r+"), sweep.done("r+")
+    flat_res, flat_done = res.reshape(-1, len(COLUMNS)), done.reshape(-1)
+    s = sweep.spec
+    for cell in cells:
+        rng = np.random.default_rng(np.random.SeedSequence(s["seed"], spawn_key=(int(cell),)))
+        summary = engine.Summary.empty(s["max_rounds"]).add(
+            engine.play(s["games"], sweep.rules(cell), rng, max_rounds=s["max_rounds"]))
+        dist = summary.distribution()
+        flat_res[cell] = [dist[name] for name in COLUMNS[:-1]] + [summary.mean_rounds()]
+    res.flush()
+    flat_done[cells] = True
+    done.flush()
+    return len(cells)
+
+
+def run(sweep, workers=1, batch=8, progress=None):
+    """Run every cell not yet done; ``progress(done, total, seconds)`` is called as batches finish."""
+    todo = sweep.todo()
+    total, finished = len(sweep), len(sweep) - len(todo)
+    jobs = [(str(sweep.out), todo[i:i + batch]) for i in range(0, len(todo), batch)]
+    t0 = time.perf_counter()
+    if workers <= 1:
+        for job in jobs:
+            finished += _run_cells(job)
+            if progress:
+                progress(finished, total, time.perf_counter() - t0)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        jobs = iter(jobs)
+        while True:
+            # keep a couple of batches queued per worker, not the whole grid
+            for job in jobs:
+                pending.add(pool.submit(_run_cells, job))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+            ready, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in ready:
+                finished += f.result()
+            if progress:
+                progress(finished, total, time.perf_counter() - t0)
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Monte Carlo sweep over Rules parameters.")
+    p.add_argument("out", help="sweep directory (created, or resumed if it exists)")
+    p.add_argument("-p", "--param", action="append", default=None,
+                   help="NAME=LO:HI:N or NAME=A,B,C; repeat for more axes")
+    p.add_argument("--games", type=int, default=10000, help="games per cell")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--max-rounds", type=int, default=200)
+    p.add_argument("--workers", type=int, default=os.cpu_count())
+    p.add_argument("--batch", type=int, default=8, help="cells per task")
+    args = p.parse_args(argv)
+
+    params = [list(parse_param(t)) for t in args.param] if args.param else None
+    sweep = Sweep(args.out, params, args.games, args.seed, args.max_rounds)
+    start = len(sweep) - len(sweep.todo())
+    print(f"{len(sweep)} cells ({' x '.join(map(str, sweep.shape))} over {', '.join(sweep.names)}), "
+          f"{sweep.spec['games']} games each, {start} already done")
+
+    def progress(done, total, dt):
+        rate = (done - start) / dt if dt > 0 else 0.0
+        eta = (total - done) / rate if rate else float("inf")
+        print(f"\r  {done}/{total} cells  {rate:.1f} cells/s  eta {eta / 60:.1f} min", end="", flush=True)
+
+    run(sweep, args.workers, args.batch, progress)
+    print()
+
+    res = np.asarray(sweep.results()).reshape(-1, len(COLUMNS))
+    best = np.argsort(res[:, ENDINGS.index("escape")])[::-1][:5]
+    print("highest escape rate:")
+    for cell in best:
+        idx = np.unravel_index(cell, sweep.shape)
+        knobs = "  ".join(f"{n}={v[i]:g}" for n, v, i in zip(sweep.names, sweep.values, idx))
+        print(f"  {knobs}  escape {res[cell, ENDINGS.index('escape')]:.2%}  mean rounds {res[cell, -1]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# lab/tournament.py
+"""Round-robin of bot strategies that stops each comparison once it is settled.
+
+Play goes in steps. At step k every strategy that still has an open
+comparison plays one batch of games on the same seed as the others (common
+random numbers: the same λ/μ draws, bullets and poison for game i, as long as
+the strategies' choices keep the games in step). A pair's comparison is the
+paired per-game difference in the metric, escape-or-secret by default:
+
+    d = win_A - win_B,   mean ± z_k · sd / √n
+
+and z_k spends the error rate over looks and pairs as α / (pairs · k(k+1)),
+which sums to α, so peeking after every batch keeps the overall error rate.
+A pair is settled when the interval excludes 0 (one strategy is better) or
+is narrower than ±``tie`` (equal for practical purposes). A strategy stops
+playing once all of its pairs are settled, so batches go to close contests;
+``max_games`` caps the rest.
+
+    python -m lab.tournament always_spin never_spin mixed=0.5 spin_after=2 always_spin+quit_rho=0.95
+"""
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import combinations
+from statistics import NormalDist
+
+import numpy as np
+
+from lab import bots, engine
+from lab.rules import DEFAULT_RULES, ENDINGS, ESCAPE, SECRET, VOLUNTARY_EXIT
+
+METRICS = {
+    "win": (ESCAPE, SECRET),                        # the game's good endings
+    "escape": (ESCAPE,),
+    "survive": (ESCAPE, SECRET, VOLUNTARY_EXIT),    # anything but dying
+}
+
+
+# ---------------- Results ----------------
+@dataclass
+class Entry:
+    spec: str
+    games: int = 0
+    counts: np.ndarray = field(default_factory=lambda: np.zeros(len(ENDINGS) + 1, np.int64))
+
+    def rate(self, endings):
+        return self.counts[list(endings)].sum() / max(1, self.games)
+
+
+@dataclass
+class Pair:
+    a: int
+    b: int
+    n: int = 0
+    sum_d: float = 0.0
+    sum_d2: float = 0.0
+    verdict: str = None     # "a", "b", "tie", or None while open (or out of games)
+    mean: float = 0.0
+    half: float = math.inf
+
+    def update(self, d, z, tie):
+        self.n += len(d)
+        self.sum_d += float(d.sum())
+        self.sum_d2 += float((d * d).sum())
+        self.mean = self.sum_d / self.n
+        # floor: with no discordant games yet, about 1/n of them could still be unseen
+        var = max(1.0 / self.n, self.sum_d2 / self.n - self.mean ** 2)
+        self.half = z * math.sqrt(var / self.n)
+        if self.mean - self.half > 0:
+            self.verdict = "a"
+        elif self.mean + self.half < 0:
+            self.verdict = "b"
+        elif self.half < tie:
+            self.verdict = "tie"
+
+
+def wilson(k, n, z=1.96):
+    """Wilson score interval for k successes in n trials."""
+    if n == 0:
+        return 0.0, 1.0
+    p = k / n
+    c = (p + z * z / (2 * n)) / (1 + z * z / n)
+    h = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return c - h, c + h
+
+
+# ---------------- Runner ----------------
+def _play(args):
+    """One strategy's batch: per-game ending codes."""
+    spec, n, rules, seed, max_rounds = args
+    return engine.play(n, rules, np.random.default_rng(seed), max_rounds=max_rounds,
+                       strategy=bots.strategy(spec, rules)).ending
+
+
+def run(specs, rules=DEFAULT_RULES, batch=20000, alpha=0.05, tie=0.002, max_games=2_000_000, metric="win",
+        seed=0, max_rounds=200, workers=1, progress=None):
+    """Play the tournament; returns (entries, pairs). ``progress(step, entries, pairs)`` runs after each step."""
+    for spec in specs:
+        bots.strategy(spec, rules)  # fail on a bad spec (or a missing policy table) before any games are played
+    good = np.array([i in METRICS[metric] for i in range(len(ENDINGS))] + [False])
+    entries = [Entry(spec) for spec in specs]
+    pairs = [Pair(a, b) for a, b in combinations(range(len(specs)), 2)]
+    norm = NormalDist()
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        step = 0
+        while True:
+            open_pairs = [p for p in pairs if p.verdict is None]
+            active = sorted({i for p in open_pairs for i in (p.a, p.b)
+                             if entries[i].games < max_games})
+            if not active:
+                break
+            step += 1
+            batch_seed = np.random.SeedSequence(seed, spawn_key=(step,))
+            jobs = [(specs[i], batch, rules, batch_seed, max_rounds) for i in active]
+            results = pool.map(_play, jobs) if pool else map(_play, jobs)
+            wins = {}
+            for i, ending in zip(active, results):
+                row = np.where(ending == engine.UNFINISHED, len(ENDINGS), ending)
+                entries[i].counts += np.bincount(row, minlength=len(ENDINGS) + 1)
+                entries[i].games += len(ending)
+                wins[i] = good[row].astype(np.int8)
+            z = norm.inv_cdf(1 - alpha / (2 * len(pairs) * step * (step + 1)))
+            for p in open_pairs:
+                if p.a in wins and p.b in wins:
+                    p.update(wins[p.a] - wins[p.b], z, tie)
+            if progress:
+                progress(step, entries, pairs)
+    finally:
+        if pool:
+            pool.shutdown()
+    return entries, pairs
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    import argparse
+    import os
+
+    p = argparse.ArgumentParser(description="Compare bot strategies with sequential stopping.")
+    p.add_argument("specs", nargs="+", help=f"strategy specs ({', '.join(bots.STRATEGIES)}; A+B; module.Class=args)")
+    p.add_argument("--metric", choices=METRICS, default="win")
+    p.add_argument("--batch", type=int, default=20000, help="games per strategy per step")
+    p.add_argument("--alpha", type=float, default=0.05, help="overall error rate over every pair and look")
+    p.add_argument("--tie", type=float, default=0.002, help="a difference narrower than ± this counts as a tie")
+    p.add_argument("--max-games", type=float, default=2e6, help="per strategy")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = p.parse_args(argv)
+    if len(args.specs) < 2:
+        p.error("give at least two strategies to compare")
+
+    def progress(step, entries, pairs):
+        settled = sum(pr.verdict is not None for pr in pairs)
+        print(f"\r  step {step}: {sum(e.games for e in entries):,} games, {settled}/{len(pairs)} pairs settled",
+              end="", flush=True)
+
+    t0 = time.perf_counter()
+    entries, pairs = run(args.specs, batch=args.batch, alpha=args.alpha, tie=args.tie,
+                         max_games=int(args.max_games), metric=args.metric, seed=args.seed,
+                         workers=args.workers, progress=progress)
+    dt = time.perf_counter() - t0
+    played = sum(e.games for e in entries)
+    fixed = len(entries) * int(args.max_games)
+    print(f"\n{played:,} games in {dt:.1f}s; a fixed {int(args.max_games):,} per strategy would be {fixed:,} "
+          f"({played / fixed:.1%})")
+
+    good = METRICS[args.metric]
+    names = [str(bots.strategy(e.spec)) for e in entries]
+    width = max(len(n) for n in names)
+    order = sorted(range(len(entries)), key=lambda i: -entries[i].rate(good))
+    print(f"{'strategy':<{width}}  {'games':>10}  {args.metric + ' rate (95% CI)':>26}  escape    secret    exit")
+    for i in order:
+        e = entries[i]
+        k = int(e.counts[list(good)].sum())
+        lo, hi = wilson(k, e.games)
+        print(f"{names[i]:<{width}}  {e.games:>10,}  {k / max(1, e.games):>9.3%} [{lo:.3%}, {hi:.3%}]  "
+              f"{e.rate((ESCAPE,)):7.3%}  {e.rate((SECRET,)):7.3%}  {e.rate((VOLUNTARY_EXIT,)):7.3%}")
+    print("pairs:")
+    for pr in pairs:
+        a, b = names[pr.a], names[pr.b]
+        verdict = {"a": f"{a} better", "b": f"{b} better", "tie": "tie", None: "undecided"}[pr.verdict]
+        print(f"  {a} vs {b}: {pr.mean:+.3%} ± {pr.half:.3%} after {pr.n:,} paired games -> {verdict}")
+
+
+if __name__ == "__main__":
+    main()
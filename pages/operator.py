@@ -0,0 +1,80 @@
+# pages/operator.py
+# Live cross-session aggregates for operators, at /operator. Everything shown comes from
+# lab/events.py's fixed-size Aggregates, so a refresh costs the same however many games were played.
+# Closed unless LQ_OPERATOR_TOKEN is set and the URL carries it as ?token=.
+import hmac
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from lab import events, settings
+from lab.rules import ENDINGS
+
+st.set_page_config(page_title="λ: Operator", page_icon="🧪", layout="wide")
+token = st.query_params.get("token", "")
+if not settings.OPERATOR_TOKEN or not hmac.compare_digest(token.encode(), settings.OPERATOR_TOKEN.encode()):
+    st.error("Not found.")
+    st.stop()
+st.title("λ: The Last Queue — operator view")
+st.caption("This replica's players since its aggregates were first saved. Raw events: "
+           f"Parquet segments in {settings.EVENTS_DIR or '(off)'}.")
+
+
+@st.fragment(run_every=settings.DASHBOARD_EVERY)
+def dashboard():
+    t0 = time.perf_counter()
+    pipe = events.PIPELINE
+    a = pipe.agg.snapshot()
+    kinds = dict(zip(events.KINDS, a["kinds"].tolist()))
+    endings = a["endings"]
+    window = a["window"]
+
+    c = st.columns(5)
+    c[0].metric("Games started", f"{kinds['start']:,}")
+    c[1].metric("Games finished", f"{int(endings.sum()):,}")
+    c[2].metric("Started, last hour", f"{int(window[:, 0].sum()):,}")
+    c[3].metric("Escape rate", f"{endings[ENDINGS.index('escape')] / max(1, endings.sum()):.1%}")
+    c[4].metric("Events queued / dropped", f"{pipe.pending():,} / {pipe.dropped:,}")
+
+    left, right = st.columns(2)
+    with left:
+        st.subheader("Ending mix")
+        st.bar_chart(pd.DataFrame({"games": endings}, index=list(ENDINGS)))
+        st.subheader("Rounds survived")
+        rounds = pd.DataFrame(a["rounds"].T, columns=list(ENDINGS))
+        st.bar_chart(rounds.loc[:, rounds.sum() > 0], x_label=f"round ({events.ROUNDS_MAX} = {events.ROUNDS_MAX}+)")
+        st.subheader("Last hour, per minute")
+        minutes = pd.DataFrame(window, columns=["starts"] + list(ENDINGS),
+                               index=pd.to_datetime((a["window_start"] + np.arange(events.WINDOW)) * 60, unit="s"))
+        st.line_chart(minutes)
+    with right:
+        st.subheader("Toxicity at each report")
+        reports = a["tox_hist"].sum(axis=1)
+        seen = reports > 0
+        step = 100 // events.TOX_BINS
+        high = a["tox_hist"][:, (80 // step):].sum(axis=1)
+        st.line_chart(pd.DataFrame({"mean toxicity %": a["tox_sum"][seen] / reports[seen],
+                                    "share ≥ 80%": 100 * high[seen] / reports[seen]},
+                                   index=np.flatnonzero(seen)), x_label="round")
+        st.subheader("Spin vs Don't Spin")
+        pulls = a["pulls"]
+        st.dataframe(pd.DataFrame({"pulls": pulls.sum(axis=1),
+                                   "fired": pulls[:, 1],
+                                   "fired %": 100 * pulls[:, 1] / np.maximum(1, pulls.sum(axis=1))},
+                                  index=["Spin", "Don't Spin"]), width="stretch")
+        st.subheader("λ and μ at queue collapse")
+        edges = events.RATE_EDGES
+        li, mi = np.nonzero(a["collapse"])
+        st.vega_lite_chart(pd.DataFrame({"λ": [edges[i] for i in li], "μ": [edges[j] for j in mi],
+                                         "games": a["collapse"][li, mi]}), {
+            "mark": "rect",
+            "encoding": {"x": {"field": "μ", "type": "ordinal"}, "y": {"field": "λ", "type": "ordinal", "sort": "descending"},
+                         "color": {"field": "games", "type": "quantitative"}},
+        }, width="stretch")
+    st.caption(f"{int(a['kinds'].sum()):,} events folded, {pipe.segments} segments written by this process, "
+               f"rendered in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+dashboard()